@@ -1,173 +1,54 @@
 import os
-import json
-from openai import AzureOpenAI
+import sys
 from dotenv import load_dotenv
-import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_pipeline.generation import (
+    load_azure_config, print_config, generate_all, GenerationParams, DEFAULT_CONCURRENCY
+)
+from rag_pipeline.prompts import load_system_prompt
+from rag_pipeline.checkpoint import Checkpoint
+from rag_pipeline.contexts import save_responses
+from rag_pipeline.datasets import DEFAULT_DATASET, load_dataset
+from rag_pipeline.batch import generate_all_batch
+from rag_pipeline.telemetry import set_attributes, export_from_env
 
 # Lade die .env-Datei
 load_dotenv()
 
 # Alle Parameter aus der Umgebung holen
-endpoint = os.getenv("ENDPOINT_URL")
-search_endpoint = os.getenv("SEARCH_ENDPOINT")
-search_key = os.getenv("SEARCH_KEY")
-subscription_key = os.getenv("AZURE_OPENAI_API_KEY")
-deployment_name = os.getenv("DEPLOYMENT_NAME")
-index_name = os.getenv("SEARCH_INDEX")
-api_version = "2025-01-01-preview"
-
-
-print(f"endpoint: {endpoint}")
-print(f"search_endpoint: {search_endpoint}")
-print(f"search_key: {search_key[:6]}...") # nicht den ganzen Key!
-print(f"deployment_name: {deployment_name}")
-print(f"index_name: {index_name}")
-print(f"api_key gesetzt? {'JA' if subscription_key else 'NEIN'}")
-
-# Azure OpenAI Client
-client = AzureOpenAI(
-    api_key=subscription_key,
-    azure_endpoint=endpoint,
-    api_version=api_version,
-)
-
-
-
-def generate_response(question):
-    chat_prompt = [
-        {
-            "role": "system",
-            "content": 
-                
-"""
-You are the PlanQK Assistant, a specialized AI helper for the PlanQK platform (https://platform.planqk.de/home) - your quantum computing, AI/ML, and optimization solution hub.
-
-## Your Mission
-Help users discover, understand, and implement PlanQK's quantum and AI services. You're knowledgeable, proactive, and genuinely excited about helping users succeed with cutting-edge technology.
-
-## How You Operate
-- **Context-driven**: Use only information from PlanQK documentation and resources
-- **Solution-oriented**: When users share challenges, actively suggest relevant PlanQK services, use cases, or tools
-- **Conversational**: Be natural and engaging - ask clarifying questions, show enthusiasm, adapt to user expertise levels
-- **Actionable**: Always provide concrete next steps users can take immediately
-
-## Your Personality
-- Knowledgeable but approachable - you make complex quantum/AI concepts accessible
-- Proactive - you anticipate needs and suggest relevant resources
-- Helpful - you genuinely want users to succeed with PlanQK
-- Professional yet friendly - you're talking to innovators and problem-solvers
-
-## Response Style
-- Lead with the most relevant answer or recommendation
-- Include specific PlanQK resources with links: `source: https://platform.planqk.de/[path]`
-- When citing documents, use only the metadata (title, url) of the citations. Never output placeholders like [doc1]; instead, format sources as Title (or only [Title] or [URL] if one is missing). For multiple sources, list them separated by commas, do not repeat the same source consecutively, and do not invent links or titles.
-- Ask follow-up questions to better understand user needs
-- End naturally - no forced closing statements unless conversation feels complete
-- At the end of each response, explicitly state which persona you have identified (Identified persona: Business | Technical).
-
-## When Users Are...
-- **Exploring**: Show them what's possible, recommend use cases, ask about their goals
-- **Building**: Guide them through setup, point to documentation, suggest testing approaches  
-- **Stuck**: Help troubleshoot, clarify concepts, connect them to the right resources
-
-## Stay Focused
-Keep conversations centered on PlanQK capabilities. For off-topic requests, redirect naturally: "That's not my area, but I'd love to help you explore what PlanQK can do for [related topic]."
-
-## Persona Behavior & Response Strategy  
-Before answering, infer from the user's question whether they correspond to the Business or Physicist persona:  
-Physicist Persona (default if technical content is present)  
-Assign when the question includes technical terms, processes, or errors, such as:  
-- Code, algorithms, scripts, models, datasets, pipelines, runtime, compute, integration, orchestration.  
-- Deployment, configuration, installation, debugging, API, SDK, CLI, container, cluster, credentials, tokens, logs, error messages, stack traces.  
-- Questions starting with: “how to run / configure / install / fix / integrate / debug / upload / execute”.  
-Business Persona  
-Assign when the question focuses on non-technical, economic, or strategic aspects, such as:  
-- Cost, pricing, ROI, license, contract, subscription, procurement, compliance, GDPR, roadmap, onboarding, support, training, usability, stakeholder adoption, decision-making.  
-- Questions starting with: “what is the cost / license / support / roadmap / value / plan / business impact”.  
-- General usability, long-term benefit, or management focus without technical terminology.  
-Tie-Break Rule  
-- If both technical and business terms appear → classify as Physicist, unless the clear emphasis is on pricing/cost/licensing → then classify as Business.  
-- Ambiguous or generic questions → classify as Business.  
-
-## Response Behavior  
-Business Persona  
-- Focus on economic benefit, usability, and decision support.  
-- Use clear, simplified language.  
-- Explain technical terms in layman’s terms.  
-- Suggest use cases and documentation with economic framing.  
-Physicist Persona  
-- Focus on technical execution and reproducibility.  
-- Use precise technical language.  
-- Guide through model execution, algorithms, or configuration.  
-- Reference technical documentation for each step.  
-
-"""
-        },
-        {"role": "user", "content": question}
-    ]
-    
-    # Retry logic for rate limiting
-    max_retries = 5
-    for attempt in range(max_retries):
-        try:
-            completion = client.chat.completions.create(
-                model=deployment_name,
-                messages=chat_prompt,
-                max_tokens=800,
-                temperature=0.7,  # controls the randomness of the output (0.0 - 1.0)
-                top_p=0.95,       # controls the diversity of the output (0.0 - 1.0)
-                frequency_penalty=0,  # controls the repetition of words (0.0 - 1.0)
-                presence_penalty=0,   # controls the presence of new words (0.0 - 1.0)
-                stop=None,        # stop sequence for the generation (None means no stop sequence)
-                stream=False,     # whether to stream the response
-                extra_body={
-                    "data_sources": [{
-                        "type": "azure_search",
-                        "parameters": {
-                            "filter": None,
-                            "endpoint": search_endpoint,
-                            "index_name": index_name,
-                            "semantic_configuration": "",
-                            "authentication": {
-                                "type": "api_key",
-                                "key": search_key
-                            },
-                            "query_type": "simple",
-                            "in_scope": False,
-                            "strictness": 1,
-                            "top_n_documents": 10
-                        }
-                    }]
-                }
-            )
-            return completion.choices[0].message.content
-        
-        except Exception as e:
-                if "429" in str(e) or "rate limit" in str(e).lower():
-                    wait_time = 15  # Wait 15 seconds for rate limit
-                    print(f"Rate limit erreicht. Warte {wait_time} Sekunden... (Versuch {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    print(f"Anderer Fehler: {e}")
-                    if attempt == max_retries - 1:
-                        raise e
-                    time.sleep(10)  # Short wait for other errors
-    
-    raise Exception("Maximale Anzahl von Versuchen erreicht")
-
-# 1. Lade dein JSON
-with open("V2_RAG_Eval.json", "r", encoding="utf-8") as f:
-    data = json.load(f)["examples"]
-
-# 2. Für jede Frage eine Antwort generieren
-for ex in data:
-    if not ex.get("response"):
-        print(f"Generiere Antwort für: {ex['query'][:60].encode('ascii', 'ignore').decode('ascii')}...")
-        ex["response"] = generate_response(ex["query"])
-        time.sleep(5)
-
-# 3. Ergebnisse speichern
-with open("V2_RAG_Eval_with_responses.json", "w", encoding="utf-8") as f:
-    json.dump({"examples": data}, f, indent=2, ensure_ascii=False)
+config = load_azure_config()
+print_config(config)
+
+# Anzahl gleichzeitiger Requests (1 = altes sequentielles Verhalten)
+concurrency = int(os.getenv("GENERATION_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+# GENERATION_STREAM=on liest die Antworten als Stream (Time-to-first-token in der Telemetrie)
+params = GenerationParams(stream=os.getenv("GENERATION_STREAM", "off").lower() in ("1", "on", "true", "yes"))
+
+SYSTEM_PROMPT = load_system_prompt("V12")
+set_attributes(prompt_version="V12")  # Telemetrie-Spans nach Version auswerten
+
+# 1. Lade den Datensatz aus dem Register (datasets/); EVAL_DATASET: Name, Hash oder Pfad
+dataset = load_dataset(os.getenv("EVAL_DATASET", DEFAULT_DATASET))
+data = dataset.examples
+
+# 2. Für jede Frage eine Antwort generieren; jede fertige Antwort landet sofort
+#    im JSONL-Checkpoint, ein Neustart überspringt bereits beantwortete Fragen
+#    (GENERATION_RESUME=off verwirft den Checkpoint)
+resume = os.getenv("GENERATION_RESUME", "on").lower() not in ("0", "off", "false", "no")
+checkpoint = Checkpoint("V2_RAG_Eval_with_responses.jsonl", resume=resume)
+# GENERATION_MODE=batch reicht alle offenen Fragen als Batch-Job ein (z.B. für
+# nächtliche Läufe, BATCH_ENDPOINT=local testet das offline)
+if os.getenv("GENERATION_MODE", "sync").lower() == "batch":
+    generate_all_batch(data, SYSTEM_PROMPT, config, params, checkpoint=checkpoint)
+else:
+    generate_all(data, SYSTEM_PROMPT, config, params, concurrency=concurrency, checkpoint=checkpoint)
+
+# 3. Ergebnisse speichern (abgerufene Kontexte separat in V2_RAG_Eval_contexts.parquet)
+save_responses(data, "V2_RAG_Eval_with_responses.json", dataset_hash=dataset.hash)
+
+# Telemetrie (Latenz, Tokens, Retries je Aufruf), siehe TELEMETRY_EXPORT
+export_from_env(prefix="telemetry_generation")
 
 print("Alle Antworten generiert und gespeichert.")
@@ -1,166 +1,54 @@
 import os
-import json
-from openai import AzureOpenAI
+import sys
 from dotenv import load_dotenv
-import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_pipeline.generation import (
+    load_azure_config, print_config, generate_all, GenerationParams, DEFAULT_CONCURRENCY
+)
+from rag_pipeline.prompts import load_system_prompt
+from rag_pipeline.checkpoint import Checkpoint
+from rag_pipeline.contexts import save_responses
+from rag_pipeline.datasets import DEFAULT_DATASET, load_dataset
+from rag_pipeline.batch import generate_all_batch
+from rag_pipeline.telemetry import set_attributes, export_from_env
 
 # Lade die .env-Datei
 load_dotenv()
 
 # Alle Parameter aus der Umgebung holen
-endpoint = os.getenv("ENDPOINT_URL")
-search_endpoint = os.getenv("SEARCH_ENDPOINT")
-search_key = os.getenv("SEARCH_KEY")
-subscription_key = os.getenv("AZURE_OPENAI_API_KEY")
-deployment_name = os.getenv("DEPLOYMENT_NAME")
-index_name = os.getenv("SEARCH_INDEX")
-api_version = "2025-01-01-preview"
-
-
-print(f"endpoint: {endpoint}")
-print(f"search_endpoint: {search_endpoint}")
-print(f"search_key: {search_key[:6]}...") # nicht den ganzen Key!
-print(f"deployment_name: {deployment_name}")
-print(f"index_name: {index_name}")
-print(f"api_key gesetzt? {'JA' if subscription_key else 'NEIN'}")
-
-# Azure OpenAI Client
-client = AzureOpenAI(
-    api_key=subscription_key,
-    azure_endpoint=endpoint,
-    api_version=api_version,
-)
-
-
-
-def generate_response(question):
-    chat_prompt = [
-        {
-            "role": "system",
-            "content": 
-                
-"""
-You are a helpful virtual assistant for the PlanQK platform (https://platform.planqk.de/home). Your job is to help users complete their tasks using only the retrieved context from PlanQK resources.
-
-Guidelines:
-- Respond strictly based on the retrieved context. Do not use prior knowledge or assumptions.
-- If information is missing, ask focused follow-up questions.
-- If a user describes a specific problem, look for relevant use cases that match the described challenge.
-- Always aim to recommend specific, relevant use cases that can help address the user's needs.
-- English is the preferred language. However, if a user provides input in another language or explicitly requests a different language, respond accordingly in that language.
-- Avoid restricted topics: politics, religion, legal/medical/financial advice, personal matters, or criticism.
-- Maintain a professional, concise, and friendly tone for a technical/business audience.
-- Vary your phrasing, even when using sample phrases.
-- Always end with: "Is there anything else I can help you with on PlanQK?"
-
-Response Format:
-- Include a final message in every response.
-- Cite retrieved sources as: source: https://platform.planqk.de/[path]
-- Only respond to questions relevant to the PlanQK platform.
-
-Sample Phrases for Deflecting:
-- "I'm sorry, but I'm unable to discuss that topic. Is there something else I can help you with?"
-- "That's not something I can provide information on, but I'm happy to help with questions related to PlanQK."
-
-Example Dialogue:
-User: We’re exploring AI for operational optimization. Can PlanQK support us?
-Assistant: Thanks for reaching out! PlanQK offers AI models and services for analytics and optimization. Based on your description, you may want to explore:
-- Use Case: “Predictive Optimization for Dynamic Systems” [UseCase_X](ucX)
-- Model: “Generic AI Optimizer” [AI_Opt_Model](mX)
-
-To better assist you, could you let me know:
-- What kind of data you’re working with?
-- Are you evaluating or ready to deploy?
-
-User: We have structured time-series data and want to explore.
-Assistant: Perfect. You can get started by:
-
-1. Creating a workspace under “Workspaces”.
-2. Adding the model via the “Services” tab.
-3. Connecting data via “Data Connectors”.
-4. Running a test with sample data.
-
-Is there anything else I can help you with on PlanQK?
-
-------------------------Evaluierung--------------------------------------
-Q: Wie baue ich mit PlanQK meinen ersten Use Case?
-A: Um Ihren ersten Use Case mit PlanQK zu erstellen, können Sie folgende Schritte durchführen:
-
-Service-Konfiguration vorbereiten: Erstellen Sie eine planqk.json-Datei, die die Konfiguration Ihres Services enthält. Diese Datei wird automatisch vom PlanQK CLI generiert und sollte sich im Root-Ordner Ihres Projekts befinden. Sie enthält wichtige Felder wie den Namen des Services, Ressourcen (CPU, RAM, GPU), die Laufzeitumgebung (z. B. PYTHON_TEMPLATE oder DOCKER) und die Service-ID source: https://docs.planqk.de/planqk-json-reference.html.
-Implementierung starten: Nutzen Sie den PlanQK Git Server, um Ihren Code zu verwalten. Sie können ein Repository klonen, eine README-Datei hinzufügen und Änderungen über Git synchronisieren. Falls eine Dockerfile in Ihrer Implementierung vorhanden ist, können Sie direkt über die Benutzeroberfläche einen Service erstellen source: https://docs.planqk.de/implementations/getting-started.html.
-Quantum SDK verwenden: Falls Ihr Use Case Quantencomputing umfasst, können Sie das PlanQK Quantum SDK nutzen, um Quanten-Code zu entwickeln. Das SDK unterstützt Frameworks wie Qiskit und Amazon Braket, wodurch Sie Zugriff auf verschiedene Quanten-Hardware und Simulatoren haben source: https://docs.planqk.de/sdk-reference.html.
-Authentifizierung und Integration: Stellen Sie sicher, dass Sie über einen gültigen Access Token verfügen, um Zugriff auf die Plattform und die Dienste zu erhalten. Sie können diesen Token entweder über das CLI automatisch setzen oder explizit in Ihrem Code verwenden source: https://docs.planqk.de/sdk-reference.html.
-Sobald Ihr Service eingerichtet ist, können Sie ihn auf der PlanQK-Plattform veröffentlichen und orchestrieren.
-
-Gibt es spezifische Anforderungen oder weitere Details, bei denen ich helfen kann? Is there anything else I can help you with on PlanQK?
-
-"""
-        },
-        {"role": "user", "content": question}
-    ]
-    
-    # Retry logic for rate limiting
-    max_retries = 5
-    for attempt in range(max_retries):
-        try:
-            completion = client.chat.completions.create(
-                model=deployment_name,
-                messages=chat_prompt,
-                max_tokens=800,
-                temperature=0.7,  # controls the randomness of the output (0.0 - 1.0)
-                top_p=0.95,       # controls the diversity of the output (0.0 - 1.0)
-                frequency_penalty=0,  # controls the repetition of words (0.0 - 1.0)
-                presence_penalty=0,   # controls the presence of new words (0.0 - 1.0)
-                stop=None,        # stop sequence for the generation (None means no stop sequence)
-                stream=False,     # whether to stream the response
-                extra_body={
-                    "data_sources": [{
-                        "type": "azure_search",
-                        "parameters": {
-                            "filter": None,
-                            "endpoint": search_endpoint,
-                            "index_name": index_name,
-                            "semantic_configuration": "",
-                            "authentication": {
-                                "type": "api_key",
-                                "key": search_key
-                            },
-                            "query_type": "simple",
-                            "in_scope": False,
-                            "strictness": 1,
-                            "top_n_documents": 10
-                        }
-                    }]
-                }
-            )
-            return completion.choices[0].message.content
-        
-        except Exception as e:
-                if "429" in str(e) or "rate limit" in str(e).lower():
-                    wait_time = 15  # Wait 15 seconds for rate limit
-                    print(f"Rate limit erreicht. Warte {wait_time} Sekunden... (Versuch {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    print(f"Anderer Fehler: {e}")
-                    if attempt == max_retries - 1:
-                        raise e
-                    time.sleep(10)  # Short wait for other errors
-    
-    raise Exception("Maximale Anzahl von Versuchen erreicht")
-
-# 1. Lade dein JSON
-with open("V2_RAG_Eval.json", "r", encoding="utf-8") as f:
-    data = json.load(f)["examples"]
-
-# 2. Für jede Frage eine Antwort generieren
-for ex in data:
-    if not ex.get("response"):
-        print(f"Generiere Antwort für: {ex['query'][:60].encode('ascii', 'ignore').decode('ascii')}...")
-        ex["response"] = generate_response(ex["query"])
-        time.sleep(5)
-
-# 3. Ergebnisse speichern
-with open("V2_RAG_Eval_with_responses.json", "w", encoding="utf-8") as f:
-    json.dump({"examples": data}, f, indent=2, ensure_ascii=False)
+config = load_azure_config()
+print_config(config)
+
+# Anzahl gleichzeitiger Requests (1 = altes sequentielles Verhalten)
+concurrency = int(os.getenv("GENERATION_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+# GENERATION_STREAM=on liest die Antworten als Stream (Time-to-first-token in der Telemetrie)
+params = GenerationParams(stream=os.getenv("GENERATION_STREAM", "off").lower() in ("1", "on", "true", "yes"))
+
+SYSTEM_PROMPT = load_system_prompt("V2")
+set_attributes(prompt_version="V2")  # Telemetrie-Spans nach Version auswerten
+
+# 1. Lade den Datensatz aus dem Register (datasets/); EVAL_DATASET: Name, Hash oder Pfad
+dataset = load_dataset(os.getenv("EVAL_DATASET", DEFAULT_DATASET))
+data = dataset.examples
+
+# 2. Für jede Frage eine Antwort generieren; jede fertige Antwort landet sofort
+#    im JSONL-Checkpoint, ein Neustart überspringt bereits beantwortete Fragen
+#    (GENERATION_RESUME=off verwirft den Checkpoint)
+resume = os.getenv("GENERATION_RESUME", "on").lower() not in ("0", "off", "false", "no")
+checkpoint = Checkpoint("V2_RAG_Eval_with_responses.jsonl", resume=resume)
+# GENERATION_MODE=batch reicht alle offenen Fragen als Batch-Job ein (z.B. für
+# nächtliche Läufe, BATCH_ENDPOINT=local testet das offline)
+if os.getenv("GENERATION_MODE", "sync").lower() == "batch":
+    generate_all_batch(data, SYSTEM_PROMPT, config, params, checkpoint=checkpoint)
+else:
+    generate_all(data, SYSTEM_PROMPT, config, params, concurrency=concurrency, checkpoint=checkpoint)
+
+# 3. Ergebnisse speichern (abgerufene Kontexte separat in V2_RAG_Eval_contexts.parquet)
+save_responses(data, "V2_RAG_Eval_with_responses.json", dataset_hash=dataset.hash)
+
+# Telemetrie (Latenz, Tokens, Retries je Aufruf), siehe TELEMETRY_EXPORT
+export_from_env(prefix="telemetry_generation")
 
 print("Alle Antworten generiert und gespeichert.")
@@ -0,0 +1,7 @@
+"""
+Gemeinsamer Code für die Generierungs- und Evaluationsskripte der
+Sytem-Prompt_Vn-Ordner.
+
+Die Skripte in den Versionsordnern unterscheiden sich nur im System-Prompt;
+Client-Konfiguration, Request-Aufbau und Retry-Logik liegen in diesem Paket.
+"""
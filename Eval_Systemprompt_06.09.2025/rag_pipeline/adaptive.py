@@ -0,0 +1,364 @@
+"""
+Adaptive Evaluation: Prompt-Versionen in Runden bewerten und schwache
+Versionen früh aussortieren, statt jede Version auf allen Fragen zu
+generieren und zu bewerten.
+
+Alle Versionen sehen die Fragen in derselben (zufälligen, per Seed festen)
+Reihenfolge; Vergleiche sind also immer gepaart über dieselben Fragen.
+Bewertet wird nur eine Metrik (Default Correctness).
+
+- ``halving`` (Successive Halving): Runde r bewertet alle aktiven Versionen
+  auf den ersten ``initial · eta^r`` Fragen, nur das beste 1/eta (nach
+  Mittelwert) kommt weiter.
+- ``bound`` (Successive Elimination): je Runde ``batch`` neue Fragen für alle
+  aktiven Versionen. Eine Version fliegt raus, sobald die obere
+  Konfidenzgrenze ihrer gepaarten Differenz zum aktuellen Spitzenreiter unter
+  0 liegt (Normalapproximation, frühestens ab ``min_questions`` Fragen,
+  Default die Hälfte des Datensatzes, höchstens 50).
+  Weil nach jeder Runde erneut getestet wird, ist ``alpha`` über den ganzen
+  Lauf aufgeteilt: Runde r bekommt ``alpha · 6/(π² r²)`` (Summe über alle
+  Runden ≤ alpha), innerhalb der Runde Bonferroni über die Versionen.
+
+Generierung und Judge laufen über ``pipeline.run_pipeline`` mit geteilten
+Rate Limitern, Antwort-/Judge-Cache und einem Checkpoint je Version wie im
+Matrix-Runner. Ergebnis: ``<out>/adaptive_rounds.csv`` (je Runde und Version
+Fragen, Mittelwert, Grenzen und Status).
+
+Simulation ohne API (Einsparung und Trefferquote der Strategien):
+
+    python -m rag_pipeline.adaptive --simulate --sim-versions 50 --sim-questions 2000
+
+Echter Lauf (aus Eval_Systemprompt_06.09.2025):
+
+    python -m rag_pipeline.adaptive --strategy bound --versions V0 V4 V9 V12
+"""
+import os
+import abc
+import copy
+import math
+import asyncio
+import argparse
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, "results", "adaptive")
+DEFAULT_METRIC = "correctness"
+DEFAULT_BATCH = 25
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_QUESTIONS = 50
+# Anteil der Fragen, bevor ``bound`` aussortieren darf (höchstens DEFAULT_MIN_QUESTIONS)
+MIN_QUESTION_SHARE = 0.5
+ROUNDS_FILE = "adaptive_rounds.csv"
+
+
+class Scheduler(abc.ABC):
+    """Buchführung für beide Strategien: Score-Matrix Versionen × Fragen (NaN = nicht bewertet)."""
+
+    def __init__(self, versions: list, n_questions: int, seed: int = 0):
+        self.versions = list(versions)
+        self.scores = np.full((len(self.versions), n_questions), np.nan)
+        self.order = np.random.default_rng(seed).permutation(n_questions)
+        self.active = list(range(len(self.versions)))
+        self.evaluated = 0      # Länge des Präfixes von ``order``, das alle aktiven Versionen gesehen haben
+        self.round = 0
+        self.calls = 0          # (Version, Frage)-Paare, je ein Generierungs- und ein Judge-Aufruf
+        self.history = []
+        self._pending = None
+
+    @property
+    def n_questions(self) -> int:
+        return self.scores.shape[1]
+
+    @property
+    def active_versions(self) -> list:
+        return [self.versions[i] for i in self.active]
+
+    @property
+    def finished(self) -> bool:
+        return len(self.active) <= 1 or self.evaluated >= self.n_questions
+
+    @abc.abstractmethod
+    def _target(self) -> int:
+        """Länge des Präfixes von ``order``, das nach dieser Runde bewertet ist."""
+
+    @abc.abstractmethod
+    def _eliminate(self, columns: np.ndarray) -> dict:
+        """Index -> (Untergrenze, Obergrenze) der aktiven Versionen; setzt ``self.active`` neu."""
+
+    def next_batch(self) -> list:
+        """Fragen (Indizes in den Datensatz), die in dieser Runde jede aktive Version bekommt."""
+        target = max(self.evaluated + 1, min(self.n_questions, self._target()))
+        self._pending = target
+        return self.order[self.evaluated:target].tolist()
+
+    def record(self, version: str, questions: list, scores: list):
+        row = self.versions.index(version)
+        self.scores[row, questions] = np.asarray(scores, dtype=np.float64)
+        self.calls += len(questions)
+
+    def means(self, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        values = self.scores if columns is None else self.scores[:, columns]
+        counts = np.isfinite(values).sum(axis=1)
+        return np.where(counts > 0, np.nansum(values, axis=1) / np.maximum(counts, 1), np.nan)
+
+    def end_round(self) -> list:
+        """Schließt die Runde ab und gibt die ausgeschiedenen Versionen zurück."""
+        self.evaluated = self._pending
+        columns = self.order[:self.evaluated]
+        before = list(self.active)
+        bounds = self._eliminate(columns)
+        if self.evaluated >= self.n_questions and len(self.active) > 1:
+            means = self.means(columns)
+            self.active = [max(self.active, key=lambda i: means[i])]
+        means = self.means(columns)
+        counts = np.isfinite(self.scores[:, columns]).sum(axis=1)
+        for i in before:
+            low, high = bounds.get(i, (np.nan, np.nan))
+            self.history.append({
+                "round": self.round, "version": self.versions[i], "questions": int(counts[i]),
+                "mean": means[i], "diff_low": low, "diff_high": high,
+                "status": "active" if i in self.active else "dropped",
+            })
+        self.round += 1
+        return [self.versions[i] for i in before if i not in self.active]
+
+    def winner(self) -> str:
+        means = self.means(self.order[:self.evaluated])
+        return self.versions[max(self.active, key=lambda i: means[i])]
+
+
+class SuccessiveHalving(Scheduler):
+    def __init__(self, versions: list, n_questions: int, initial: int = DEFAULT_BATCH, eta: int = 2, seed: int = 0):
+        super().__init__(versions, n_questions, seed)
+        self.initial = initial
+        self.eta = eta
+
+    def _target(self) -> int:
+        return self.initial * self.eta ** self.round
+
+    def _eliminate(self, columns: np.ndarray) -> dict:
+        means = self.means(columns)
+        ranked = sorted(self.active, key=lambda i: -np.nan_to_num(means[i], nan=-np.inf))
+        self.active = ranked[:max(1, math.ceil(len(ranked) / self.eta))]
+        return {}
+
+
+def default_min_questions(n_questions: int) -> int:
+    return max(1, min(DEFAULT_MIN_QUESTIONS, math.ceil(MIN_QUESTION_SHARE * n_questions)))
+
+
+class SuccessiveElimination(Scheduler):
+    def __init__(self, versions: list, n_questions: int, batch: int = DEFAULT_BATCH,
+                 alpha: float = DEFAULT_ALPHA, min_questions: Optional[int] = None, seed: int = 0):
+        super().__init__(versions, n_questions, seed)
+        if min_questions is None:
+            min_questions = default_min_questions(n_questions)
+        elif min_questions >= n_questions:
+            # sonst sortiert ``bound`` nie aus und bewertet alles, wie ohne Scheduler
+            raise ValueError(f"min_questions={min_questions} bei nur {n_questions} Fragen: "
+                             f"es würde nie eine Version aussortiert")
+        self.batch = batch
+        self.min_questions = min_questions
+        self.alpha = alpha
+
+    def _target(self) -> int:
+        return max(self.evaluated + self.batch, self.min_questions if self.round == 0 else 0)
+
+    def z(self, round_: int) -> float:
+        """Quantil für Runde ``round_`` (0-basiert): alpha · 6/(π² r²), zweiseitig, Bonferroni über die Versionen."""
+        alpha_round = self.alpha * 6 / (math.pi ** 2 * (round_ + 1) ** 2)
+        return NormalDist().inv_cdf(1 - alpha_round / (2 * max(1, len(self.versions) - 1)))
+
+    def _eliminate(self, columns: np.ndarray) -> dict:
+        means = self.means(columns)
+        leader = max(self.active, key=lambda i: np.nan_to_num(means[i], nan=-np.inf))
+        # gepaarte Differenzen aller aktiven Versionen zum Spitzenreiter in einem Schritt
+        diffs = self.scores[self.active][:, columns] - self.scores[leader, columns]
+        counts = np.isfinite(diffs).sum(axis=1)
+        mean = np.nansum(diffs, axis=1) / np.maximum(counts, 1)
+        centered = np.where(np.isfinite(diffs), diffs - mean[:, None], 0.0)
+        std = np.sqrt((centered ** 2).sum(axis=1) / np.maximum(counts - 1, 1))
+        half = self.z(self.round) * std / np.sqrt(np.maximum(counts, 1))
+        bounds, keep = {}, []
+        for i, m, h, n in zip(self.active, mean, half, counts):
+            bounds[i] = (m - h, m + h)
+            if i == leader or n < self.min_questions or m + h >= 0:
+                keep.append(i)
+        self.active = keep
+        return bounds
+
+
+STRATEGIES = {"halving": SuccessiveHalving, "bound": SuccessiveElimination}
+
+
+def make_scheduler(strategy: str, versions: list, n_questions: int, batch: int = DEFAULT_BATCH,
+                   alpha: float = DEFAULT_ALPHA, min_questions: Optional[int] = None,
+                   seed: int = 0) -> Scheduler:
+    if strategy == "halving":
+        return SuccessiveHalving(versions, n_questions, initial=batch, seed=seed)
+    if strategy == "bound":
+        return SuccessiveElimination(versions, n_questions, batch, alpha, min_questions, seed)
+    raise ValueError(f"Unbekannte Strategie '{strategy}' (erlaubt: {', '.join(STRATEGIES)})")
+
+
+# ---------------------------------------------------------------- Simulation
+
+def simulated_scores(n_versions: int, n_questions: int, spread: float = 0.25, seed: int = 0) -> np.ndarray:
+    """Correctness-artige Scores 1..5: Schwierigkeit je Frage + Qualität je Version + Rauschen."""
+    rng = np.random.default_rng(seed)
+    difficulty = rng.normal(0.0, 0.9, n_questions)
+    quality = rng.normal(0.0, spread, n_versions)
+    latent = 3.2 + difficulty[None, :] + quality[:, None] + rng.normal(0.0, 0.8, (n_versions, n_questions))
+    return np.clip(np.rint(latent), 1, 5)
+
+
+def simulate(scheduler: Scheduler, truth: np.ndarray) -> dict:
+    """Spielt die Runden gegen eine vollständige Score-Matrix durch."""
+    while not scheduler.finished:
+        batch = scheduler.next_batch()
+        for version in scheduler.active_versions:
+            scheduler.record(version, batch, truth[scheduler.versions.index(version), batch])
+        scheduler.end_round()
+    true_means = truth.mean(axis=1)
+    winner = scheduler.versions.index(scheduler.winner())
+    return {"calls": scheduler.calls, "full_calls": truth.size, "rounds": scheduler.round,
+            "correct": winner == int(np.argmax(true_means)),
+            "regret": float(true_means.max() - true_means[winner])}
+
+
+def run_simulation(strategy: str, n_versions: int, n_questions: int, trials: int = 20,
+                   **kwargs) -> dict:
+    results = []
+    for seed in range(trials):
+        truth = simulated_scores(n_versions, n_questions, seed=seed)
+        versions = [f"V{i}" for i in range(n_versions)]
+        results.append(simulate(make_scheduler(strategy, versions, n_questions, seed=seed, **kwargs), truth))
+    calls = np.mean([r["calls"] for r in results])
+    return {"strategy": strategy, "calls_mean": float(calls), "full_calls": n_versions * n_questions,
+            "savings": n_versions * n_questions / calls,
+            "winner_found": float(np.mean([r["correct"] for r in results])),
+            "regret_mean": float(np.mean([r["regret"] for r in results])),
+            "rounds_mean": float(np.mean([r["rounds"] for r in results]))}
+
+
+# ---------------------------------------------------------------- Echter Lauf
+
+async def run_adaptive(scheduler: Scheduler, examples: list, out_dir: str = DEFAULT_OUT_DIR,
+                       metric: str = DEFAULT_METRIC, params=None,
+                       concurrency: Optional[int] = None, eval_concurrency: Optional[int] = None,
+                       resume: bool = True) -> Scheduler:
+    """Runden über die echten Endpunkte, bis eine Version übrig ist oder alle Fragen bewertet sind."""
+    from . import telemetry
+    from .cache import ResponseCache, JudgeCache
+    from .checkpoint import Checkpoint
+    from .evaluation import DEFAULT_EVAL_CONCURRENCY, make_evaluators, make_judge_llm
+    from .generation import DEFAULT_CONCURRENCY, GenerationParams, load_azure_config, make_async_client
+    from .pipeline import run_pipeline
+    from .prompts import load_system_prompt
+    from .ratelimit import RateLimiter
+    from .transport import LazyClient
+
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    eval_concurrency = eval_concurrency or DEFAULT_EVAL_CONCURRENCY
+    params = params or GenerationParams()
+    config = load_azure_config()
+    cache = ResponseCache.from_env()
+    judge_cache = JudgeCache.from_env()
+    gen_limiter = RateLimiter.from_env()
+    judge_limiter = RateLimiter.from_env("JUDGE_OPENAI")
+    gen_semaphore = asyncio.Semaphore(max(1, concurrency))
+    judge_semaphore = asyncio.Semaphore(max(1, eval_concurrency))
+    # vor der Event-Loop-Arbeit bauen, der LlamaIndex-Import blockiert sonst laufende Requests
+    evaluators = {metric: make_evaluators(make_judge_llm())[metric]}
+    prompts = {version: load_system_prompt(version) for version in scheduler.versions}
+    checkpoints = {version: Checkpoint(os.path.join(out_dir, version, "V2_RAG_Eval_with_responses.jsonl"),
+                                       resume=resume) for version in scheduler.versions}
+    client = LazyClient(make_async_client, config)
+
+    async def _version(version: str, batch: list):
+        data = [copy.deepcopy(examples[q]) for q in batch]
+        with telemetry.attributes(prompt_version=version):
+            rows = await run_pipeline(data, prompts[version], client, config, evaluators, params,
+                                      concurrency=concurrency, eval_concurrency=eval_concurrency,
+                                      limiter=gen_limiter, judge_limiter=judge_limiter, cache=cache,
+                                      checkpoint=checkpoints[version], judge_cache=judge_cache,
+                                      gen_semaphore=gen_semaphore, judge_semaphore=judge_semaphore,
+                                      metrics=(metric,))
+        scheduler.record(version, batch, [row[f"{metric}_score"] for row in rows])
+
+    while not scheduler.finished:
+        batch = scheduler.next_batch()
+        active = scheduler.active_versions
+        print(f"Runde {scheduler.round}: {len(active)} Versionen × {len(batch)} neue Fragen")
+        await asyncio.gather(*(_version(version, batch) for version in active))
+        dropped = scheduler.end_round()
+        if dropped:
+            print(f"  ausgeschieden: {', '.join(dropped)}")
+    write_rounds(scheduler, out_dir)
+    telemetry.write_telemetry(out_dir)
+    return scheduler
+
+
+def write_rounds(scheduler: Scheduler, out_dir: str) -> str:
+    import pandas as pd
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, ROUNDS_FILE)
+    history = pd.DataFrame(scheduler.history)
+    history.loc[(history["round"] == scheduler.round - 1) & (history["version"] == scheduler.winner()),
+                "status"] = "winner"
+    history.to_csv(path, index=False, sep=';', encoding='utf-8-sig')
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt-Versionen adaptiv in Runden evaluieren")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="bound")
+    parser.add_argument("--versions", nargs="+", help="z.B. V0 V4 V12 (Default: alle unter prompts/)")
+    parser.add_argument("--dataset", help="Name, Hash oder Pfad (Default: V2_RAG_Eval)")
+    parser.add_argument("--metric", default=DEFAULT_METRIC, choices=("correctness", "relevance", "faithfulness"))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH,
+                        help="neue Fragen je Runde (bound) bzw. Fragen der ersten Runde (halving)")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA,
+                        help="Fehlerniveau über den ganzen Lauf, auf die Runden aufgeteilt (bound)")
+    parser.add_argument("--min-questions", type=int,
+                        help=f"Fragen vor dem ersten Aussortieren (bound); muss kleiner als der Datensatz sein "
+                             f"(Default: {MIN_QUESTION_SHARE:.0%} der Fragen, höchstens {DEFAULT_MIN_QUESTIONS})")
+    parser.add_argument("--seed", type=int, default=0, help="Reihenfolge der Fragen")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--fresh", action="store_true", help="vorhandene Checkpoints verwerfen")
+    parser.add_argument("--simulate", action="store_true", help="nur simulieren, keine API-Aufrufe")
+    parser.add_argument("--sim-versions", type=int, default=50)
+    parser.add_argument("--sim-questions", type=int, default=2000)
+    parser.add_argument("--trials", type=int, default=20)
+    args = parser.parse_args(argv)
+    options = dict(batch=args.batch, alpha=args.alpha, min_questions=args.min_questions)
+
+    if args.simulate:
+        for strategy in sorted(STRATEGIES):
+            result = run_simulation(strategy, args.sim_versions, args.sim_questions, args.trials, **options)
+            print(f"{strategy:8s} {result['calls_mean']:9.0f} von {result['full_calls']} Aufrufen "
+                  f"({result['savings']:.1f}x weniger), Gewinner gefunden in {result['winner_found']:.0%}, "
+                  f"mittlerer Abstand zum besten {result['regret_mean']:.3f}, {result['rounds_mean']:.1f} Runden")
+        return
+
+    from dotenv import load_dotenv
+    from .datasets import DEFAULT_DATASET, load_dataset
+    from .prompts import list_prompt_versions
+    from .transport import run_async
+
+    load_dotenv()
+    examples = load_dataset(args.dataset or DEFAULT_DATASET).examples
+    versions = args.versions or list_prompt_versions()
+    scheduler = make_scheduler(args.strategy, versions, len(examples), seed=args.seed, **options)
+    run_async(run_adaptive(scheduler, examples, args.out, args.metric, resume=not args.fresh))
+    full = len(versions) * len(examples)
+    print(f"Gewinner: {scheduler.winner()} nach {scheduler.round} Runden, "
+          f"{scheduler.calls} von {full} Generierungs-/Judge-Aufrufen -> {os.path.join(args.out, ROUNDS_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
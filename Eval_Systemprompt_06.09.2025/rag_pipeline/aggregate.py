@@ -0,0 +1,268 @@
+"""
+Versionsübergreifende Auswertung aller Evaluationsergebnisse.
+
+Sucht unter einem Wurzelordner alle evaluation_results_with_feedback.csv
+(sonst evaluation_results_detailed.csv), sowohl in den Sytem-Prompt_Vn-Ordnern
+als auch in der Ablage des Matrix-Runners (``<Datensatz>/<Version>/<Parameter>``).
+Jede Datei wird genau einmal mit pyarrow gelesen (parallel); danach gibt es
+nur noch eine lange, spaltenorientierte Tabelle
+
+    dataset | params | version | question_id | question | metric | score | passing | feedback
+
+auf der Rangliste und Heatmap als Gruppierungen bzw. Pivot laufen, statt
+Schleifen über einzelne DataFrames. ``question_id`` ist die ``example_id``
+aus dem Datensatz-Register (siehe ``datasets``) und damit über Versionen und
+Läufe stabil, auch bei doppelten Fragetexten; ältere CSVs ohne diese Spalte
+bekommen dieselbe Ableitung aus dem Fragetext. Mit ``--store`` kommen
+die Ergebnisse statt aus den CSVs aus dem Parquet-Store (siehe ``results``),
+ein einziger memory-mapped Scan.
+
+Ausgabe (Default: Wurzelordner):
+
+- results_long.parquet     die lange Tabelle
+- leaderboard.csv          Mittelwert je Metrik und Gesamt, Rang je Datensatz/Parameter
+- question_heatmap.csv     Frage × Version (Gesamtscore oder --metric)
+- question_heatmap.html    dieselbe Matrix farbig, ohne zusätzliche Abhängigkeiten
+
+    python -m rag_pipeline.aggregate
+    python -m rag_pipeline.aggregate --root results --metric correctness_score
+    python -m rag_pipeline.aggregate --store
+"""
+import os
+import html
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .datasets import example_ids
+from .evaluation import METRICS
+from .prompts import version_from_path
+from .results import DEFAULT_STORE_PATH, ResultStore
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_FILES = ("evaluation_results_with_feedback.csv", "evaluation_results_detailed.csv")
+OVERALL = "overall_average_score"
+LABELS = ("dataset", "params", "version")
+DEFAULT_DATASET = "V2_RAG_Eval"
+DEFAULT_PARAMS = "default"
+
+
+def find_result_files(root: str = BASE_DIR) -> list:
+    """(Pfad, Labels) je Ergebnisordner; versteckte Ordner (.rag_cache usw.) werden übersprungen."""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        name = next((f for f in RESULT_FILES if f in files), None)
+        if name is not None:
+            path = os.path.join(directory, name)
+            found.append((path, run_labels(path, root)))
+    return found
+
+
+def run_labels(path: str, root: str) -> dict:
+    """Version, Datensatz und Parameter aus dem Pfad (Versionsordner oder Matrix-Runner-Ablage)."""
+    version = version_from_path(path)
+    if version is not None:
+        return {"dataset": DEFAULT_DATASET, "params": DEFAULT_PARAMS, "version": version}
+    parts = os.path.relpath(os.path.dirname(path), root).split(os.sep)
+    if len(parts) >= 3:
+        return {"dataset": parts[-3], "params": parts[-1], "version": parts[-2]}
+    return {"dataset": DEFAULT_DATASET, "params": DEFAULT_PARAMS, "version": parts[-1]}
+
+
+def _read_csv(path: str, labels: dict):
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    score_types = {f"{m}_score": pa.float64() for m in METRICS}
+    passing_types = {f"{m}_passing": pa.bool_() for m in METRICS}
+    table = pv.read_csv(
+        path,
+        parse_options=pv.ParseOptions(delimiter=";", newlines_in_values=True),
+        convert_options=pv.ConvertOptions(column_types={**score_types, **passing_types, OVERALL: pa.float64(),
+                                                        "question": pa.string(), "example_id": pa.string()}),
+    )
+    # je Datei, damit Dubletten in Dateireihenfolge dieselben Suffixe bekommen wie im Register
+    questions = table.column("question").to_pylist()
+    derived = example_ids(q or "" for q in questions)
+    if "example_id" in table.column_names:
+        given = table.column("example_id").to_pylist()
+        derived = [i or d for i, d in zip(given, derived)]
+        table = table.drop_columns(["example_id"])
+    table = table.append_column("question_id", pa.array(derived, type=pa.string()))
+    for key, value in labels.items():
+        # konstante Spalte als Dictionary: ein Wert, Indizes 0
+        column = pa.DictionaryArray.from_arrays(pa.array(np.zeros(table.num_rows, dtype=np.int32)),
+                                                pa.array([value], type=pa.string()))
+        table = table.append_column(key, column)
+    return table
+
+
+def read_results(files: list, workers: Optional[int] = None):
+    """Alle Ergebnisdateien als eine Arrow-Tabelle (fehlende Spalten werden mit null aufgefüllt)."""
+    import pyarrow as pa
+
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        tables = list(pool.map(lambda item: _read_csv(*item), files))
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def long_table(wide: pd.DataFrame) -> pd.DataFrame:
+    """Eine Zeile je (Lauf, Frage, Metrik)."""
+    base = pd.DataFrame({
+        **{label: wide[label].astype("category") for label in LABELS},
+        "question_id": wide["question_id"].astype("category"),
+        "question": wide["question"].astype(object).fillna("").astype("category"),
+    })
+    parts = []
+    for metric in METRICS:
+        score = f"{metric}_score"
+        if score not in wide:
+            continue
+        part = base.copy()
+        part["metric"] = metric
+        part["score"] = pd.to_numeric(wide[score], errors="coerce")
+        part["passing"] = wide.get(f"{metric}_passing", pd.Series(pd.NA, index=wide.index)).astype("boolean")
+        part["feedback"] = wide.get(f"{metric}_feedback", pd.Series(None, index=wide.index, dtype=object))
+        parts.append(part)
+    long = pd.concat(parts, ignore_index=True)
+    long["metric"] = long["metric"].astype("category")
+    return long
+
+
+def load_long(root: str = BASE_DIR, store: Optional[ResultStore] = None,
+              run_ids: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lange Tabelle aus dem Parquet-Store (ohne ``run_ids`` je Version,
+    Datensatz und Parameter der jüngste Lauf) oder aus den CSVs unter ``root``.
+    """
+    if store is not None:
+        if not store.exists():
+            raise SystemExit(f"Keine Evaluationsergebnisse in {store.path}")
+        columns = ["prompt_version", "dataset", "params", "question_id", "question",
+                   *(f"{m}_{kind}" for kind in ("score", "passing", "feedback") for m in METRICS)]
+        table = store.scan(columns=columns, run_ids=run_ids, latest=not run_ids)
+        wide = table.to_pandas().rename(columns={"prompt_version": "version"})
+    else:
+        files = find_result_files(root)
+        if not files:
+            raise SystemExit(f"Keine Evaluationsergebnisse unter {root}")
+        wide = read_results(files).to_pandas()
+    return long_table(wide)
+
+
+def question_scores(long: pd.DataFrame) -> pd.DataFrame:
+    """Gesamtscore je (Lauf, Frage): Mittel der vorhandenen Metriken, wie overall_average_score."""
+    return (long.groupby([*LABELS, "question_id"], observed=True, sort=False)["score"]
+            .mean().rename(OVERALL).reset_index())
+
+
+def leaderboard(long: pd.DataFrame) -> pd.DataFrame:
+    """Mittelwert je Metrik und Gesamtscore je Lauf, Rang 1 = bester Gesamtscore je Datensatz/Parameter."""
+    per_metric = (long.groupby([*LABELS, "metric"], observed=True)["score"].mean()
+                  .unstack("metric").rename(columns=lambda m: f"{m}_mean"))
+    passing = (long.groupby([*LABELS, "metric"], observed=True)["passing"].mean()
+               .unstack("metric").rename(columns=lambda m: f"{m}_pass_rate"))
+    overall = question_scores(long).groupby(list(LABELS), observed=True)[OVERALL].agg(
+        overall_mean="mean", overall_std="std", questions="count")
+    board = overall.join(per_metric).join(passing.dropna(axis=1, how="all")).reset_index()
+    board["rank"] = (board.groupby(["dataset", "params"], observed=True)["overall_mean"]
+                     .rank(ascending=False, method="min").astype("Int64"))
+    columns = ["rank", *LABELS, "questions", "overall_mean", "overall_std"]
+    board = board[columns + [c for c in board.columns if c not in columns]]
+    return board.sort_values(["dataset", "params", "rank"], ignore_index=True)
+
+
+def _run_names(board: pd.DataFrame) -> list:
+    """Spaltenname je Lauf: nur die Labels, die sich unterscheiden (meist nur die Version)."""
+    varying = [label for label in LABELS if board[label].nunique() > 1] or ["version"]
+    return ["/".join(str(row[label]) for label in varying) for _, row in board.iterrows()]
+
+
+def heatmap(long: pd.DataFrame, board: pd.DataFrame, metric: str = OVERALL) -> pd.DataFrame:
+    """
+    Matrix Frage × Lauf. Spalten in Reihenfolge der Rangliste, Zeilen nach
+    mittlerem Score aufsteigend (die schwierigsten Fragen oben).
+    """
+    if metric == OVERALL:
+        scores = question_scores(long).rename(columns={OVERALL: "score"})
+    else:
+        scores = long[long["metric"] == metric.removesuffix("_score")]
+    matrix = (scores.groupby(["question_id", *LABELS], observed=True)["score"].mean()
+              .unstack(list(LABELS)))
+    runs = pd.MultiIndex.from_frame(board[list(LABELS)].astype(str))
+    matrix.columns = pd.MultiIndex.from_arrays(
+        [matrix.columns.get_level_values(label).astype(str) for label in LABELS])
+    matrix = matrix.reindex(columns=runs)
+    matrix.columns = _run_names(board)
+    matrix = matrix.loc[matrix.mean(axis=1).sort_values(kind="stable").index]
+    texts = long.drop_duplicates("question_id").set_index("question_id")["question"].astype(str)
+    matrix.insert(0, "question", texts.reindex(matrix.index).str.slice(0, 120))
+    return matrix
+
+
+def _colors(values: np.ndarray) -> np.ndarray:
+    """Hintergrundfarbe je Zelle: rot (schlecht) -> gelb -> grün (gut), grau für fehlende Werte."""
+    low, high = np.nanmin(values), np.nanmax(values)
+    t = np.clip((values - low) / (high - low), 0, 1) if high > low else np.zeros_like(values)
+    red = np.where(t < 0.5, 255, (510 * (1 - t)).astype(int))
+    green = np.where(t < 0.5, (510 * t).astype(int), 255)
+    colors = np.char.add(np.char.add(np.char.add("rgb(", red.astype(str)), np.char.add(",", green.astype(str))), ",90)")
+    return np.where(np.isnan(values), "#eeeeee", colors)
+
+
+def write_heatmap_html(matrix: pd.DataFrame, path: str, title: str):
+    values = matrix.drop(columns="question").to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        colors = _colors(values)
+    labels = np.where(np.isnan(values), "", np.char.mod("%.2f", np.nan_to_num(values)))
+    cells = np.char.add(np.char.add(np.char.add('<td style="background:', colors), '">'),
+                        np.char.add(labels, "</td>"))
+    rows = [f'<tr><th title="{html.escape(question)}">{question_id}</th>{"".join(row)}</tr>'
+            for question_id, question, row in zip(matrix.index, matrix["question"], cells)]
+    header = "".join(f"<th>{html.escape(str(name))}</th>" for name in matrix.columns[1:])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+                "<style>body{font-family:sans-serif}table{border-collapse:collapse;font-size:11px}"
+                "td,th{border:1px solid #ccc;padding:2px 4px;text-align:right}</style></head><body>"
+                f"<h3>{html.escape(title)}</h3><table><tr><th>Frage</th>{header}</tr>{''.join(rows)}"
+                "</table></body></html>")
+
+
+def write_aggregate(root: str = BASE_DIR, out_dir: Optional[str] = None, metric: str = OVERALL,
+                    store: Optional[ResultStore] = None, run_ids: Optional[list] = None) -> pd.DataFrame:
+    out_dir = out_dir or root
+    os.makedirs(out_dir, exist_ok=True)
+    long = load_long(root, store, run_ids)
+    board = leaderboard(long)
+    matrix = heatmap(long, board, metric)
+    long.to_parquet(os.path.join(out_dir, "results_long.parquet"), index=False)
+    board.to_csv(os.path.join(out_dir, "leaderboard.csv"), index=False, sep=";", encoding="utf-8-sig")
+    matrix.to_csv(os.path.join(out_dir, "question_heatmap.csv"), sep=";", encoding="utf-8-sig")
+    write_heatmap_html(matrix, os.path.join(out_dir, "question_heatmap.html"), f"{metric} je Frage und Version")
+    return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rangliste und Heatmap über alle Prompt-Versionen")
+    parser.add_argument("--root", default=BASE_DIR, help="Ordner mit Sytem-Prompt_Vn-Ordnern oder Runner-Ergebnissen")
+    parser.add_argument("--out", help="Zielordner (Default: --root)")
+    parser.add_argument("--metric", default=OVERALL,
+                        help=f"Wert der Heatmap: {OVERALL} oder z.B. correctness_score")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH,
+                        help="aus dem Parquet-Store lesen statt aus CSVs (optional Pfad)")
+    parser.add_argument("--run-id", action="append", help="nur diese Läufe aus dem Store (mehrfach möglich)")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store) if args.store else None
+    board = write_aggregate(args.root, args.out, args.metric, store, args.run_id)
+    with pd.option_context("display.width", 160, "display.max_columns", 12):
+        print(board.head(20).to_string(index=False))
+    print(f"\n{len(board)} Läufe -> {args.out or args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Batch-Modus für die Antwortgenerierung (Azure OpenAI Batch API).
+
+Für nächtliche Regressionsläufe braucht es keine interaktive Latenz: alle
+offenen Fragen einer Prompt-Version werden zu einer JSONL-Datei kompiliert
+(der Request aus ``generation.build_request`` im Wire-Format: ``extra_body``
+des SDKs aufgelöst, ``data_sources`` also auf oberster Ebene),
+hochgeladen, als Batch-Job gestartet und gepollt. Die Ergebnisse werden über
+``custom_id`` wieder den Beispielen zugeordnet; danach läuft alles wie gewohnt
+(Checkpoint, Cache, V2_RAG_Eval_with_responses.json + Kontexte).
+
+Die Job-ID steht in ``V2_RAG_Eval_batch.json``: ein Neustart pollt den
+laufenden Job weiter, statt ihn erneut abzuschicken.
+
+``LocalBatchEndpoint`` bildet die benötigten Teile der API (files, batches)
+lokal nach, damit sich der Ablauf offline testen lässt (BATCH_ENDPOINT=local).
+Wie die echte API lehnt er Zeilen mit einem ``extra_body``-Schlüssel ab.
+"""
+import os
+import json
+import time
+import uuid
+from typing import Callable, Optional
+
+from .cache import ResponseCache, response_cache_key
+from .checkpoint import Checkpoint
+from .contexts import extract_contexts, mark_cited
+from .generation import (
+    AzureConfig, GenerationParams, Generation, build_request, retrieve_local, make_client,
+    _resume_from_checkpoint
+)
+
+BATCH_ENDPOINT = "/chat/completions"
+COMPLETION_WINDOW = "24h"
+STATE_FILE = "V2_RAG_Eval_batch.json"
+DEFAULT_POLL_INTERVAL = 30.0
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+# Felder des Wire-Formats, die das SDK nur über ``extra_body`` annimmt
+WIRE_ONLY_FIELDS = ("data_sources",)
+DEFAULT_LOCAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 ".rag_cache", "batches")
+
+
+def request_body(request: dict) -> dict:
+    """SDK-Argumente -> JSON-Body wie auf dem Draht (``extra_body`` aufgelöst, ohne Streaming)."""
+    body = {k: v for k, v in request.items() if k not in ("stream", "stream_options", "extra_body")}
+    body.update(request.get("extra_body") or {})
+    return body
+
+
+def compile_batch(examples: list, system_prompt: str, config: AzureConfig,
+                  params: GenerationParams = GenerationParams(),
+                  deployment: Optional[str] = None) -> tuple:
+    """
+    JSONL-Zeilen für alle Beispiele ohne ``response`` plus die Zuordnung
+    ``custom_id -> {index, request_key, documents}`` für das Zusammenführen.
+    """
+    lines, jobs = [], {}
+    for index, ex in enumerate(examples):
+        if ex.get("response"):
+            continue
+        documents = retrieve_local(ex["query"], params)
+        request = build_request(config, system_prompt, ex["query"], params, documents)
+        key = response_cache_key(request)
+        body = request_body(request)
+        if deployment:
+            body["model"] = deployment
+        custom_id = f"ex-{index}-{key[:12]}"
+        lines.append({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        jobs[custom_id] = {"index": index, "request_key": key, "documents": documents}
+    return lines, jobs
+
+
+def write_jsonl(lines: list, path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return path
+
+
+def submit_batch(client, jsonl_path: str):
+    with open(jsonl_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    return client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                 completion_window=COMPLETION_WINDOW)
+
+
+def poll_batch(client, batch_id: str, interval: float = DEFAULT_POLL_INTERVAL,
+               sleep: Callable[[float], None] = time.sleep):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        done = f" ({counts.completed + counts.failed}/{counts.total})" if counts else ""
+        print(f"Batch {batch_id}: {batch.status}{done}")
+        if batch.status in TERMINAL_STATES:
+            return batch
+        sleep(interval)
+
+
+def fetch_results(client, batch) -> dict:
+    """``custom_id -> Ergebniszeile`` aus Output- und Fehlerdatei."""
+    results = {}
+    for file_id in (getattr(batch, "error_file_id", None), getattr(batch, "output_file_id", None)):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                results[record["custom_id"]] = record
+    return results
+
+
+def merge_results(examples: list, jobs: dict, results: dict,
+                  checkpoint: Optional[Checkpoint] = None,
+                  cache: Optional[ResponseCache] = None) -> int:
+    """Schreibt die Antworten per ``custom_id`` zurück; gibt die Anzahl erfolgreicher zurück."""
+    merged = 0
+    for custom_id, job in jobs.items():
+        record = results.get(custom_id) or {}
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            error = record.get("error") or (response.get("body") or {}).get("error") or "kein Ergebnis"
+            print(f"Batch-Anfrage {custom_id} fehlgeschlagen: {error}")
+            continue
+        message = response["body"]["choices"][0]["message"]
+        content = message.get("content") or ""
+        contexts = (mark_cited(job["documents"], content) if job["documents"] is not None
+                    else extract_contexts(message))
+        ex = examples[job["index"]]
+        ex["response"], ex["retrieved_contexts"] = Generation(content, contexts)
+        if cache is not None:
+            cache.put(job["request_key"], Generation(content, contexts)._asdict())
+        if checkpoint is not None:
+            checkpoint.append(job["index"], ex, job["request_key"])
+        merged += 1
+    return merged
+
+
+def _load_state(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(path: str, state: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+
+
+def make_batch_client(config: AzureConfig):
+    """BATCH_ENDPOINT=local nutzt den lokalen Ersatz, sonst Azure OpenAI."""
+    if os.getenv("BATCH_ENDPOINT", "azure").lower() == "local":
+        return LocalBatchEndpoint()
+    return make_client(config)
+
+
+def generate_all_batch(examples: list, system_prompt: str, config: AzureConfig,
+                       params: GenerationParams = GenerationParams(),
+                       client=None,
+                       checkpoint: Optional[Checkpoint] = None,
+                       cache: Optional[ResponseCache] = None,
+                       state_path: str = STATE_FILE,
+                       poll_interval: Optional[float] = None) -> list:
+    """
+    Gegenstück zu ``generation.generate_all`` über die Batch API. Das Modell
+    kommt aus BATCH_DEPLOYMENT_NAME (Global-Batch-Deployment), sonst aus der
+    normalen Konfiguration. Fehlgeschlagene Anfragen bleiben ohne ``response``
+    und werden beim nächsten Lauf erneut eingereicht.
+    """
+    client = client or make_batch_client(config)
+    cache = cache if cache is not None else ResponseCache.from_env()
+    poll_interval = float(os.getenv("BATCH_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)) \
+        if poll_interval is None else poll_interval
+    keys = [response_cache_key(build_request(config, system_prompt, ex["query"], params)) for ex in examples]
+    _resume_from_checkpoint(examples, keys, checkpoint)
+    if cache is not None:
+        for ex, key in zip(examples, keys):
+            cached = cache.get(key) if not ex.get("response") else None
+            if cached is not None and "contexts" in cached:
+                ex["response"], ex["retrieved_contexts"] = cached["content"], cached["contexts"]
+
+    state = _load_state(state_path)
+    if state is None:
+        lines, jobs = compile_batch(examples, system_prompt, config, params,
+                                    os.getenv("BATCH_DEPLOYMENT_NAME"))
+        if not lines:
+            print("Keine offenen Fragen, kein Batch nötig.")
+            return examples
+        jsonl_path = write_jsonl(lines, os.path.splitext(state_path)[0] + "_input.jsonl")
+        batch = submit_batch(client, jsonl_path)
+        os.remove(jsonl_path)
+        state = {"batch_id": batch.id, "jobs": jobs}
+        _save_state(state_path, state)
+        print(f"Batch {batch.id} mit {len(lines)} Anfragen eingereicht.")
+    else:
+        print(f"Setze Batch {state['batch_id']} fort ({len(state['jobs'])} Anfragen).")
+
+    batch = poll_batch(client, state["batch_id"], poll_interval)
+    merged = merge_results(examples, state["jobs"], fetch_results(client, batch), checkpoint, cache)
+    print(f"{merged}/{len(state['jobs'])} Antworten aus Batch {batch.id} übernommen.")
+    os.remove(state_path)
+    return examples
+
+
+# --- Lokaler Ersatz für die Batch API ----------------------------------------
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def offline_completion(body: dict) -> dict:
+    """Deterministische Platzhalter-Antwort, wenn kein Chat-Client angegeben ist."""
+    question = body["messages"][-1]["content"]
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": f"[lokaler Batch] {question}",
+                                 "context": {"citations": [], "intent": ""}}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class LocalBatchEndpoint:
+    """
+    Minimaler Nachbau von ``client.files`` und ``client.batches``. Die Anfragen
+    werden beim ersten ``retrieve`` abgearbeitet, entweder über einen echten
+    (oder gemockten) Chat-Client oder mit ``offline_completion``.
+    """
+
+    def __init__(self, workdir: str = DEFAULT_LOCAL_DIR, chat_client=None):
+        self.workdir = workdir
+        self.chat_client = chat_client
+        os.makedirs(workdir, exist_ok=True)
+        self.files = _Obj(create=self._create_file, content=self._file_content)
+        self.batches = _Obj(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.workdir, name)
+
+    def _create_file(self, file, purpose: str = "batch"):
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        with open(self._path(file_id), "wb") as f:
+            f.write(file.read())
+        return _Obj(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id: str):
+        with open(self._path(file_id), "r", encoding="utf-8") as f:
+            return _Obj(text=f.read())
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str):
+        batch = {"id": f"batch-{uuid.uuid4().hex[:16]}", "status": "validating", "endpoint": endpoint,
+                 "input_file_id": input_file_id, "output_file_id": None, "error_file_id": None,
+                 "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        self._write_batch(batch)
+        return self._as_obj(batch)
+
+    def _write_batch(self, batch: dict):
+        with open(self._path(batch["id"] + ".json"), "w", encoding="utf-8") as f:
+            json.dump(batch, f)
+
+    @staticmethod
+    def _as_obj(batch: dict):
+        return _Obj(**{**batch, "request_counts": _Obj(**batch["request_counts"])})
+
+    def _complete(self, body: dict) -> dict:
+        if "extra_body" in body:
+            raise ValueError("Unrecognized request argument supplied: extra_body")
+        if self.chat_client is None:
+            return offline_completion(body)
+        # zurück in SDK-Argumente: data_sources kennt ``create`` nur über extra_body
+        extra = {k: body[k] for k in WIRE_ONLY_FIELDS if k in body}
+        kwargs = {k: v for k, v in body.items() if k not in extra}
+        completion = self.chat_client.chat.completions.create(**kwargs, extra_body=extra or None)
+        return completion.model_dump() if hasattr(completion, "model_dump") else completion
+
+    def _retrieve_batch(self, batch_id: str):
+        with open(self._path(batch_id + ".json"), "r", encoding="utf-8") as f:
+            batch = json.load(f)
+        if batch["status"] in TERMINAL_STATES:
+            return self._as_obj(batch)
+
+        outputs, errors = [], []
+        for line in self._file_content(batch["input_file_id"]).text.splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            record = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            try:
+                body = self._complete(request["body"])
+                outputs.append({**record, "response": {"status_code": 200, "body": body}, "error": None})
+            except Exception as e:
+                status = getattr(e, "status_code", 400 if isinstance(e, ValueError) else 500)
+                errors.append({**record, "response": {"status_code": status, "body": {}},
+                               "error": {"message": str(e)}})
+        for kind, records in (("output_file_id", outputs), ("error_file_id", errors)):
+            if records:
+                batch[kind] = f"file-{uuid.uuid4().hex[:16]}"
+                write_jsonl(records, self._path(batch[kind]))
+        batch["status"] = "completed"
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs),
+                                   "failed": len(errors)}
+        self._write_batch(batch)
+        return self._as_obj(batch)
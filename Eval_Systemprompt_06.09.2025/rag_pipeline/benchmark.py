@@ -0,0 +1,404 @@
+"""
+End-to-End-Benchmark für Generierung und Evaluation gegen den lokalen Mock.
+
+Pro Konfiguration (Datensatzgröße × Concurrency × Retry-Policy) wird ein
+frischer ``mockserver`` als Subprozess gestartet, dann laufen
+``agenerate_response`` für alle Fragen und die drei LlamaIndex-Evaluatoren
+(``aevaluate_row``) über die echten Clients (AzureOpenAI bzw. OpenAI-Judge).
+Gemessen werden Fragen/s, Judge-Aufrufe/s, p50/p95/p99 je Aufruf und die
+429-Zähler des Servers. Der Antwort-Cache ist dabei aus.
+
+``startup`` misst die Fixkosten eines Laufs: die Import-Zeit der Module in
+einem frischen Interpreter (und welche schweren Abhängigkeiten dabei schon
+geladen werden) sowie ein komplettes Generierungsskript, dessen Antworten alle
+aus einem vorab gefüllten Cache kommen.
+
+Jede Messung ist eine JSON-Zeile mit Commit-Hash und einem stabilen
+``config_key``; ``compare`` stellt zwei Ergebnisdateien (z.B. zweier Commits)
+gegenüber.
+
+    python -m rag_pipeline.benchmark run --sizes 40,1000,10000 --concurrency 1,8,32 \\
+        --policies default,limiter-only --latency lognormal:0.8,0.4 --error-rate 0.02
+    python -m rag_pipeline.benchmark startup --size 40 --repeats 5
+    python -m rag_pipeline.benchmark compare alt.jsonl neu.jsonl
+"""
+import os
+import sys
+import json
+import time
+import socket
+import glob
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from .cache import ResponseCache, response_cache_key
+from .ratelimit import RateLimiter
+from .generation import (
+    AzureConfig, GenerationParams, API_VERSION, build_request, make_async_client, agenerate_response
+)
+from .evaluation import make_judge_llm, make_evaluators, aevaluate_row
+from .datasets import DEFAULT_DATASET, load_dataset
+from .prompts import load_system_prompt
+from .transport import run_async
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS = os.path.join(BASE_DIR, "benchmarks", "results.jsonl")
+DEPLOYMENT = "gpt-4o-mock"
+STARTUP_MODULES = ("rag_pipeline.generation", "rag_pipeline.evaluation", "rag_pipeline.batch",
+                   "rag_pipeline.pipeline", "rag_pipeline.runner")
+# dürfen beim bloßen Import nicht geladen werden
+HEAVY_MODULES = ("openai", "httpx", "pandas", "pyarrow", "llama_index", "numpy")
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    name: str
+    base_backoff: float     # Backoff des RateLimiter ohne retry-after-Header
+    max_backoff: float
+    sdk_retries: int        # eingebaute Wiederholungen des openai-Clients
+
+
+POLICIES = {
+    "default": RetryPolicy("default", 1.0, 60.0, 2),
+    "limiter-only": RetryPolicy("limiter-only", 1.0, 60.0, 0),
+    "fast": RetryPolicy("fast", 0.1, 5.0, 0),
+}
+
+
+def synthetic_examples(size: int, dataset: str = DEFAULT_DATASET) -> list:
+    """Die 40 echten Beispiele, zyklisch auf ``size`` erweitert (Fragen eindeutig gemacht)."""
+    base = load_dataset(dataset).examples
+    examples = []
+    for i in range(size):
+        ex = dict(base[i % len(base)])
+        ex.pop("response", None)
+        ex.pop("example_id", None)
+        if i >= len(base):
+            ex["query"] = f"{ex['query']} (Variante {i // len(base)})"
+        examples.append(ex)
+    return examples
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    p50, p95, p99 = np.percentile(np.asarray(values, dtype=np.float64), [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(np.mean(values))}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return json.loads(r.read())
+
+
+class MockProcess:
+    """Mock-Server als eigener Prozess, damit er nicht um den GIL des Benchmarks konkurriert."""
+
+    def __init__(self, args: list):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "rag_pipeline.mockserver", "--port", str(self.port), *args],
+            cwd=BASE_DIR, stdout=subprocess.DEVNULL)
+        for _ in range(100):
+            try:
+                self.stats()
+                return
+            except OSError:
+                time.sleep(0.05)
+        self.close()
+        raise RuntimeError("Mock-Server startet nicht")
+
+    def stats(self) -> dict:
+        return _get_json(self.url + "/stats")
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+async def _timed(coro_fn) -> float:
+    start = time.perf_counter()
+    await coro_fn()
+    return time.perf_counter() - start
+
+
+async def _bench_generation(examples: list, system_prompt: str, config: AzureConfig,
+                            concurrency: int, policy: RetryPolicy) -> tuple:
+    limiter = RateLimiter(base_backoff=policy.base_backoff, max_backoff=policy.max_backoff)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with make_async_client(config).with_options(max_retries=policy.sdk_retries) as client:
+        async def _fill(ex):
+            ex["response"], ex["retrieved_contexts"] = await agenerate_response(
+                ex["query"], system_prompt, client, config, limiter=limiter, cache=None)
+
+        async def _call(ex):
+            async with semaphore:   # Latenz ohne Wartezeit auf einen freien Worker
+                return await _timed(lambda: _fill(ex))
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(_call(ex) for ex in examples))
+        return time.perf_counter() - start, list(latencies)
+
+
+async def _bench_evaluation(examples: list, concurrency: int, policy: RetryPolicy) -> tuple:
+    llm = make_judge_llm()
+    llm.max_retries = policy.sdk_retries
+    evaluators = make_evaluators(llm)
+    limiter = RateLimiter(base_backoff=policy.base_backoff, max_backoff=policy.max_backoff)
+    judge_semaphore = asyncio.Semaphore(concurrency)
+    row_semaphore = asyncio.Semaphore(concurrency)
+
+    async def _call(i, ex):
+        # Zeit pro Zeile (drei Judge-Aufrufe), ohne Wartezeit auf einen freien Platz
+        async with row_semaphore:
+            return await _timed(lambda: aevaluate_row(i, ex, evaluators, limiter, judge_semaphore))
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(_call(i, ex) for i, ex in enumerate(examples)))
+    return time.perf_counter() - start, list(latencies)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(size: int, concurrency: int, policy: RetryPolicy, mock_args: list,
+             version: str = "V0", skip_eval: bool = False) -> list:
+    """Eine Konfiguration messen; gibt je Phase (generation, evaluation) einen Datensatz zurück."""
+    mock = MockProcess(mock_args)
+    try:
+        os.environ["OPENAI_API_BASE"] = mock.url + "/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+        config = AzureConfig(mock.url, "https://mock.search", "mock", "mock", DEPLOYMENT, "mock-index", API_VERSION)
+        examples = synthetic_examples(size)
+        phases = [("generation", lambda: _bench_generation(examples, load_system_prompt(version), config,
+                                                           concurrency, policy))]
+        if not skip_eval:
+            phases.append(("evaluation", lambda: _bench_evaluation(examples, concurrency, policy)))
+
+        base = {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "size": size,
+            "concurrency": concurrency,
+            "policy": policy.name,
+            "mock_args": " ".join(mock_args),
+        }
+        results = []
+        for phase, run in phases:
+            before = mock.stats()
+            elapsed, latencies = run_async(run())
+            after = mock.stats()
+            kind = "generation" if phase == "generation" else "judge"
+            calls = after.get(f"{kind}_requests", 0) - before.get(f"{kind}_requests", 0)
+            throttled = after.get(f"{kind}_429", 0) - before.get(f"{kind}_429", 0)
+            results.append({
+                **base,
+                "phase": phase,
+                "config_key": f"{phase}|n={size}|c={concurrency}|{policy.name}|{' '.join(mock_args)}",
+                "elapsed_s": elapsed,
+                "items_per_s": size / elapsed if elapsed else None,
+                "calls": calls,
+                "calls_per_s": calls / elapsed if elapsed else None,
+                "http_429": throttled,
+                **{f"latency_{k}_s": v for k, v in percentiles(latencies).items()},
+            })
+        return results
+    finally:
+        mock.close()
+
+
+def _python(args: list, cwd: str = BASE_DIR, env: Optional[dict] = None) -> tuple:
+    """Frischer Interpreter; gibt (Sekunden, stdout) zurück."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)[:80]} fehlgeschlagen:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stdout
+
+
+def import_times(modules: tuple = STARTUP_MODULES, repeats: int = 5) -> list:
+    """Median der Import-Zeit je Modul abzüglich Interpreterstart, plus mitgeladene schwere Module."""
+    baseline = statistics.median(_python(["-c", "pass"])[0] for _ in range(repeats))
+    probe = "import json, sys; print(json.dumps([m for m in {heavy} if m in sys.modules]))"
+    results = []
+    for module in modules:
+        runs = [_python(["-c", f"import {module}; " + probe.format(heavy=HEAVY_MODULES)]) for _ in range(repeats)]
+        results.append({
+            "module": module,
+            "import_s": max(0.0, statistics.median(t for t, _ in runs) - baseline),
+            "interpreter_s": baseline,
+            "heavy_modules": json.loads(runs[0][1].strip().splitlines()[-1]),
+        })
+    return results
+
+
+def _version_dir(version: str) -> str:
+    matches = glob.glob(os.path.join(BASE_DIR, f"Sytem-Prompt_{version}_*"))
+    if not matches:
+        raise SystemExit(f"Kein Ordner für Version {version}")
+    return matches[0]
+
+
+def cache_hit_run(size: int = 40, version: str = "V0", repeats: int = 3) -> dict:
+    """
+    Startet das Generierungsskript der Version ``repeats``-mal in einem
+    temporären Ordner; alle Antworten liegen vorab im Cache. Gemessen wird
+    die komplette Laufzeit des Prozesses.
+    """
+    script = os.path.join(_version_dir(version), "Response-generation-RAG-V0.py")
+    # Endpunkt ohne Server: ein Cache-Miss würde als Fehler auffallen
+    config = AzureConfig("http://127.0.0.1:9", "https://mock.search", "mock", "mock", DEPLOYMENT,
+                         "mock-index", API_VERSION)
+    with tempfile.TemporaryDirectory() as tmp:
+        examples = synthetic_examples(size)
+        dataset_file = os.path.join(tmp, "V2_RAG_Eval.json")
+        with open(dataset_file, "w", encoding="utf-8") as f:
+            json.dump({"examples": examples}, f, ensure_ascii=False)
+        cache_path = os.path.join(tmp, "responses.sqlite")
+        cache = ResponseCache(cache_path)
+        system_prompt = load_system_prompt(version)
+        for ex in examples:
+            contexts = [{"rank": r, "doc_id": f"doc{r}", "chunk_id": "0", "title": f"Dokument {r}", "url": None,
+                         "search_score": 1.0 / (r + 1), "rerank_score": None, "filter_reason": None,
+                         "cited": r == 0, "content": ex.get("reference_answer") or ""} for r in range(3)]
+            key = response_cache_key(build_request(config, system_prompt, ex["query"], GenerationParams()))
+            cache.put(key, {"content": f"Antwort auf: {ex['query']}", "contexts": contexts})
+        cache.close()
+
+        env = {**os.environ,
+               "ENDPOINT_URL": config.endpoint, "SEARCH_ENDPOINT": config.search_endpoint,
+               "SEARCH_KEY": config.search_key, "AZURE_OPENAI_API_KEY": config.subscription_key,
+               "DEPLOYMENT_NAME": config.deployment_name, "SEARCH_INDEX": config.index_name,
+               "EVAL_DATASET": dataset_file, "RESPONSE_CACHE": "on", "RESPONSE_CACHE_PATH": cache_path,
+               "GENERATION_RESUME": "off", "GENERATION_MODE": "sync", "GENERATION_STREAM": "off", "TELEMETRY_EXPORT": "off"}
+        timings = [_python([script], cwd=tmp, env=env)[0] for _ in range(repeats)]
+        with open(os.path.join(tmp, "V2_RAG_Eval_with_responses.json"), "r", encoding="utf-8") as f:
+            answered = sum(ex.get("response", "").startswith("Antwort auf:") for ex in json.load(f)["examples"])
+    if answered != size:
+        raise RuntimeError(f"Nur {answered}/{size} Antworten aus dem Cache")
+    return {"elapsed_s": statistics.median(timings), "min_s": min(timings), "max_s": max(timings)}
+
+
+def run_startup(size: int = 40, version: str = "V0", repeats: int = 5) -> list:
+    base = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "phase": "startup",
+    }
+    results = [{**base, "config_key": f"startup|import|{r['module']}", "elapsed_s": r["import_s"], **r}
+               for r in import_times(repeats=repeats)]
+    run = cache_hit_run(size, version, repeats)
+    results.append({**base, "config_key": f"startup|cache-hit|n={size}|{version}", "size": size,
+                    "items_per_s": size / run["elapsed_s"], **run})
+    return results
+
+
+def append_results(results: list, path: str = DEFAULT_RESULTS):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in results:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def compare(old_path: str, new_path: str):
+    """Gleiche ``config_key`` beider Dateien gegenüberstellen (jeweils die letzte Messung)."""
+    def _load(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return {r["config_key"]: r for r in map(json.loads, filter(str.strip, f))}
+
+    old, new = _load(old_path), _load(new_path)
+    keys = sorted(old.keys() & new.keys())
+    throughput = [k for k in keys if not k.startswith("startup|")]
+    print(f"{'Konfiguration':<60} {'alt/s':>9} {'neu/s':>9} {'Faktor':>7} {'p95 alt':>8} {'p95 neu':>8}")
+    for key in throughput:
+        a, b = old[key], new[key]
+        factor = b["items_per_s"] / a["items_per_s"] if a["items_per_s"] else float("nan")
+        print(f"{key[:60]:<60} {a['items_per_s']:>9.2f} {b['items_per_s']:>9.2f} {factor:>7.2f} "
+              f"{a['latency_p95_s']:>8.3f} {b['latency_p95_s']:>8.3f}")
+    startup = [k for k in keys if k.startswith("startup|")]
+    if startup:
+        print(f"\n{'Startzeit':<60} {'alt s':>9} {'neu s':>9} {'Faktor':>7}")
+        for key in startup:
+            a, b = old[key]["elapsed_s"], new[key]["elapsed_s"]
+            print(f"{key[:60]:<60} {a:>9.3f} {b:>9.3f} {b / a if a else float('nan'):>7.2f}")
+
+
+def _ints(text: str) -> list:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durchsatz-Benchmark für Generierung und Evaluation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run")
+    run.add_argument("--sizes", type=_ints, default=[40], help="z.B. 40,1000,10000")
+    run.add_argument("--concurrency", type=_ints, default=[1, 8, 32])
+    run.add_argument("--policies", default="default", help=f"Komma-getrennt aus {', '.join(POLICIES)}")
+    run.add_argument("--latency", default="lognormal:0.8,0.4", help="Latenz der Generierung im Mock")
+    run.add_argument("--judge-latency", default="lognormal:0.6,0.3")
+    run.add_argument("--error-rate", type=float, default=0.0)
+    run.add_argument("--rpm", type=int, default=0)
+    run.add_argument("--version", default="V0", help="System-Prompt-Version")
+    run.add_argument("--skip-eval", action="store_true")
+    run.add_argument("--out", default=DEFAULT_RESULTS)
+    startup = sub.add_parser("startup", help="Import-Zeiten und Lauf komplett aus dem Cache")
+    startup.add_argument("--size", type=int, default=40)
+    startup.add_argument("--version", default="V0")
+    startup.add_argument("--repeats", type=int, default=5)
+    startup.add_argument("--out", default=DEFAULT_RESULTS)
+    cmp = sub.add_parser("compare")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        compare(args.old, args.new)
+        return
+    if args.command == "startup":
+        results = run_startup(args.size, args.version, args.repeats)
+        append_results(results, args.out)
+        for record in results:
+            heavy = f" (lädt {', '.join(record['heavy_modules'])})" if record.get("heavy_modules") else ""
+            print(f"{record['config_key']}: {record['elapsed_s']:.3f} s{heavy}")
+        return
+
+    mock_args = ["--latency", args.latency, "--judge-latency", args.judge_latency,
+                 "--error-rate", str(args.error_rate), "--rpm", str(args.rpm)]
+    for size in args.sizes:
+        for concurrency in args.concurrency:
+            for name in args.policies.split(","):
+                for record in run_case(size, concurrency, POLICIES[name], mock_args, args.version, args.skip_eval):
+                    append_results([record], args.out)
+                    print(f"{record['config_key']}: {record['items_per_s']:.2f}/s, "
+                          f"p95 {record['latency_p95_s']:.3f} s, 429: {record['http_429']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Persistenter Antwort-Cache auf SQLite-Basis.
+
+Der Schlüssel ist ein SHA-256 über alles, was die Antwort beeinflusst:
+System-Prompt, Frage, Deployment, max_tokens/temperature/top_p und die
+Retrieval-Parameter der azure_search-Datenquelle (index_name,
+top_n_documents, strictness, query_type). Keys/Endpunkte gehen bewusst
+nicht in den Schlüssel ein, die Frage nur normalisiert (``normalize.query_key``).
+
+Wird die Datei größer als ``max_bytes``, fliegen die am längsten nicht
+gelesenen Einträge raus (LRU).
+
+``JudgeCache`` speichert nach demselben Prinzip die Urteile der Evaluatoren
+(Score, passing, Begründung). Schlüssel: Evaluator-Klasse, Judge-Modell, Hash
+der Judge-Templates sowie Frage, Antwort, Referenz und Kontexte. Gleiche
+Antworten werden so über Läufe und Prompt-Versionen hinweg nur einmal bewertet.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+from .normalize import query_key
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  ".rag_cache", "responses.sqlite")
+DEFAULT_JUDGE_CACHE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "judgments.sqlite")
+DEFAULT_MAX_MB = 512
+
+RETRIEVAL_KEYS = ("index_name", "top_n_documents", "strictness", "query_type")
+
+
+def _hash(payload: dict) -> str:
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(request: dict) -> str:
+    """Cache-Schlüssel für einen mit ``generation.build_request`` gebauten Request."""
+    sources = []
+    for source in (request.get("extra_body") or {}).get("data_sources", []):
+        parameters = source.get("parameters", {})
+        sources.append({
+            "type": source.get("type"),
+            **{k: parameters.get(k) for k in RETRIEVAL_KEYS},
+        })
+    # Nutzerfrage normalisiert: Schreibvarianten derselben Frage teilen sich den Eintrag
+    messages = [{**m, "content": query_key(m["content"])} if m.get("role") == "user" else m
+                for m in request.get("messages") or []]
+    return _hash({
+        "messages": messages,
+        "model": request.get("model"),
+        "max_tokens": request.get("max_tokens"),
+        "temperature": request.get("temperature"),
+        "top_p": request.get("top_p"),
+        "data_sources": sources,
+    })
+
+
+def judge_cache_key(evaluator: str, model: Optional[str], template_hash: str, query: Optional[str] = None,
+                    response: Optional[str] = None, reference: Optional[str] = None,
+                    contexts: Optional[list] = None) -> str:
+    """Cache-Schlüssel für ein Judge-Urteil (ein Evaluator-Aufruf)."""
+    return _hash({
+        "evaluator": evaluator,
+        "model": model,
+        "template": template_hash,
+        "query": None if query is None else query_key(query),
+        "response": response,
+        "reference": reference,
+        "contexts": contexts,
+    })
+
+
+class SQLiteCache:
+    """Key/Value-Store (JSON-Werte) mit größenbasierter LRU-Verdrängung."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 table: str = "responses"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_lru ON {table}(last_access)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        blob = json.dumps(value, ensure_ascii=False)
+        size = len(blob.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache(SQLiteCache):
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """
+        RESPONSE_CACHE=off schaltet den Cache ab; Pfad und Größe über
+        RESPONSE_CACHE_PATH und RESPONSE_CACHE_MAX_MB.
+        """
+        if os.getenv("RESPONSE_CACHE", "on").lower() in ("0", "off", "false", "no"):
+            return None
+        return cls(
+            path=os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+        )
+
+
+class JudgeCache(SQLiteCache):
+    def __init__(self, path: str = DEFAULT_JUDGE_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes, table="judgments")
+
+    @classmethod
+    def from_env(cls) -> Optional["JudgeCache"]:
+        """
+        JUDGE_CACHE=off schaltet den Cache ab; Pfad und Größe über
+        JUDGE_CACHE_PATH und JUDGE_CACHE_MAX_MB.
+        """
+        if os.getenv("JUDGE_CACHE", "on").lower() in ("0", "off", "false", "no"):
+            return None
+        return cls(
+            path=os.getenv("JUDGE_CACHE_PATH", DEFAULT_JUDGE_CACHE_PATH),
+            max_bytes=int(float(os.getenv("JUDGE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+        )
@@ -0,0 +1,98 @@
+"""
+Append-only JSONL-Checkpoint für die Generierung.
+
+Jede fertige Antwort wird sofort als eine Zeile angehängt und per fsync auf
+die Platte geschrieben. Ein Absturz bei Frage 39 verliert damit höchstens die
+gerade laufenden Requests; eine dabei halb geschriebene letzte Zeile wird beim
+Öffnen abgeschnitten. Beim Neustart werden alle Fragen übersprungen, deren
+Request-Schlüssel (Prompt, Frage, Parameter, siehe ``cache.response_cache_key``)
+schon im Checkpoint steht. Ein geänderter Prompt erzeugt dagegen neue Antworten.
+
+Die Datei kann von der Evaluation schon gelesen werden, während die
+Generierung noch läuft (``evaluation.load_examples`` versteht .jsonl).
+"""
+import os
+import json
+import hashlib
+import threading
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def read_records(path: str) -> list:
+    """Alle vollständigen Zeilen; eine beim Absturz abgeschnittene letzte Zeile wird ignoriert."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def _truncate_partial_line(path: str, block: int = 1 << 16) -> int:
+    """
+    Kürzt die Datei auf das letzte ``\\n``, damit die nächste Zeile nicht an
+    einen abgebrochenen Schreibvorgang angehängt wird. Gibt die Anzahl
+    entfernter Bytes zurück.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - block)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        if keep < size:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+    return size - keep
+
+
+class Checkpoint:
+    def __init__(self, path: str, resume: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        dropped = _truncate_partial_line(path)
+        if dropped:
+            print(f"Checkpoint {path}: unvollständige letzte Zeile ({dropped} Bytes) verworfen.")
+        self.done = {r["request_key"]: r for r in read_records(path) if "request_key" in r}
+
+    def lookup(self, request_key: str):
+        """Der gespeicherte Eintrag (mit ``response`` und ggf. ``retrieved_contexts``) oder None."""
+        return self.done.get(request_key)
+
+    def append(self, index: int, example: dict, request_key: str):
+        record = {
+            "index": index,
+            "query_hash": query_hash(example["query"]),
+            "request_key": request_key,
+            **example,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.done[request_key] = record
@@ -0,0 +1,122 @@
+"""
+Abgerufene Kontexte der azure_search-Datenquelle.
+
+Azure liefert in ``message.context`` die Zitate (``citations``) und, mit
+``include_contexts: all_retrieved_documents``, alle abgerufenen Chunks samt
+Suchscores. Beides wird hier in eine flache Liste pro Beispiel übersetzt
+(``ex["retrieved_contexts"]``) und neben V2_RAG_Eval_with_responses.json als
+spaltenorientierte Parquet-Datei abgelegt. Die Evaluation nutzt diese Chunks
+als echte ``contexts``, statt der Antwort selbst.
+"""
+import os
+import json
+from typing import Optional
+
+CONTEXTS_FILE = "V2_RAG_Eval_contexts.parquet"
+CONTEXT_COLUMNS = ("rank", "doc_id", "chunk_id", "title", "url", "search_score", "rerank_score",
+                   "filter_reason", "cited", "content")
+
+
+def _message_context(message) -> dict:
+    if isinstance(message, dict):  # z.B. Ergebniszeilen der Batch API
+        return message.get("context") or {}
+    context = getattr(message, "context", None)
+    if context is None:
+        context = (getattr(message, "model_extra", None) or {}).get("context")
+    return context or {}
+
+
+def _doc_key(doc: dict) -> tuple:
+    return (doc.get("filepath") or doc.get("url") or doc.get("title"), doc.get("chunk_id"))
+
+
+def extract_contexts(message) -> list:
+    """
+    Flache Liste der abgerufenen Chunks aus einer Chat-Completion-Message.
+    Ohne ``all_retrieved_documents`` bleiben nur die Zitate (ohne Scores).
+    """
+    context = _message_context(message)
+    citations = context.get("citations") or []
+    retrieved = context.get("all_retrieved_documents") or citations
+    cited = {_doc_key(c) for c in citations}
+    contexts = []
+    for rank, doc in enumerate(retrieved):
+        doc_id, chunk_id = _doc_key(doc)
+        contexts.append({
+            "rank": rank,
+            "doc_id": doc_id,
+            "chunk_id": None if chunk_id is None else str(chunk_id),
+            "title": doc.get("title"),
+            "url": doc.get("url"),
+            "search_score": doc.get("original_search_score"),
+            "rerank_score": doc.get("rerank_score"),
+            "filter_reason": doc.get("filter_reason"),
+            "cited": (doc_id, chunk_id) in cited,
+            "content": doc.get("content") or "",
+        })
+    return contexts
+
+
+def mark_cited(contexts: list, answer: str) -> list:
+    """``cited`` setzen, wenn URL oder [docN]-Verweis in der Antwort vorkommt."""
+    for i, c in enumerate(contexts, start=1):
+        c["cited"] = bool(answer) and bool((c.get("url") and c["url"] in answer) or f"[doc{i}]" in answer)
+    return contexts
+
+
+def context_texts(ex: dict) -> Optional[list]:
+    """Texte der Chunks, die das Modell tatsächlich gesehen hat (nicht herausgefiltert)."""
+    contexts = ex.get("retrieved_contexts")
+    if not contexts:
+        return None
+    texts = [c["content"] for c in contexts if not c.get("filter_reason") and c.get("content")]
+    return texts or None
+
+
+def write_contexts(examples: list, path: str):
+    import pandas as pd
+
+    rows = [{"example_index": i, **{k: c.get(k) for k in CONTEXT_COLUMNS}}
+            for i, ex in enumerate(examples) for c in ex.get("retrieved_contexts") or []]
+    df = pd.DataFrame(rows, columns=["example_index", *CONTEXT_COLUMNS])
+    for col in ("search_score", "rerank_score"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    for col in ("doc_id", "title", "url", "filter_reason"):
+        df[col] = df[col].astype("category")
+    df.to_parquet(path, index=False)
+
+
+def attach_contexts(examples: list, path: str) -> int:
+    """Hängt die Kontexte aus der Parquet-Datei an die Beispiele; gibt die Anzahl Beispiele mit Kontext zurück."""
+    if not os.path.exists(path):
+        return 0
+    import pandas as pd
+
+    df = pd.read_parquet(path)
+    for col in ("doc_id", "title", "url", "filter_reason"):
+        df[col] = df[col].astype(object)
+    df = df.astype(object).where(df.notna(), None)
+    attached = 0
+    for index, group in df.sort_values(["example_index", "rank"]).groupby("example_index"):
+        if index < len(examples) and not examples[index].get("retrieved_contexts"):
+            examples[index]["retrieved_contexts"] = group[list(CONTEXT_COLUMNS)].to_dict("records")
+            attached += 1
+    return attached
+
+
+def save_responses(examples: list, json_path: str = "V2_RAG_Eval_with_responses.json",
+                   dataset_hash: Optional[str] = None) -> Optional[str]:
+    """
+    Schreibt das gewohnte JSON (ohne Kontexte, mit dem Hash des Datensatzes
+    aus ``datasets``) und, falls vorhanden, die Kontexte als Parquet in
+    denselben Ordner. Gibt den Parquet-Pfad zurück.
+    """
+    with open(json_path, "w", encoding="utf-8") as f:
+        slim = [{k: v for k, v in ex.items() if k != "retrieved_contexts"} for ex in examples]
+        payload = {"dataset": dataset_hash, "examples": slim} if dataset_hash else {"examples": slim}
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    if not any(ex.get("retrieved_contexts") for ex in examples):
+        return None
+    contexts_path = os.path.join(os.path.dirname(os.path.abspath(json_path)), CONTEXTS_FILE)
+    write_contexts(examples, contexts_path)
+    return contexts_path
@@ -0,0 +1,204 @@
+"""
+Evaluationsdatensätze liegen genau einmal unter ``datasets/<Hash>.json``,
+adressiert über den SHA-256 ihres Inhalts (Frage, Referenzkontexte,
+Referenzantwort je Beispiel). ``datasets/index.json`` ordnet Namen wie
+``V2_RAG_Eval`` einem Hash zu. Früher lag in jedem Sytem-Prompt_Vn-Ordner eine
+eigene Kopie von V2_RAG_Eval.json, ohne Garantie, dass alle gleich sind.
+
+Jedes Beispiel trägt eine stabile ``example_id``: die ersten 16 Stellen von
+``checkpoint.query_hash`` der Frage, bei doppelten Fragen mit Suffix ``-2``,
+``-3`` usw. Sie wandert über Checkpoint und V2_RAG_Eval_with_responses.json
+(dort steht zusätzlich der Datensatz-Hash) bis in die Ergebnisse, ist dort
+``question_id`` im Ergebnis-Store, Spalte ``example_id`` der CSV-Ansichten und
+der Schlüssel, über den Aggregator und ``stats`` die Versionen paaren.
+Ergebnisse ohne ``example_id`` (ältere Läufe) bekommen dieselbe Ableitung aus
+dem Fragetext in Dateireihenfolge (``example_ids``).
+
+Skripte und Runner referenzieren einen Datensatz über Namen, Hash (oder
+eindeutigen Präfix) oder einen Dateipfad; die Skripte lesen EVAL_DATASET
+(Default ``V2_RAG_Eval``).
+
+    python -m rag_pipeline.datasets list
+    python -m rag_pipeline.datasets add neue_fragen.json --name V3_RAG_Eval
+    python -m rag_pipeline.datasets verify
+"""
+import os
+import copy
+import json
+import hashlib
+import argparse
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from .checkpoint import query_hash
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets")
+INDEX_FILE = "index.json"
+DEFAULT_DATASET = "V2_RAG_Eval"
+# Inhalt, über den der Hash gebildet wird; Antworten und IDs gehören nicht dazu
+CONTENT_FIELDS = ("query", "reference_contexts", "reference_answer")
+
+
+class Dataset(NamedTuple):
+    name: str
+    hash: str
+    examples: list
+
+
+def content_hash(examples: list) -> str:
+    payload = [{k: ex.get(k) for k in CONTENT_FIELDS} for ex in examples]
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def example_ids(queries) -> list:
+    """IDs zu Fragen in Reihenfolge: Hash-Präfix, ab der zweiten gleichen Frage mit Suffix."""
+    seen, ids = {}, []
+    for query in queries:
+        base = query_hash(query)[:16]
+        seen[base] = seen.get(base, 0) + 1
+        ids.append(base if seen[base] == 1 else f"{base}-{seen[base]}")
+    return ids
+
+
+def assign_example_ids(examples: list) -> list:
+    """Setzt ``example_id`` für alle Beispiele (in place) und gibt die Liste zurück."""
+    for ex, example_id in zip(examples, example_ids(ex["query"] for ex in examples)):
+        ex["example_id"] = example_id
+    return examples
+
+
+def dataset_path(digest: str, datasets_dir: str = DATASETS_DIR) -> str:
+    return os.path.join(datasets_dir, f"{digest}.json")
+
+
+def read_index(datasets_dir: str = DATASETS_DIR) -> dict:
+    path = os.path.join(datasets_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, payload: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def register(examples: list, name: Optional[str] = None, datasets_dir: str = DATASETS_DIR) -> str:
+    """
+    Legt den Datensatz unter seinem Hash ab (nur falls noch nicht vorhanden)
+    und setzt optional den Namen im Index. Gibt den Hash zurück.
+    """
+    digest = content_hash(examples)
+    os.makedirs(datasets_dir, exist_ok=True)
+    path = dataset_path(digest, datasets_dir)
+    if not os.path.exists(path):
+        examples = assign_example_ids([{k: v for k, v in ex.items() if k != "example_id"} for ex in examples])
+        _write_json(path, {"hash": digest, "examples": examples})
+    if name:
+        index = read_index(datasets_dir)
+        if index.get(name) not in (None, digest):
+            print(f"Datensatz '{name}' zeigt jetzt auf {digest[:12]} (vorher {index[name][:12]}).")
+        index[name] = digest
+        _write_json(os.path.join(datasets_dir, INDEX_FILE), dict(sorted(index.items())))
+    return digest
+
+
+def resolve(ref: str, datasets_dir: str = DATASETS_DIR) -> str:
+    """Hash zu einem Namen, vollständigen Hash oder eindeutigen Hash-Präfix."""
+    index = read_index(datasets_dir)
+    if ref in index:
+        return index[ref]
+    known = {f[:-len(".json")] for f in os.listdir(datasets_dir) if f != INDEX_FILE and f.endswith(".json")} \
+        if os.path.isdir(datasets_dir) else set()
+    matches = [digest for digest in known if digest.startswith(ref)]
+    if len(matches) != 1:
+        raise KeyError(f"Datensatz '{ref}' nicht im Register {datasets_dir} "
+                       f"({'mehrdeutig' if matches else 'unbekannt'}; bekannt: {', '.join(sorted(index)) or '-'})")
+    return matches[0]
+
+
+def dataset_label(ref: str, datasets_dir: str = DATASETS_DIR) -> str:
+    """Anzeigename: Registername, bei Dateipfaden der Dateiname ohne Endung, sonst Hash-Präfix."""
+    if os.path.isfile(ref):
+        return os.path.splitext(os.path.basename(ref))[0]
+    if ref in read_index(datasets_dir):
+        return ref
+    return hash_label(resolve(ref, datasets_dir), datasets_dir)
+
+
+def hash_label(digest: str, datasets_dir: str = DATASETS_DIR) -> str:
+    """Registername zu einem Hash, für nicht registrierte Datensätze der Hash-Präfix."""
+    names = [name for name, h in read_index(datasets_dir).items() if h == digest]
+    return names[0] if names else digest[:12]
+
+
+@lru_cache(maxsize=16)
+def _read_registered(digest: str, datasets_dir: str) -> tuple:
+    with open(dataset_path(digest, datasets_dir), "r", encoding="utf-8") as f:
+        return tuple(json.load(f)["examples"])
+
+
+def load_dataset(ref: str = DEFAULT_DATASET, datasets_dir: str = DATASETS_DIR) -> Dataset:
+    """
+    Datensatz über Name, Hash oder Dateipfad (JSON mit ``examples``). Jeder
+    Aufruf liefert eine eigene Kopie, die Generierung darf sie verändern.
+    """
+    if os.path.isfile(ref):
+        with open(ref, "r", encoding="utf-8") as f:
+            examples = json.load(f)["examples"]
+        return Dataset(dataset_label(ref), content_hash(examples), assign_example_ids(examples))
+    digest = resolve(ref, datasets_dir)
+    return Dataset(dataset_label(ref, datasets_dir), digest,
+                   copy.deepcopy(list(_read_registered(digest, datasets_dir))))
+
+
+def verify(datasets_dir: str = DATASETS_DIR) -> list:
+    """Dateien, deren Inhalt nicht (mehr) zum Hash im Dateinamen passt."""
+    broken = []
+    for name in sorted(os.listdir(datasets_dir)):
+        if name == INDEX_FILE or not name.endswith(".json"):
+            continue
+        with open(os.path.join(datasets_dir, name), "r", encoding="utf-8") as f:
+            if content_hash(json.load(f)["examples"]) != name[:-len(".json")]:
+                broken.append(name)
+    return broken
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Register der Evaluationsdatensätze")
+    parser.add_argument("--dir", default=DATASETS_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Namen, Hashes und Anzahl Beispiele")
+    add = sub.add_parser("add", help="JSON mit 'examples' registrieren")
+    add.add_argument("path")
+    add.add_argument("--name", help="Default: Dateiname ohne Endung")
+    sub.add_parser("verify", help="Hashes aller Dateien prüfen")
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        with open(args.path, "r", encoding="utf-8") as f:
+            examples = json.load(f)["examples"]
+        name = args.name or os.path.splitext(os.path.basename(args.path))[0]
+        print(f"{name} -> {register(examples, name, args.dir)}")
+    elif args.command == "list":
+        names = {}
+        for name, digest in read_index(args.dir).items():
+            names.setdefault(digest, []).append(name)
+        for f in sorted(os.listdir(args.dir)):
+            if f != INDEX_FILE and f.endswith(".json"):
+                digest = f[:-len(".json")]
+                size = len(_read_registered(digest, args.dir))
+                print(f"{digest[:12]}  {size:5d} Beispiele  {', '.join(names.get(digest, [])) or '-'}")
+    else:
+        broken = verify(args.dir)
+        print("Alle Datensätze unverändert." if not broken else f"Inhalt passt nicht zum Hash: {', '.join(broken)}")
+        if broken:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+"""
+Bewertung der generierten Antworten mit den LlamaIndex-Evaluatoren
+(Correctness, Relevancy, Faithfulness) und GPT-4o als Judge.
+
+Jede Metrik wird pro Zeile genau einmal aufgerufen; Score, passing-Flag und
+Begründung stammen aus demselben Evaluator-Result (früher eine zweite
+Evaluationsrunde im "ADD-ON"). Primäre Ablage ist der Parquet-Store
+(``results``); evaluation_results_detailed.csv und
+evaluation_results_with_feedback.csv sind Ansichten daraus.
+
+Mit ``concurrency`` > 1 laufen alle (Zeile × Metrik)-Aufrufe über ``aevaluate``
+gleichzeitig, begrenzt durch ein Semaphor und den gemeinsamen Rate Limiter.
+Die Ergebnisse werden über den Zeilenindex zugeordnet, die Reihenfolge der
+Ausgabe ist also unabhängig davon, wann welcher Aufruf fertig wird.
+
+Mit einem ``JudgeCache`` werden Urteile persistent gespeichert: unveränderte
+Zeilen kosten beim erneuten Bewerten (neue Metrik, neue Prompt-Version mit
+gleicher Antwort) keinen Judge-Aufruf.
+
+Vor den Judges läuft das lokale Pre-Screening (``prescreen``): mit
+PRESCREEN=route bekommen leere und ausweichende Antworten Correctness 1 ohne
+Judge-Aufruf; alle übrigen Metriken bewerten weiter die Judges.
+
+pandas und LlamaIndex werden erst importiert, wenn sie gebraucht werden;
+``LazyEvaluators`` baut Judge-LLM und Evaluator erst beim ersten Zugriff
+auf die jeweilige Metrik.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from .cache import JudgeCache, judge_cache_key
+from .checkpoint import read_records, query_hash
+from .contexts import CONTEXTS_FILE, attach_contexts, context_texts
+from .ratelimit import RateLimiter, is_rate_limit_error, CHARS_PER_TOKEN
+from .prompts import version_from_path
+from .telemetry import span, mark_queued, set_attributes, export_from_env
+from .transport import shared_http_client, shared_async_http_client, run_async, sync_event_loop
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from llama_index.llms.openai import OpenAI
+
+EVAL_MODEL = "gpt-4o"  # or your chosen model
+DEFAULT_EVAL_CONCURRENCY = 8
+MAX_RETRIES = 5
+# Judge-Template und Antwort des Judges, grob geschätzt
+JUDGE_OVERHEAD_TOKENS = 600
+METRICS = ("correctness", "relevance", "faithfulness")
+NO_EVALUATION = "no evaluation possible"
+MAX_FEEDBACK_CHARS = 500
+
+
+class EvalOutcome(NamedTuple):
+    score: Optional[float]
+    passing: Optional[bool]
+    feedback: str
+
+
+def _judge_api_key() -> str:
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise SystemExit("OPENAI_API_KEY env var not set. Provide via .env or environment.")
+    return api_key
+
+
+def make_judge_llm(model: str = EVAL_MODEL) -> "OpenAI":
+    from llama_index.llms.openai import OpenAI
+
+    # Derselbe Verbindungspool wie die Generierung (siehe transport)
+    return OpenAI(api_key=_judge_api_key(), model=model, http_client=shared_http_client(),
+                  async_http_client=shared_async_http_client())
+
+
+def _mk_eval_with_feedback(cls, llm):
+    try:
+        return cls(llm=llm, provide_feedback=True)  # neuere LlamaIndex-Versionen
+    except TypeError:
+        return cls(llm=llm)  # Fallback
+
+
+def _evaluator_class(metric: str):
+    from llama_index.core.evaluation import (
+        CorrectnessEvaluator,
+        RelevancyEvaluator,
+        FaithfulnessEvaluator
+    )
+    return {
+        "correctness": CorrectnessEvaluator,
+        "relevance": RelevancyEvaluator,
+        "faithfulness": FaithfulnessEvaluator,
+    }[metric]
+
+
+def make_evaluators(llm) -> dict:
+    return {metric: _mk_eval_with_feedback(_evaluator_class(metric), llm) for metric in METRICS}
+
+
+class LazyEvaluators(dict):
+    """
+    Wie ``make_evaluators``, aber Judge-LLM und Evaluator entstehen erst beim
+    ersten ``evaluators[metric]``. Der API-Key wird trotzdem sofort geprüft.
+    """
+
+    def __init__(self, model: str = EVAL_MODEL):
+        super().__init__()
+        _judge_api_key()
+        self.model = model
+        self._llm = None
+
+    def __missing__(self, metric: str):
+        if metric not in METRICS:
+            raise KeyError(metric)
+        if self._llm is None:
+            self._llm = make_judge_llm(self.model)
+        self[metric] = _mk_eval_with_feedback(_evaluator_class(metric), self._llm)
+        return self[metric]
+
+
+def _extract_textual_feedback(result_obj) -> Optional[str]:
+    """
+    Versucht, eine knappe Begründung/Erklärung aus dem Evaluator-Result zu lesen.
+    Fällt auf generische Texte zurück, wenn nichts vorhanden ist.
+    """
+    if result_obj is None:
+        return NO_EVALUATION
+
+    # Kandidatenfelder (je nach LlamaIndex-Version):
+    for attr in ("feedback", "reason", "explanation", "details", "message", "raw_response"):
+        if hasattr(result_obj, attr):
+            val = getattr(result_obj, attr)
+            if isinstance(val, str) and val.strip():
+                return val.strip()
+
+    # Manche Implementationen legen Begründungen in einer metadata-Dict ab
+    if hasattr(result_obj, "metadata") and isinstance(result_obj.metadata, dict):
+        for k in ("feedback", "reason", "explanation"):
+            val = result_obj.metadata.get(k)
+            if isinstance(val, str) and val.strip():
+                return val.strip()
+
+    # Als Fallback eine knappe Aussage basierend auf passing/score
+    parts = []
+    if hasattr(result_obj, "passing"):
+        parts.append("passed" if result_obj.passing else "not passed")
+    if hasattr(result_obj, "score") and result_obj.score is not None:
+        parts.append(f"score={result_obj.score}")
+    if parts:
+        return ", ".join(parts)
+
+    return "no feedback available from evaluator"
+
+
+def _outcome_from_result(result) -> EvalOutcome:
+    score = getattr(result, "score", None)
+    passing = getattr(result, "passing", None)
+    # Ensure score is a reasonable number
+    if score is not None and (score < 0 or score > 10):
+        print(f"Warning: Unusual score {score}, setting to None")
+        score = None
+    elif score is None and passing is not None:
+        score = 1.0 if passing else 0.0
+    feedback = _extract_textual_feedback(result)
+    # Kürzen für CSV-Übersichtlichkeit
+    if isinstance(feedback, str) and len(feedback) > MAX_FEEDBACK_CHARS:
+        feedback = feedback[:MAX_FEEDBACK_CHARS] + " ..."
+    return EvalOutcome(score, passing, feedback)
+
+
+def _judge_attributes(evaluator, kwargs: dict) -> dict:
+    llm = getattr(evaluator, "_llm", None)
+    return {
+        "gen_ai.system": "openai",
+        "gen_ai.operation.name": "evaluate",
+        "gen_ai.request.model": getattr(llm, "model", None),
+        "rag.evaluator": type(evaluator).__name__,
+        "rag.query_hash": query_hash(kwargs.get("query") or "")[:16],
+    }
+
+
+def judge_template_hash(evaluator) -> str:
+    """Hash über die Prompt-Templates des Evaluators (und die Score-Schwelle bei Correctness)."""
+    try:
+        prompts = evaluator.get_prompts()
+    except Exception:
+        prompts = {}
+    templates = {name: prompt.get_template() if hasattr(prompt, "get_template") else str(prompt)
+                 for name, prompt in prompts.items()}
+    payload = json.dumps({"templates": templates, "score_threshold": getattr(evaluator, "_score_threshold", None)},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _judge_key(evaluator, kwargs: dict) -> str:
+    llm = getattr(evaluator, "_llm", None)
+    return judge_cache_key(type(evaluator).__name__, getattr(llm, "model", None),
+                           judge_template_hash(evaluator), **kwargs)
+
+
+def _cached_outcome(cache: Optional[JudgeCache], key: Optional[str], call) -> Optional[EvalOutcome]:
+    cached = cache.get(key) if key is not None else None
+    if cached is None:
+        return None
+    call.set(**{"rag.cache_hit": True})
+    return EvalOutcome(cached["score"], cached["passing"], cached["feedback"])
+
+
+def safe_eval(evaluator, cache: Optional[JudgeCache] = None, **kwargs) -> EvalOutcome:
+    """
+    Ein Evaluator-Aufruf liefert Score, passing und Begründung.
+    Fehler werden als 'no evaluation possible' ohne Score zurückgegeben
+    und nicht gecacht.
+    """
+    with span("judge.evaluate", **_judge_attributes(evaluator, kwargs)) as call:
+        key = _judge_key(evaluator, kwargs) if cache is not None else None
+        cached = _cached_outcome(cache, key, call)
+        if cached is not None:
+            return cached
+        # LlamaIndex gibt die Token-Nutzung des Judges nicht zurück
+        call.set(**{"rag.estimated_input_tokens": estimate_judge_tokens(kwargs)})
+        try:
+            started = time.perf_counter()
+            result = evaluator.evaluate(**kwargs)
+            call.set(**{"rag.latency_ms": (time.perf_counter() - started) * 1000})
+            outcome = _outcome_from_result(result)
+            if key is not None:
+                cache.put(key, outcome._asdict())
+            return outcome
+        except Exception as e:
+            print(f"Error: {type(e).__name__}: {e}")
+            call.fail(e)
+            return EvalOutcome(None, None, NO_EVALUATION)
+
+
+def estimate_judge_tokens(kwargs: dict) -> int:
+    chars = sum(len(v) for v in kwargs.values() if isinstance(v, str))
+    chars += sum(len(c) for c in kwargs.get("contexts") or [])
+    return chars // CHARS_PER_TOKEN + JUDGE_OVERHEAD_TOKENS
+
+
+async def asafe_eval(evaluator, limiter: RateLimiter, cache: Optional[JudgeCache] = None,
+                     **kwargs) -> EvalOutcome:
+    """
+    Async-Variante von safe_eval über ``aevaluate``. Rate-Limit-Fehler werden mit
+    der Wartezeit des Limiters wiederholt, andere Fehler ergeben 'no evaluation possible'.
+    """
+    with span("judge.evaluate", **_judge_attributes(evaluator, kwargs)) as call:
+        key = _judge_key(evaluator, kwargs) if cache is not None else None
+        cached = _cached_outcome(cache, key, call)
+        if cached is not None:
+            return cached
+        estimate = estimate_judge_tokens(kwargs)
+        call.set(**{"rag.estimated_input_tokens": estimate})
+        for attempt in range(MAX_RETRIES):
+            waited = time.perf_counter()
+            await limiter.aacquire(estimate)
+            call.add("rag.queue_wait_ms", (time.perf_counter() - waited) * 1000)
+            try:
+                started = time.perf_counter()
+                result = await evaluator.aevaluate(**kwargs)
+                call.set(**{"rag.latency_ms": (time.perf_counter() - started) * 1000})
+                outcome = _outcome_from_result(result)
+                if key is not None:
+                    cache.put(key, outcome._asdict())
+                return outcome
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < MAX_RETRIES - 1:
+                    wait_time = limiter.backoff(e, attempt)
+                    print(f"Rate limit erreicht. Warte {wait_time:.1f} Sekunden... (Versuch {attempt + 1}/{MAX_RETRIES})")
+                    call.record_retry(e)
+                    await asyncio.sleep(wait_time)
+                    continue
+                print(f"Error: {type(e).__name__}: {e}")
+                call.fail(e)
+                return EvalOutcome(None, None, NO_EVALUATION)
+        return EvalOutcome(None, None, NO_EVALUATION)
+
+
+def metric_kwargs(ex: dict) -> dict:
+    """Argumente je Metrik für eine Zeile; Correctness nur mit Referenzantwort."""
+    query = ex["query"]
+    response = ex.get("response") or ""
+    reference = ex.get("reference_answer") or ""
+    # Abgerufene Chunks aus der Generierung; nur ohne sie (alte Läufe) die Antwort selbst
+    contexts = context_texts(ex) or ([response] if response else [""])
+    kwargs = {
+        "relevance": dict(query=query, response=response, contexts=contexts),
+        "faithfulness": dict(query=query, response=response, contexts=contexts),
+    }
+    if isinstance(reference, str) and reference.strip():
+        kwargs["correctness"] = dict(query=query, response=response, contexts=contexts, reference=reference)
+    return kwargs
+
+
+def build_row(idx: int, ex: dict, outcomes: dict) -> dict:
+    row = {
+        "index": idx + 1,
+        "example_id": ex.get("example_id"),
+        "question": ex["query"],
+        "response": ex.get("response") or "",
+        "reference_answer": ex.get("reference_answer") or "",
+    }
+    for metric in METRICS:
+        outcome = outcomes.get(metric) or EvalOutcome(None, None, NO_EVALUATION)
+        row[f"{metric}_score"] = outcome.score
+        row[f"{metric}_passing"] = outcome.passing
+        row[f"{metric}_feedback"] = outcome.feedback
+    return row
+
+
+def evaluate_examples(data: list, evaluators: dict, cache: Optional[JudgeCache] = None,
+                      local: Optional[dict] = None) -> list:
+    """``local``: Zeilenindex -> {Metrik: Urteil} (Pre-Screen), für diese Metriken kein Judge-Aufruf."""
+    rows = []
+    local = local or {}
+    # evaluate() läuft intern über asyncio: eine Loop für alle Aufrufe, damit der Async-Pool gültig bleibt
+    with sync_event_loop():
+        for idx, ex in enumerate(data):
+            print(f"{idx+1}/{len(data)}: Evaluating...")
+            outcomes = dict(local.get(idx) or {})
+            outcomes.update({metric: safe_eval(evaluators[metric], cache, **kwargs)
+                             for metric, kwargs in metric_kwargs(ex).items() if metric not in outcomes})
+            row = build_row(idx, ex, outcomes)
+            print(f"  Scores - Correctness: {row['correctness_score']}, "
+                  f"Relevance: {row['relevance_score']}, Faithfulness: {row['faithfulness_score']}")
+            rows.append(row)
+    return rows
+
+
+async def aevaluate_row(idx: int, ex: dict, evaluators: dict, limiter: RateLimiter,
+                        semaphore: asyncio.Semaphore, cache: Optional[JudgeCache] = None,
+                        metrics: tuple = METRICS, local: Optional[dict] = None) -> dict:
+    """
+    Alle (bzw. die angegebenen) Metriken einer Zeile gleichzeitig (je Aufruf
+    ein Platz im ``semaphore``); Metriken in ``local`` (Pre-Screen) ohne Judge.
+    """
+    async def _metric(metric, kwargs):
+        mark_queued()
+        async with semaphore:
+            return metric, await asafe_eval(evaluators[metric], limiter, cache, **kwargs)
+
+    local = local or {}
+    jobs = [_metric(m, kw) for m, kw in metric_kwargs(ex).items() if m in metrics and m not in local]
+    outcomes = {**local, **dict(await asyncio.gather(*jobs))}
+    return build_row(idx, ex, outcomes)
+
+
+async def aevaluate_examples(data: list, evaluators: dict,
+                             concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+                             limiter: Optional[RateLimiter] = None,
+                             semaphore: Optional[asyncio.Semaphore] = None,
+                             cache: Optional[JudgeCache] = None,
+                             local: Optional[dict] = None) -> list:
+    """
+    Alle (Zeile × Metrik)-Aufrufe parallel; Zeilen kommen in Eingabereihenfolge
+    zurück. ``local``: Zeilenindex -> {Metrik: Urteil} (Pre-Screen), diese
+    Metriken gehen nicht an die Judges.
+    """
+    limiter = limiter or RateLimiter.from_env("JUDGE_OPENAI")
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+    local = local or {}
+    outcomes = [dict(local.get(idx) or {}) for idx in range(len(data))]
+    done = 0
+
+    async def _one(idx, metric, kwargs):
+        nonlocal done
+        mark_queued()
+        async with semaphore:
+            outcomes[idx][metric] = await asafe_eval(evaluators[metric], limiter, cache, **kwargs)
+        done += 1
+        if done % 10 == 0:
+            print(f"Fortschritt: {done} Judge-Aufrufe fertig")
+
+    jobs = [(idx, metric, kwargs) for idx, ex in enumerate(data)
+            for metric, kwargs in metric_kwargs(ex).items() if metric not in outcomes[idx]]
+    print(f"Starte {len(jobs)} Judge-Aufrufe für {len(data)} Zeilen...")
+    await asyncio.gather(*(_one(*job) for job in jobs))
+    return [build_row(idx, ex, outcomes[idx]) for idx, ex in enumerate(data)]
+
+
+def summarize(df: "pd.DataFrame") -> dict:
+    """Summary statistics for all scores; ergänzt df um overall_average_score."""
+    score_columns = [f"{metric}_score" for metric in METRICS]
+    summary_stats = {}
+
+    for col in score_columns:
+        valid_scores = df[col].dropna()
+        if len(valid_scores) > 0:
+            summary_stats[f'{col}_mean'] = valid_scores.mean()
+            summary_stats[f'{col}_std'] = valid_scores.std()
+            summary_stats[f'{col}_min'] = valid_scores.min()
+            summary_stats[f'{col}_max'] = valid_scores.max()
+            summary_stats[f'{col}_count'] = len(valid_scores)
+
+    # Add overall average score - only for rows with valid scores
+    valid_score_cols = [col for col in score_columns if df[col].notna().any()]
+    if valid_score_cols:
+        # Calculate row-wise mean only for non-null values
+        df['overall_average_score'] = df[valid_score_cols].mean(axis=1, skipna=True)
+        overall_scores = df['overall_average_score'].dropna()
+        if len(overall_scores) > 0:
+            summary_stats['overall_average_mean'] = overall_scores.mean()
+            summary_stats['overall_average_std'] = overall_scores.std()
+            summary_stats['overall_average_count'] = len(overall_scores)
+    return summary_stats
+
+
+def write_outputs(rows: list, out_dir: str, dataset: str, prompt_version: Optional[str] = None,
+                  run_id: Optional[str] = None, params: Optional[str] = None) -> dict:
+    """
+    Schreibt die Ergebnistabelle in den Parquet-Store (siehe ``results``,
+    ``dataset`` ist der Name des Datensatzes, siehe ``datasets.hash_label``),
+    evaluation_summary_stats.csv, evaluation_summary_ci.csv (Bootstrap-Intervalle,
+    siehe ``stats``) und als Ansicht evaluation_results_detailed.csv und
+    evaluation_results_with_feedback.csv (Semikolon, utf-8-sig für Excel).
+    """
+    import pandas as pd
+    from .stats import CI_FILE, summary_intervals
+    from .results import DEFAULT_PARAMS, ResultStore, write_views
+
+    df = pd.DataFrame(rows)
+    score_columns = [f"{metric}_score" for metric in METRICS]
+    feedback_columns = [f"{metric}_feedback" for metric in METRICS]
+    passing_columns = [f"{metric}_passing" for metric in METRICS]
+    base_columns = ["index", "example_id", "question", "response", "reference_answer"] + score_columns
+
+    summary_stats = summarize(df)
+    if "overall_average_score" in df.columns:
+        base_columns.append("overall_average_score")
+
+    summary_path = os.path.join(out_dir, "evaluation_summary_stats.csv")
+    ci_path = os.path.join(out_dir, CI_FILE)
+
+    store = ResultStore.from_env()
+    if store is not None:
+        version = prompt_version or version_from_path(os.path.abspath(out_dir)) or "unknown"
+        store_path = store.write(df, version, run_id, dataset, params or DEFAULT_PARAMS)
+    pd.DataFrame([summary_stats]).to_csv(summary_path, index=False, sep=';', encoding='utf-8-sig')
+    intervals = summary_intervals(df)
+    intervals.to_csv(ci_path, index=False, sep=';', encoding='utf-8-sig')
+    views = write_views(df, out_dir, base_columns, base_columns + feedback_columns + passing_columns)
+
+    print(f"Evaluation finished!")
+    if store is not None:
+        print(f"Ergebnisse im Store: {store_path}")
+    for path in views:
+        print(f"Ansicht geschrieben: {path}")
+    print(f"Summary statistics saved as {summary_path}")
+    print(f"Konfidenzintervalle gespeichert: {ci_path}")
+    print(f"\nQuick Summary:")
+    ci = intervals.set_index("metric")
+    for col in score_columns:
+        if f'{col}_mean' in summary_stats:
+            print(f"{col}: {summary_stats[f'{col}_mean']:.3f} ± {summary_stats[f'{col}_std']:.3f} "
+                  f"(95%-KI {ci.at[col, 'ci_low']:.3f} - {ci.at[col, 'ci_high']:.3f})")
+    return summary_stats
+
+
+def read_responses(path: str = "V2_RAG_Eval_with_responses.json") -> tuple:
+    """
+    (Beispiele, Datensatz-Hash) aus dem JSON der Generierung oder direkt aus
+    dem JSONL-Checkpoint (auch während die Generierung noch läuft). Ältere
+    JSONs und der Checkpoint tragen keinen Hash, er wird dann wie in
+    ``datasets`` über die Beispiele gebildet.
+    """
+    from .datasets import content_hash
+
+    digest = None
+    if path.endswith(".jsonl"):
+        # Pro Index gilt der zuletzt geschriebene Eintrag
+        latest = {r.get("index", i): r for i, r in enumerate(read_records(path))}
+        data = [latest[i] for i in sorted(latest)]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        data, digest = payload["examples"], payload.get("dataset")
+        contexts_path = os.path.join(os.path.dirname(os.path.abspath(path)), CONTEXTS_FILE)
+        if attach_contexts(data, contexts_path):
+            print(f"Kontexte aus {contexts_path} geladen.")
+        else:
+            print("Keine abgerufenen Kontexte gefunden, Faithfulness/Relevancy nutzen die Antwort als Kontext.")
+    return data, digest or content_hash(data)
+
+
+def load_examples(path: str = "V2_RAG_Eval_with_responses.json", limit: Optional[int] = None) -> list:
+    """Die Beispiele aus ``read_responses``, auf ``limit`` gekürzt."""
+    data = read_responses(path)[0]
+    return data[:limit] if limit else data
+
+
+def run_evaluation(path: str = "V2_RAG_Eval_with_responses.json", limit: Optional[int] = 40,
+                   out_dir: str = ".", concurrency: Optional[int] = None) -> dict:
+    """
+    ``concurrency`` (Default: EVAL_CONCURRENCY bzw. 8) > 1 nutzt den Async-Runner,
+    1 wertet Zeile für Zeile aus. Quota des Judges über JUDGE_OPENAI_RPM/_TPM,
+    Judge-Cache über JUDGE_CACHE (siehe ``cache.JudgeCache.from_env``),
+    Pre-Screening über PRESCREEN (siehe ``prescreen``).
+    """
+    from .datasets import hash_label
+    from .prescreen import prescreen, prescreen_mode, routed_outcomes, write_prescreen
+
+    if concurrency is None:
+        concurrency = int(os.getenv("EVAL_CONCURRENCY", DEFAULT_EVAL_CONCURRENCY))
+    set_attributes(prompt_version=version_from_path(os.path.abspath(path)))
+    evaluators = LazyEvaluators()
+    cache = JudgeCache.from_env()
+    data, digest = read_responses(path)
+    data = data[:limit] if limit else data
+    mode = prescreen_mode()
+    screen = prescreen(data) if mode != "off" else None
+    local = routed_outcomes(screen, mode) if screen is not None else {}
+    if local:
+        print(f"Pre-Screen: {sum(map(len, local.values()))} Urteile in {len(local)}/{len(data)} Zeilen "
+              f"lokal, ohne Judge-Aufruf")
+    if concurrency > 1:
+        rows = run_async(aevaluate_examples(data, evaluators, concurrency, cache=cache, local=local))
+    else:
+        rows = evaluate_examples(data, evaluators, cache, local)
+    if cache is not None:
+        print(f"Judge-Cache: {cache.hits} Treffer, {cache.misses} neu bewertet")
+    summary_stats = write_outputs(rows, out_dir, dataset=hash_label(digest))
+    if screen is not None:
+        write_prescreen(screen, out_dir, rows)
+    export_from_env(out_dir, "telemetry_evaluation")
+    return summary_stats
@@ -0,0 +1,472 @@
+"""
+Antwortgenerierung über Azure OpenAI mit der azure_search-Datenquelle.
+
+Neben dem bisherigen sequentiellen Aufruf (``generate_response``) gibt es
+einen asyncio-Modus (``agenerate_all``), der viele Requests gleichzeitig
+abschickt. Die Parallelität wird über ein Semaphor begrenzt; jede Antwort
+landet direkt im zugehörigen Eintrag der ``examples``-Liste.
+
+Mit ``GenerationParams(stream=True)`` wird die Antwort als Stream gelesen:
+Time-to-first-token und die Abstände zwischen den Tokens landen im
+Telemetrie-Span, zurückgegeben wird trotzdem die vollständige Message samt
+Zitaten (der ``context`` kommt im ersten Delta).
+
+openai wird erst importiert, wenn ein Client gebaut wird; ``generate_all``
+baut ihn erst bei der ersten Frage, die nicht aus Cache oder Checkpoint kommt.
+"""
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from .cache import ResponseCache, response_cache_key
+from .checkpoint import Checkpoint, query_hash
+from .contexts import extract_contexts, mark_cited, _message_context
+from .normalize import normalize_query, query_key
+from .ratelimit import RateLimiter, is_rate_limit_error
+from .telemetry import span, mark_queued
+from .transport import shared_http_client, shared_async_http_client, run_async, LazyClient
+
+if TYPE_CHECKING:
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+
+API_VERSION = "2025-01-01-preview"
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 5
+
+
+@dataclass(frozen=True)
+class AzureConfig:
+    endpoint: Optional[str]
+    search_endpoint: Optional[str]
+    search_key: Optional[str]
+    subscription_key: Optional[str]
+    deployment_name: Optional[str]
+    index_name: Optional[str]
+    api_version: str = API_VERSION
+
+
+class Generation(NamedTuple):
+    content: str
+    contexts: list      # abgerufene Chunks, siehe contexts.extract_contexts
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    max_tokens: int = 800
+    temperature: float = 0.7      # controls the randomness of the output (0.0 - 1.0)
+    top_p: float = 0.95           # controls the diversity of the output (0.0 - 1.0)
+    query_type: str = "simple"
+    strictness: int = 1
+    top_n_documents: int = 10
+    retrieval: str = "azure_search"  # oder lokal: "bm25", "dense", "hybrid" (Index in LOCAL_INDEX_DIR)
+    stream: bool = False          # Antwort als Stream lesen (misst Time-to-first-token)
+
+
+def load_azure_config() -> AzureConfig:
+    """Holt alle Parameter aus der Umgebung (die .env muss vorher geladen sein)."""
+    return AzureConfig(
+        endpoint=os.getenv("ENDPOINT_URL"),
+        search_endpoint=os.getenv("SEARCH_ENDPOINT"),
+        search_key=os.getenv("SEARCH_KEY"),
+        subscription_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        deployment_name=os.getenv("DEPLOYMENT_NAME"),
+        index_name=os.getenv("SEARCH_INDEX"),
+    )
+
+
+def print_config(config: AzureConfig):
+    print(f"endpoint: {config.endpoint}")
+    print(f"search_endpoint: {config.search_endpoint}")
+    print(f"search_key: {(config.search_key or '')[:6]}...")  # nicht den ganzen Key!
+    print(f"deployment_name: {config.deployment_name}")
+    print(f"index_name: {config.index_name}")
+    print(f"api_key gesetzt? {'JA' if config.subscription_key else 'NEIN'}")
+
+
+def make_client(config: AzureConfig) -> "AzureOpenAI":
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        api_key=config.subscription_key,
+        azure_endpoint=config.endpoint,
+        api_version=config.api_version,
+        http_client=shared_http_client(),
+    )
+
+
+def make_async_client(config: AzureConfig) -> "AsyncAzureOpenAI":
+    from openai import AsyncAzureOpenAI
+
+    return AsyncAzureOpenAI(
+        api_key=config.subscription_key,
+        azure_endpoint=config.endpoint,
+        api_version=config.api_version,
+        http_client=shared_async_http_client(),
+    )
+
+
+def build_chat_prompt(system_prompt: str, question: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": question},
+    ]
+
+
+@lru_cache(maxsize=4096)
+def _search_local(query: str, top_n: int, mode: str) -> tuple:
+    from .retrieval import load_retriever
+    return tuple(load_retriever().search(query, top_n, mode))
+
+
+def retrieve_local(question: str, params: GenerationParams) -> Optional[list]:
+    """
+    Top-n-Chunks aus dem lokalen Index oder None, wenn Azure Search abruft.
+    Gesucht wird mit ``query_key`` der Frage (BM25 und Hashing-Embeddings
+    schreiben ohnehin klein); Treffer werden je Prozess gecacht (Kopien,
+    ``mark_cited`` verändert sie).
+    """
+    if params.retrieval == "azure_search":
+        return None
+    hits = _search_local(query_key(question), params.top_n_documents, params.retrieval)
+    return [dict(hit) for hit in hits]
+
+
+def build_request(config: AzureConfig, system_prompt: str, question: str,
+                  params: GenerationParams = GenerationParams(),
+                  documents: Optional[list] = None) -> dict:
+    """
+    Baut die Argumente für chat.completions.create. Sync- und Async-Pfad
+    schicken damit garantiert denselben Request.
+
+    Bei lokalem Retrieval werden die Chunks (``documents``, sonst hier
+    abgerufen) an den System-Prompt gehängt und keine data_sources gesendet.
+    """
+    if params.retrieval != "azure_search":
+        from .retrieval import format_documents
+        if documents is None:
+            documents = retrieve_local(question, params)
+        request = dict(
+            model=config.deployment_name,
+            messages=build_chat_prompt(f"{system_prompt}\n\n{format_documents(documents)}", question),
+            max_tokens=params.max_tokens,
+            temperature=params.temperature,
+            top_p=params.top_p,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None,
+            stream=params.stream,
+        )
+    else:
+        request = dict(
+            model=config.deployment_name,
+            messages=build_chat_prompt(system_prompt, question),
+            max_tokens=params.max_tokens,
+            temperature=params.temperature,
+            top_p=params.top_p,
+            frequency_penalty=0,  # controls the repetition of words (0.0 - 1.0)
+            presence_penalty=0,   # controls the presence of new words (0.0 - 1.0)
+            stop=None,            # stop sequence for the generation (None means no stop sequence)
+            stream=params.stream,  # whether to stream the response
+            extra_body={
+                "data_sources": [{
+                    "type": "azure_search",
+                    "parameters": {
+                        "filter": None,
+                        "endpoint": config.search_endpoint,
+                        "index_name": config.index_name,
+                        "semantic_configuration": "",
+                        "authentication": {
+                            "type": "api_key",
+                            "key": config.search_key
+                        },
+                        "query_type": params.query_type,
+                        "in_scope": False,
+                        "strictness": params.strictness,
+                        "top_n_documents": params.top_n_documents,
+                        # Zitate plus alle abgerufenen Chunks mit Scores zurückgeben
+                        "include_contexts": ["citations", "intent", "all_retrieved_documents"]
+                    }
+                }]
+            }
+        )
+    if params.stream:
+        # sonst enthält der Stream keine Usage (Telemetrie, TPM-Abrechnung im Limiter)
+        request["stream_options"] = {"include_usage": True}
+    return request
+
+
+class _StreamAssembler:
+    """
+    Setzt die Chunks eines Streams wieder zu einer Message zusammen (Inhalt und
+    ``context`` der azure_search-Erweiterung, der im ersten Delta kommt), nimmt
+    die Usage aus dem letzten Chunk (``stream_options.include_usage``) und
+    misst Time-to-first-token sowie die Abstände zwischen den Tokens.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self.parts = []
+        self.context = {}
+        self.usage = None
+        self.arrivals = []
+
+    def feed(self, chunk):
+        self.usage = getattr(chunk, "usage", None) or self.usage
+        if not chunk.choices:   # z.B. prompt_filter_results vor dem ersten Delta
+            return
+        delta = chunk.choices[0].delta
+        for key, value in _message_context(delta).items():
+            if isinstance(value, list):
+                self.context.setdefault(key, []).extend(value)
+            else:
+                self.context[key] = value
+        if delta.content:
+            self.arrivals.append(time.perf_counter())
+            self.parts.append(delta.content)
+
+    def message(self):
+        return SimpleNamespace(role="assistant", content="".join(self.parts), context=self.context)
+
+    def record(self, call):
+        attributes = {"rag.stream_chunks": len(self.parts)}
+        if self.arrivals:
+            attributes["rag.ttft_ms"] = (self.arrivals[0] - self.started) * 1000
+        if len(self.arrivals) > 1:
+            gaps = [b - a for a, b in zip(self.arrivals, self.arrivals[1:])]
+            attributes["rag.itl_mean_ms"] = sum(gaps) / len(gaps) * 1000
+            attributes["rag.itl_max_ms"] = max(gaps) * 1000
+        call.set(**attributes)
+
+
+def _span_attributes(request: dict, question: str, params: GenerationParams) -> dict:
+    return {
+        "gen_ai.system": "az.ai.openai",
+        "gen_ai.operation.name": "chat",
+        "gen_ai.request.model": request["model"],
+        "gen_ai.request.max_tokens": request["max_tokens"],
+        "gen_ai.request.temperature": request["temperature"],
+        "gen_ai.request.top_p": request["top_p"],
+        "rag.retrieval": params.retrieval,
+        "rag.query_hash": query_hash(question)[:16],
+    }
+
+
+class _GenerationCall:
+    """
+    Alles um den eigentlichen Client-Aufruf herum, gemeinsam für
+    ``generate_response`` und ``agenerate_response``: Request und Cache-Schlüssel,
+    Cache-Treffer, Header und Usage an den Limiter, Kontexte, Telemetrie und die
+    Entscheidung, ob nach einem Fehler erneut versucht wird.
+    """
+
+    def __init__(self, question: str, system_prompt: str, config: AzureConfig, params: GenerationParams,
+                 limiter: Optional[RateLimiter], cache: Optional[ResponseCache]):
+        self.params = params
+        self.documents = retrieve_local(question, params)
+        self.request = build_request(config, system_prompt, question, params, self.documents)
+        self.attributes = _span_attributes(self.request, question, params)
+        self.cache = cache
+        self.key = response_cache_key(self.request) if cache is not None else None
+        self.limiter = limiter or RateLimiter()
+        self.estimate = self.limiter.estimate_tokens(self.request)
+        self.span = None
+        self.started = None
+
+    def cached(self) -> Optional[Generation]:
+        if self.key is None:
+            return None
+        cached = self.cache.get(self.key)
+        # Einträge ohne Kontexte (vor der Kontext-Erfassung) gelten als Miss
+        if cached is None or "contexts" not in cached:
+            return None
+        self.span.set(**{"rag.cache_hit": True})
+        return Generation(cached["content"], cached["contexts"])
+
+    def acquired(self, waited: float):
+        self.span.add("rag.queue_wait_ms", (time.perf_counter() - waited) * 1000)
+
+    def received(self, raw):
+        """Rohantwort -> geparste Completion bzw. Stream (noch nicht gelesen)."""
+        self.limiter.update_from_headers(raw.headers)
+        self.span.record_sdk_retries(getattr(raw, "retries_taken", 0))
+        return raw.parse()
+
+    def finish(self, message, usage, stream: Optional[_StreamAssembler] = None) -> Generation:
+        if stream is not None:
+            stream.record(self.span)
+        self.span.record_usage(usage)
+        self.span.set(**{"rag.latency_ms": (time.perf_counter() - self.started) * 1000})
+        self.limiter.record_usage(self.estimate, usage)
+        contexts = (mark_cited(self.documents, message.content) if self.documents is not None
+                    else extract_contexts(message))
+        generation = Generation(message.content, contexts)
+        if self.key is not None:
+            self.cache.put(self.key, generation._asdict())
+        return generation
+
+    def retry_wait(self, e: Exception, attempt: int) -> float:
+        """Wartezeit vor dem nächsten Versuch; wirft ``e`` nach dem letzten Versuch."""
+        wait_time = self.limiter.backoff(e, attempt)
+        if is_rate_limit_error(e):
+            print(f"Rate limit erreicht. Warte {wait_time:.1f} Sekunden... (Versuch {attempt + 1}/{MAX_RETRIES})")
+        else:
+            print(f"Anderer Fehler: {e}")
+            if attempt == MAX_RETRIES - 1:
+                raise e
+        self.span.record_retry(e)
+        return wait_time
+
+
+def generate_response(question: str, system_prompt: str, client: "AzureOpenAI",
+                      config: AzureConfig, params: GenerationParams = GenerationParams(),
+                      limiter: Optional[RateLimiter] = None,
+                      cache: Optional[ResponseCache] = None) -> Generation:
+    gen = _GenerationCall(question, system_prompt, config, params, limiter, cache)
+    with span("chat.completions", **gen.attributes) as gen.span:
+        cached = gen.cached()
+        if cached is not None:
+            return cached
+
+        # Retry logic for rate limiting
+        for attempt in range(MAX_RETRIES):
+            waited = time.perf_counter()
+            gen.limiter.acquire(gen.estimate)
+            gen.acquired(waited)
+            try:
+                create = client.chat.completions.with_raw_response.create  # baut ggf. den LazyClient
+                gen.started = time.perf_counter()
+                parsed = gen.received(create(**gen.request))
+                if not params.stream:
+                    return gen.finish(parsed.choices[0].message, parsed.usage)
+                stream = _StreamAssembler(gen.started)
+                for chunk in parsed:
+                    stream.feed(chunk)
+                return gen.finish(stream.message(), stream.usage, stream)
+            except Exception as e:
+                time.sleep(gen.retry_wait(e, attempt))
+
+        raise Exception("Maximale Anzahl von Versuchen erreicht")
+
+
+async def agenerate_response(question: str, system_prompt: str, client: "AsyncAzureOpenAI",
+                             config: AzureConfig, params: GenerationParams = GenerationParams(),
+                             limiter: Optional[RateLimiter] = None,
+                             cache: Optional[ResponseCache] = None) -> Generation:
+    """Async-Variante von generate_response mit identischem Request und Retry-Verhalten."""
+    gen = _GenerationCall(question, system_prompt, config, params, limiter, cache)
+    with span("chat.completions", **gen.attributes) as gen.span:
+        cached = gen.cached()
+        if cached is not None:
+            return cached
+
+        for attempt in range(MAX_RETRIES):
+            waited = time.perf_counter()
+            await gen.limiter.aacquire(gen.estimate)
+            gen.acquired(waited)
+            try:
+                create = client.chat.completions.with_raw_response.create  # baut ggf. den LazyClient
+                gen.started = time.perf_counter()
+                parsed = gen.received(await create(**gen.request))
+                if not params.stream:
+                    return gen.finish(parsed.choices[0].message, parsed.usage)
+                stream = _StreamAssembler(gen.started)
+                async for chunk in parsed:
+                    stream.feed(chunk)
+                return gen.finish(stream.message(), stream.usage, stream)
+            except Exception as e:
+                await asyncio.sleep(gen.retry_wait(e, attempt))
+
+        raise Exception("Maximale Anzahl von Versuchen erreicht")
+
+
+def _short(text: str) -> str:
+    return normalize_query(text)[:60]
+
+
+def _resume_from_checkpoint(examples: list, keys: list, checkpoint: Optional[Checkpoint]) -> int:
+    """Übernimmt Antworten aus dem Checkpoint und gibt die Anzahl übernommener zurück."""
+    if checkpoint is None:
+        return 0
+    resumed = 0
+    for ex, key in zip(examples, keys):
+        if not ex.get("response"):
+            record = checkpoint.lookup(key)
+            if record:
+                ex["response"] = record["response"]
+                ex["retrieved_contexts"] = record.get("retrieved_contexts") or []
+                resumed += 1
+    if resumed:
+        print(f"{resumed} Antworten aus Checkpoint {checkpoint.path} übernommen.")
+    return resumed
+
+
+async def agenerate_all(examples: list, system_prompt: str, client: "AsyncAzureOpenAI",
+                        config: AzureConfig, params: GenerationParams = GenerationParams(),
+                        concurrency: int = DEFAULT_CONCURRENCY,
+                        limiter: Optional[RateLimiter] = None,
+                        cache: Optional[ResponseCache] = None,
+                        semaphore: Optional[asyncio.Semaphore] = None,
+                        checkpoint: Optional[Checkpoint] = None) -> list:
+    """
+    Generiert Antworten für alle Beispiele ohne ``response``. Höchstens
+    ``concurrency`` Requests sind gleichzeitig offen; jede Antwort wird direkt
+    in ihren eigenen Eintrag geschrieben, die Reihenfolge bleibt also erhalten.
+    Alle Requests teilen sich ``limiter``, ein 429 bremst also alle Worker.
+    Ein übergebenes ``semaphore`` ersetzt ``concurrency`` (geteilter Worker-Pool).
+    Mit ``checkpoint`` wird jede fertige Antwort sofort angehängt und beim
+    Neustart übersprungen.
+    """
+    limiter = limiter or RateLimiter.from_env()
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+    keys = [response_cache_key(build_request(config, system_prompt, ex["query"], params)) for ex in examples]
+    _resume_from_checkpoint(examples, keys, checkpoint)
+
+    async def _one(index, ex):
+        mark_queued()
+        async with semaphore:
+            print(f"Generiere Antwort für: {_short(ex['query'])}...")
+            generation = await agenerate_response(ex["query"], system_prompt, client, config, params,
+                                                  limiter, cache)
+            ex["response"], ex["retrieved_contexts"] = generation
+        if checkpoint is not None:
+            checkpoint.append(index, ex, keys[index])
+
+    await asyncio.gather(*(_one(i, ex) for i, ex in enumerate(examples) if not ex.get("response")))
+    return examples
+
+
+def generate_all(examples: list, system_prompt: str, config: AzureConfig,
+                 params: GenerationParams = GenerationParams(),
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 limiter: Optional[RateLimiter] = None,
+                 cache: Optional[ResponseCache] = None,
+                 checkpoint: Optional[Checkpoint] = None) -> list:
+    """
+    Einstiegspunkt für die Skripte. ``concurrency`` > 1 nutzt den Async-Client,
+    ``concurrency`` == 1 arbeitet die Fragen nacheinander ab. Das Tempo gibt in
+    beiden Fällen der Rate Limiter vor (Quota über AZURE_OPENAI_RPM/_TPM).
+    Ohne expliziten ``cache`` wird der Antwort-Cache aus der Umgebung genutzt.
+    Der Client entsteht erst beim ersten Cache-Miss.
+    """
+    limiter = limiter or RateLimiter.from_env()
+    cache = cache if cache is not None else ResponseCache.from_env()
+    if concurrency > 1:
+        client = LazyClient(make_async_client, config)
+        return run_async(agenerate_all(examples, system_prompt, client, config, params,
+                                       concurrency, limiter, cache, checkpoint=checkpoint))
+
+    client = LazyClient(make_client, config)
+    keys = [response_cache_key(build_request(config, system_prompt, ex["query"], params)) for ex in examples]
+    _resume_from_checkpoint(examples, keys, checkpoint)
+    for index, ex in enumerate(examples):
+        if not ex.get("response"):
+            print(f"Generiere Antwort für: {_short(ex['query'])}...")
+            ex["response"], ex["retrieved_contexts"] = generate_response(
+                ex["query"], system_prompt, client, config, params, limiter, cache)
+            if checkpoint is not None:
+                checkpoint.append(index, ex, keys[index])
+    return examples
@@ -0,0 +1,374 @@
+"""
+Lokaler Mock-Server für Azure OpenAI (inkl. azure_search) und den Judge.
+
+Spricht das ``chat.completions``-Protokoll unter beiden Pfaden:
+
+- ``/openai/deployments/<deployment>/chat/completions`` (AzureOpenAI, Generierung):
+  Requests mit ``data_sources`` vom Typ azure_search bekommen eine Antwort samt
+  ``message.context`` (citations, intent, all_retrieved_documents). Die Chunks
+  kommen aus dem lokalen Index (``--index``) oder werden synthetisch erzeugt.
+- ``/v1/chat/completions`` (OpenAI, LlamaIndex-Judge): Antworten im Format der
+  Evaluatoren ("4.0\\n<Begründung>" für Correctness, "YES"/"NO" sonst).
+
+Latenzen sind pro Art (generation/judge) als Verteilung konfigurierbar
+(``const:0.2``, ``uniform:0.1,0.5``, ``normal:0.3,0.1``, ``lognormal:<median>,<sigma>``,
+``exp:<mittel>``), dazu der Abstand zwischen den Tokens (``--token-latency``);
+``stream=True`` liefert Server-Sent Events wie Azure. 429-Antworten mit ``retry-after``/``retry-after-ms`` entstehen
+zufällig (``--error-rate``) oder über ein RPM-Limit (``--rpm``); erfolgreiche
+Antworten tragen ``x-ratelimit-limit-*`` und ``x-ratelimit-remaining-*``. Alles ist über ``--seed``
+reproduzierbar; ``GET /stats`` liefert die Zähler.
+
+Start (aus Eval_Systemprompt_06.09.2025) und Skripte dagegen laufen lassen:
+
+    python -m rag_pipeline.mockserver --port 8089 --latency lognormal:0.8,0.4 --error-rate 0.05
+    ENDPOINT_URL=http://127.0.0.1:8089 AZURE_OPENAI_API_KEY=x DEPLOYMENT_NAME=gpt-4o \\
+        OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=x python Response-generation-RAG-V0.py
+"""
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+from .ratelimit import CHARS_PER_TOKEN
+
+DEFAULT_PORT = 8089
+DEPLOYMENT_PATH = re.compile(r"^/openai/deployments/([^/]+)/chat/completions$")
+JUDGE_PATHS = ("/v1/chat/completions", "/chat/completions")
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Latenzverteilung in Sekunden, z.B. ``Latency.parse("lognormal:0.8,0.4")``."""
+    kind: str = "const"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, args = spec.partition(":") if ":" in spec else ("const", "", spec)
+        values = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+        if kind not in ("const", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unbekannte Latenzverteilung '{kind}'")
+        return cls(kind, values[0], values[1] if len(values) > 1 else 0.0)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(self.a, self.b))
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(max(self.a, 1e-6)), self.b)
+        if self.kind == "exp":
+            return rng.expovariate(1.0 / self.a) if self.a > 0 else 0.0
+        return self.a
+
+
+@dataclass
+class MockSettings:
+    latency: Latency = field(default_factory=Latency)
+    judge_latency: Latency = field(default_factory=Latency)
+    token_latency: Latency = field(default_factory=Latency)    # je Token nach dem ersten
+    error_rate: float = 0.0         # Anteil zufälliger 429
+    rpm: int = 0                    # 0 = kein Limit
+    tpm: int = 0
+    retry_after: float = 1.0        # Sekunden im retry-after-Header
+    top_n_documents: int = 5
+    index_dir: Optional[str] = None
+    seed: int = 0
+
+
+def _digest(*parts: str) -> int:
+    return int(hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class MockBackend:
+    """Die eigentliche Logik, unabhängig vom HTTP-Server (auch direkt nutzbar)."""
+
+    def __init__(self, settings: MockSettings = MockSettings()):
+        self.settings = settings
+        self.stats = Counter()
+        self._rng = random.Random(settings.seed)
+        self._lock = threading.Lock()
+        self._window = deque()      # (Zeitpunkt, Tokens) der letzten 60 s
+        self._retriever = None
+        if settings.index_dir:
+            from .retrieval import LocalRetriever
+            self._retriever = LocalRetriever(settings.index_dir)
+
+    # --- Rate Limits -----------------------------------------------------
+
+    def _admit(self, tokens: int) -> tuple:
+        """(zugelassen, Header) – entweder 429-Header oder x-ratelimit-limit-*/-remaining-*."""
+        s = self.settings
+        with self._lock:
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] >= 60:
+                self._window.popleft()
+            used_requests = len(self._window)
+            used_tokens = sum(t for _, t in self._window)
+            over = (s.rpm and used_requests >= s.rpm) or (s.tpm and used_tokens + tokens > s.tpm)
+            if over or (s.error_rate and self._rng.random() < s.error_rate):
+                if over and self._window:
+                    wait = max(0.05, 60 - (now - self._window[0][0]))
+                else:
+                    wait = s.retry_after
+                return False, {"retry-after": str(max(1, math.ceil(wait))),
+                               "retry-after-ms": str(int(wait * 1000))}
+            self._window.append((now, tokens))
+            headers = {}
+            if s.rpm:
+                headers["x-ratelimit-limit-requests"] = str(s.rpm)
+                headers["x-ratelimit-remaining-requests"] = str(s.rpm - used_requests - 1)
+            if s.tpm:
+                headers["x-ratelimit-limit-tokens"] = str(s.tpm)
+                headers["x-ratelimit-remaining-tokens"] = str(max(0, s.tpm - used_tokens - tokens))
+            return True, headers
+
+    def _delay(self, latency: Latency) -> float:
+        with self._lock:
+            return latency.sample(self._rng)
+
+    def _sleep(self, latency: Latency):
+        delay = self._delay(latency)
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- Antworten -------------------------------------------------------
+
+    def _documents(self, question: str, top_n: int) -> list:
+        if self._retriever is not None:
+            hits = self._retriever.search(question, top_n, "hybrid")
+            return [{"content": h["content"], "title": h["title"], "url": h["url"],
+                     "filepath": h["doc_id"], "chunk_id": h["chunk_id"],
+                     "original_search_score": h["search_score"], "rerank_score": None,
+                     "filter_reason": None} for h in hits]
+        seed = _digest(question)
+        docs = []
+        for i in range(top_n):
+            slug = f"doc-{(seed + i * 7919) % 997:03d}"
+            docs.append({
+                "content": f"Synthetischer Abschnitt {i + 1} zu: {question[:200]}",
+                "title": f"PlanQK Dokumentation {slug}",
+                "url": f"https://platform.planqk.de/docs/{slug}",
+                "filepath": f"{slug}.md",
+                "chunk_id": "0",
+                "original_search_score": round(10.0 / (i + 1), 4),
+                "rerank_score": None,
+                "filter_reason": None if i < max(1, top_n - 1) else "score",
+            })
+        return docs
+
+    def _rag_message(self, body: dict, data_sources: list) -> dict:
+        question = body["messages"][-1]["content"]
+        source = next((s for s in data_sources if s.get("type") == "azure_search"), {})
+        top_n = int(source.get("parameters", {}).get("top_n_documents") or self.settings.top_n_documents)
+        docs = self._documents(question, top_n)
+        cited = [d for d in docs if not d["filter_reason"]][:2]
+        refs = " ".join(f"[doc{i}]" for i in range(1, len(cited) + 1))
+        links = ", ".join(d["url"] for d in cited if d["url"])
+        content = (f"Mock-Antwort auf: {question[:300]} {refs}\n\nWeitere Informationen: {links}"
+                   if cited else f"Mock-Antwort auf: {question[:300]}")
+        citations = [{k: d[k] for k in ("content", "title", "url", "filepath", "chunk_id")} for d in cited]
+        return {"role": "assistant", "content": content,
+                "context": {"citations": citations, "intent": json.dumps([question[:100]]),
+                            "all_retrieved_documents": docs}}
+
+    @staticmethod
+    def _judge_message(body: dict) -> dict:
+        prompt = "\n".join(str(m.get("content") or "") for m in body["messages"])
+        seed = _digest(prompt)
+        if "between 1 and 5" in prompt:  # CorrectnessEvaluator
+            score = 2.0 + (seed % 7) * 0.5
+            content = f"{score:.1f}\nMock-Bewertung: Die Antwort ist weitgehend korrekt."
+        else:
+            verdict = "YES" if seed % 5 else "NO"
+            content = f"{verdict}\nMock-Bewertung: Die Antwort {'passt' if verdict == 'YES' else 'passt nicht'} zum Kontext."
+        return {"role": "assistant", "content": content}
+
+    def complete(self, body: dict, kind: str) -> tuple:
+        """(Status, Header, JSON-Body) für einen chat.completions-Request."""
+        if "extra_body" in body:
+            # SDK-Argument, kein Feld des Wire-Formats (data_sources gehört auf die oberste Ebene)
+            return 400, {}, {"error": {"code": "400",
+                                       "message": "Unrecognized request argument supplied: extra_body"}}
+        prompt_tokens = sum(_tokens(str(m.get("content") or "")) for m in body.get("messages", []))
+        ok, headers = self._admit(prompt_tokens + int(body.get("max_tokens") or 0))
+        with self._lock:
+            self.stats[f"{kind}_requests"] += 1
+            if not ok:
+                self.stats[f"{kind}_429"] += 1
+        if not ok:
+            message = f"Requests have exceeded the rate limit. Please retry after {headers['retry-after']} seconds."
+            return 429, headers, {"error": {"code": "429", "message": message}}
+
+        self._sleep(self.settings.judge_latency if kind == "judge" else self.settings.latency)
+        data_sources = body.get("data_sources")
+        if kind == "generation" and data_sources:
+            message = self._rag_message(body, data_sources)
+        elif kind == "generation":
+            message = {"role": "assistant",
+                       "content": f"Mock-Antwort auf: {body['messages'][-1]['content'][:300]} [doc1]"}
+        else:
+            message = self._judge_message(body)
+        completion_tokens = _tokens(message["content"])
+        if not body.get("stream"):
+            # ohne Streaming kommt die Antwort erst nach dem letzten Token
+            delay = sum(self._delay(self.settings.token_latency) for _ in range(completion_tokens - 1))
+            if delay > 0:
+                time.sleep(delay)
+        return 200, headers, {
+            "id": f"chatcmpl-mock-{_digest(json.dumps(body, sort_keys=True)):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "mock",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def stream_chunks(self, completion: dict, include_usage: bool = False):
+        """
+        (Verzögerung, Chunk) wie bei ``stream=True``: erst ein Delta mit Rolle und
+        ``context`` (azure_search), dann ein Delta pro Wort, zuletzt finish_reason.
+        Mit ``stream_options.include_usage`` folgt ein Chunk ohne choices mit ``usage``.
+        """
+        message = completion["choices"][0]["message"]
+        base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                "model": completion["model"]}
+        first = {"role": "assistant", "content": ""}
+        if "context" in message:
+            first["context"] = message["context"]
+        yield 0.0, {**base, "choices": [{"index": 0, "delta": first, "finish_reason": None}]}
+        for i, word in enumerate(re.findall(r"\S+\s*", message["content"])):
+            delay = self._delay(self.settings.token_latency) if i else 0.0
+            yield delay, {**base, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+        yield 0.0, {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if include_usage:
+            yield 0.0, {**base, "choices": [], "usage": completion["usage"]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-Alive wie bei Azure
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: dict, headers: Optional[dict] = None):
+        blob = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(blob)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def _send_stream(self, completion: dict, headers: dict, include_usage: bool = False):
+        """Server-Sent Events mit Chunked Transfer-Encoding (Verbindung bleibt offen)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def _write(text: str):
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for delay, chunk in self.server.backend.stream_chunks(completion, include_usage):
+            if delay > 0:
+                time.sleep(delay)
+            _write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        _write("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self._send(200, dict(self.server.backend.stats))
+        else:
+            self._send(404, {"error": {"code": "404", "message": "Not found"}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        deployment = DEPLOYMENT_PATH.match(path)
+        if deployment:
+            body.setdefault("model", deployment.group(1))
+            status, headers, payload = self.server.backend.complete(body, "generation")
+        elif path in JUDGE_PATHS:
+            status, headers, payload = self.server.backend.complete(body, "judge")
+        else:
+            status, headers, payload = 404, {}, {"error": {"code": "404", "message": f"Unbekannter Pfad {path}"}}
+        if status == 200 and body.get("stream"):
+            self._send_stream(payload, headers, bool((body.get("stream_options") or {}).get("include_usage")))
+        else:
+            self._send(status, payload, headers)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple, settings: MockSettings = MockSettings()):
+        super().__init__(address, _Handler)
+        self.backend = MockBackend(settings)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(settings: MockSettings = MockSettings(), host: str = "127.0.0.1", port: int = 0) -> MockServer:
+    """Startet den Server in einem Hintergrund-Thread (Port 0 = freier Port)."""
+    server = MockServer((host, port), settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokaler Mock für Azure OpenAI + azure_search und den Judge")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="const:0", help="Latenz der Generierung, z.B. lognormal:0.8,0.4")
+    parser.add_argument("--judge-latency", default="const:0", help="Latenz der Judge-Aufrufe")
+    parser.add_argument("--token-latency", default="const:0", help="Abstand zwischen den Tokens (Streaming)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anteil zufälliger 429-Antworten")
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--index", default=None, help="Lokaler Index (rag_pipeline.retrieval) statt synthetischer Chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(Latency.parse(args.latency), Latency.parse(args.judge_latency),
+                            Latency.parse(args.token_latency), args.error_rate, args.rpm, args.tpm,
+                            args.retry_after, args.top_n, args.index, args.seed)
+    server = MockServer((args.host, args.port), settings)
+    print(f"Mock-Server läuft auf {server.url} (Strg+C beendet)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Normalisierung von Fragen vor Cache-Lookup und Retrieval.
+
+Die Fragen in V2_RAG_Eval (und im echten Chatbot-Verkehr) enthalten
+Zero-Width-Spaces, harte Zeilenumbrüche, doppelte Leerzeichen und
+wechselnde Groß-/Kleinschreibung. Für das LLM bleibt der Originaltext
+unverändert; nur wo die Frage als Schlüssel oder Suchanfrage dient, wird sie
+vereinheitlicht:
+
+- ``normalize_query``: Unicode NFKC, Zero-Width-Zeichen und Soft Hyphen
+  entfernen, jeden Whitespace-Lauf (auch Zeilenumbrüche) zu einem Leerzeichen.
+- ``query_key``: zusätzlich ``casefold``. Geht statt des Originaltexts in die
+  Schlüssel von Antwort-, Judge- und Retrieval-Cache ein und ist die
+  Suchanfrage des lokalen Retrievals; "How do I …" und "how  do i …" (mit
+  Zero-Width-Space) treffen damit denselben Eintrag.
+
+Tippfehler ("Lufhansa") werden bewusst nicht korrigiert, das würde die Frage
+verändern. Bei der azure_search-Datenquelle sucht Azure mit der
+Nutzernachricht selbst; dort wirkt die Normalisierung nur auf den Cache.
+
+QUERY_NORMALIZATION=off schaltet die Normalisierung der Schlüssel und der
+Suchanfrage ab (Einträge und Checkpoints von vorher passen dann wieder).
+"""
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+# Zero-Width Space/Non-Joiner/Joiner, Word Joiner, BOM, Soft Hyphen
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"))
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_query(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).translate(_INVISIBLE)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def query_key(text: str) -> str:
+    """Form der Frage für Cache-Schlüssel (ohne Normalisierung der Originaltext)."""
+    if not normalization_enabled():
+        return text
+    return normalize_query(text).casefold()
+
+
+def normalization_enabled() -> bool:
+    return os.getenv("QUERY_NORMALIZATION", "on").lower() not in ("0", "off", "false", "no")
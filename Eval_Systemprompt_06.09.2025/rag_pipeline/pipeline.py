@@ -0,0 +1,116 @@
+"""
+Producer/Consumer-Pipeline: Generierung und Evaluation laufen überlappend.
+
+Generierungs-Worker holen sich die nächste offene Frage, rufen
+``agenerate_response`` auf und legen die Antwort sofort in eine begrenzte
+Queue. Evaluations-Worker nehmen sie dort ab und starten die drei Judge-
+Aufrufe (Correctness, Relevancy, Faithfulness). Die Gesamtdauer nähert sich
+damit max(Generierung, Evaluation) statt deren Summe. Mit PRESCREEN=route
+bekommen leere und ausweichende Antworten Correctness lokal (``prescreen``).
+
+Die Queue-Größe ist die Backpressure: Ist die Evaluation langsamer, warten die
+Generierungs-Worker, statt beliebig viele unbewertete Antworten anzuhäufen.
+Es gibt pro Stufe eine feste Anzahl Worker, nicht eine Task pro Beispiel.
+Beide Stufen laufen unter einem ``gather``: Scheitert ein Worker, werden alle
+anderen abgebrochen und der Fehler weitergereicht, statt dass die Producer vor
+einer Queue warten, die niemand mehr leert.
+"""
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+from .cache import ResponseCache, JudgeCache, response_cache_key
+from .checkpoint import Checkpoint
+from .ratelimit import RateLimiter
+from .generation import (
+    AzureConfig, GenerationParams, DEFAULT_CONCURRENCY, build_request, agenerate_response, _short
+)
+from .evaluation import DEFAULT_EVAL_CONCURRENCY, METRICS, aevaluate_row
+from .telemetry import mark_queued
+
+if TYPE_CHECKING:
+    from openai import AsyncAzureOpenAI
+
+_DONE = object()
+
+
+async def run_pipeline(examples: list, system_prompt: str, client: "AsyncAzureOpenAI",
+                       config: AzureConfig, evaluators: dict,
+                       params: GenerationParams = GenerationParams(),
+                       concurrency: int = DEFAULT_CONCURRENCY,
+                       eval_concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+                       queue_size: Optional[int] = None,
+                       limiter: Optional[RateLimiter] = None,
+                       judge_limiter: Optional[RateLimiter] = None,
+                       cache: Optional[ResponseCache] = None,
+                       checkpoint: Optional[Checkpoint] = None,
+                       judge_cache: Optional[JudgeCache] = None,
+                       gen_semaphore: Optional[asyncio.Semaphore] = None,
+                       judge_semaphore: Optional[asyncio.Semaphore] = None,
+                       metrics: tuple = METRICS,
+                       route_prescreen: Optional[bool] = None) -> list:
+    """
+    Füllt ``examples[i]["response"]`` und gibt die Ergebniszeilen (wie
+    ``evaluation.evaluate_examples``) in Eingabereihenfolge zurück.
+    Bereits beantwortete Beispiele gehen direkt in die Evaluation;
+    ``metrics`` beschränkt die Judge-Aufrufe (z.B. nur Correctness);
+    ``route_prescreen`` (Default: PRESCREEN=route) übernimmt die lokalen
+    Urteile des Pre-Screens.
+    """
+    # erst hier importiert, damit ``import pipeline`` nichts vom Pre-Screen lädt
+    from .prescreen import prescreen_mode, screen_example
+
+    if route_prescreen is None:
+        route_prescreen = prescreen_mode() == "route"
+    limiter = limiter or RateLimiter.from_env()
+    judge_limiter = judge_limiter or RateLimiter.from_env("JUDGE_OPENAI")
+    gen_semaphore = gen_semaphore or asyncio.Semaphore(max(1, concurrency))
+    judge_semaphore = judge_semaphore or asyncio.Semaphore(max(1, eval_concurrency))
+    queue = asyncio.Queue(maxsize=queue_size or 2 * max(1, eval_concurrency))
+    todo = iter(range(len(examples)))
+    rows = [None] * len(examples)
+
+    async def _producer():
+        for index in todo:
+            ex = examples[index]
+            if not ex.get("response"):
+                key = response_cache_key(build_request(config, system_prompt, ex["query"], params))
+                resumed = checkpoint.lookup(key) if checkpoint is not None else None
+                if resumed:
+                    ex["response"] = resumed["response"]
+                    ex["retrieved_contexts"] = resumed.get("retrieved_contexts") or []
+                else:
+                    mark_queued()
+                    async with gen_semaphore:
+                        print(f"Generiere Antwort für: {_short(ex['query'])}...")
+                        ex["response"], ex["retrieved_contexts"] = await agenerate_response(
+                            ex["query"], system_prompt, client, config, params, limiter, cache)
+                    if checkpoint is not None:
+                        checkpoint.append(index, ex, key)
+            await queue.put(index)
+
+    async def _consumer():
+        while True:
+            index = await queue.get()
+            if index is _DONE:
+                return
+            local = screen_example(examples[index]) if route_prescreen else None
+            rows[index] = await aevaluate_row(index, examples[index], evaluators, judge_limiter,
+                                              judge_semaphore, judge_cache, metrics, local)
+            print(f"{index + 1}/{len(examples)}: bewertet")
+
+    producers = [asyncio.create_task(_producer()) for _ in range(max(1, concurrency))]
+    consumers = [asyncio.create_task(_consumer()) for _ in range(max(1, eval_concurrency))]
+
+    async def _close_queue():
+        await asyncio.gather(*producers)
+        for _ in consumers:
+            await queue.put(_DONE)
+
+    tasks = producers + consumers + [asyncio.create_task(_close_queue())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return rows
@@ -0,0 +1,344 @@
+"""
+Lokales Pre-Screening der Antworten vor den GPT-4o-Judges (nur CPU, ohne API).
+
+Für alle Zeilen eines Datensatzes auf einmal:
+
+- ``overlap_recall``/``overlap_f1``: Token-Überlappung mit ``reference_answer``
+  (Tokenmengen je Zeile, Schnittmenge über ``np.intersect1d`` für alle Zeilen
+  zusammen),
+- ``similarity``: Kosinus zwischen Antwort und Referenz (Default gehashte
+  Uni-/Bigramme aus ``retrieval``, über ``embed_fn`` austauschbar),
+- ``citations``/``invalid_citations``: URLs auf planqk.de in der Antwort und
+  wie viele davon keine gültige URL auf einem der PRESCREEN_HOSTS sind
+  (z.B. "https://docs.planqk.de_services_....html"),
+- ``chars``/``tokens`` und ``deflection`` ("The retrieved documents do not
+  provide ..." am Anfang, ohne "However, PlanQK offers ..." danach).
+
+``route`` ordnet jede Zeile ein:
+
+- ``fail``: leer, zu kurz oder Ausweichantwort,
+- ``pass``: hohe Überlappung *und* hohe Ähnlichkeit zur Referenz, mindestens
+  eine gültige Quelle, keine ungültige,
+- ``judge``: alles dazwischen.
+
+Lokal entschieden wird nur, was die Features tatsächlich belegen: Correctness 1
+für ``fail``-Zeilen, und nur wenn die Zeile eine Referenzantwort hat (sonst
+bewertet auch der Judge keine Correctness, siehe ``evaluation.metric_kwargs``).
+Relevancy und Faithfulness hängen von den abgerufenen Kontexten ab und gehen
+immer an die Judges; ``pass`` ist nur ein Hinweis im Bericht, kein Urteil.
+Lokale Urteile erkennt man an der Begründung "Pre-Screen: ...".
+
+Die Schwellen sind gegen die Correctness-Scores der 13 bewerteten Versionen
+(520 Zeilen) gewählt; der CorrectnessEvaluator vergleicht nur Antwort und
+Referenz, die Kontexte der alten Läufe spielen dafür keine Rolle. Gemessen
+darauf entscheidet ``route`` 93 von 1560 Judge-Aufrufen lokal (6 %, je
+Version zwischen 14 bei V1 und 0 bei V12), 91 davon wie der Judge. Je besser
+der Prompt, desto weniger Ausweichantworten und desto weniger Ersparnis.
+
+PRESCREEN (Default ``off``): ``report`` bewertet alles mit den Judges und
+schreibt zusätzlich prescreen_results.csv (Features, Einordnung und
+Übereinstimmung mit dem Judge); ``route`` übernimmt die lokalen Urteile und
+spart die entsprechenden Judge-Aufrufe.
+
+Sofortiges Feedback beim Prompt-Tuning (aus Eval_Systemprompt_06.09.2025):
+
+    python -m rag_pipeline.prescreen Sytem-Prompt_V*/V2_RAG_Eval_with_responses.json
+"""
+import os
+import re
+import glob
+import argparse
+from typing import TYPE_CHECKING, Callable, Optional
+from urllib.parse import urlsplit
+
+from .evaluation import EvalOutcome, METRICS, metric_kwargs
+from .prompts import version_from_path
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+PRESCREEN_FILE = "prescreen_results.csv"
+DEFAULT_HOSTS = ("docs.planqk.de", "platform.planqk.de")
+MIN_CHARS = 40
+MIN_TOKENS = 8
+# Ausweichantworten stehen am Anfang; weiter hinten sind es meist Einschränkungen einer echten Antwort
+DEFLECTION_WINDOW = 300
+PASS_RECALL = 0.7
+PASS_SIMILARITY = 0.3
+# Metrik -> (Score, passing) für ``fail``-Zeilen; andere Metriken entscheidet der Pre-Screen nicht
+FAIL_OUTCOMES = {"correctness": (1.0, False)}
+FAIL_REASON = "Pre-Screen: leere, zu kurze oder ausweichende Antwort"
+DECISIONS = ("fail", "pass", "judge")
+
+_DEFLECTION = re.compile(
+    r"I['’]m sorry|I (?:can['’]?not|can['’]t|couldn['’]t|could not|don['’]t have)"
+    r"|(?:retrieved|provided) (?:context|documents?|data)\s+(?:does|do) not (?:provide|specify|contain|include|mention)"
+    r"|(?:there is )?no (?:specific |relevant )?information (?:provided|available|in the (?:retrieved|provided))"
+    r"|not available in the retrieved data"
+    r"|keine (?:\w+ )?Informationen|leider nicht", re.IGNORECASE)
+# "While the retrieved context does not ..., PlanQK offers ...": eingeschränkte Antwort, kein Ausweichen
+_HEDGE = re.compile(r"\b(?:while|although|though)\b[^.]{0,80}\b(?:does not|do not|no)\b"
+                    r"|\bhowever\b|PlanQK (?:does|offers|provides)", re.IGNORECASE)
+_URL = re.compile(r"https?://[^\s<>()\[\]\"'`,;]+", re.IGNORECASE)
+_ALLOWED_PATH = re.compile(r"^[\w\-./~%#?=&+:@]*$")
+
+
+def prescreen_mode() -> str:
+    mode = os.getenv("PRESCREEN", "off").lower()
+    if mode in ("0", "off", "false", "no"):
+        return "off"
+    if mode not in ("report", "route"):
+        raise ValueError(f"PRESCREEN={mode!r}: erwartet off, report oder route")
+    return mode
+
+
+def citation_hosts() -> tuple:
+    hosts = os.getenv("PRESCREEN_HOSTS")
+    return tuple(h.strip().lower() for h in hosts.split(",") if h.strip()) if hosts else DEFAULT_HOSTS
+
+
+def is_deflection(text: str) -> bool:
+    return bool(_DEFLECTION.search(text[:DEFLECTION_WINDOW])) and not _HEDGE.search(text)
+
+
+def _citation_counts(text: str, hosts: tuple) -> tuple:
+    """(URLs auf planqk.de, davon ungültig): falscher Host, unzulässige Zeichen oder Endung ``.json``."""
+    cited = invalid = 0
+    for url in _URL.findall(text):
+        url = url.rstrip(".:!?")
+        parts = urlsplit(url)
+        if "planqk.de" not in parts.netloc.lower():
+            continue
+        cited += 1
+        if parts.netloc.lower() not in hosts or not _ALLOWED_PATH.match(parts.path) \
+                or parts.path.endswith(".json"):
+            invalid += 1
+    return cited, invalid
+
+
+def lexical_overlap(responses: list, references: list) -> tuple:
+    """
+    (Recall, F1) der Tokenmengen je Zeile. Die Tokens werden einmal auf
+    Vokabular-IDs abgebildet; (Zeile, ID)-Schlüssel beider Seiten werden in
+    einem Schritt geschnitten und je Zeile gezählt.
+    """
+    import numpy as np
+    from .retrieval import tokenize
+
+    vocab = {}
+    sides = []
+    for texts in (responses, references):
+        rows, ids = [], []
+        for row, text in enumerate(texts):
+            tokens = {vocab.setdefault(t, len(vocab)) for t in tokenize(text)}
+            rows.append(np.full(len(tokens), row, dtype=np.int64))
+            ids.append(np.fromiter(tokens, dtype=np.int64, count=len(tokens)))
+        sides.append((np.concatenate(rows) if rows else np.empty(0, np.int64),
+                      np.concatenate(ids) if ids else np.empty(0, np.int64)))
+    n, width = len(responses), max(1, len(vocab))
+    (resp_rows, resp_ids), (ref_rows, ref_ids) = sides
+    common = np.intersect1d(resp_rows * width + resp_ids, ref_rows * width + ref_ids, assume_unique=True)
+    shared = np.bincount(common // width, minlength=n).astype(float)
+    resp_n = np.bincount(resp_rows, minlength=n)
+    ref_n = np.bincount(ref_rows, minlength=n)
+    recall = np.divide(shared, ref_n, out=np.zeros(n), where=ref_n > 0)
+    precision = np.divide(shared, resp_n, out=np.zeros(n), where=resp_n > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros(n), where=precision + recall > 0)
+    return recall, f1
+
+
+def features(examples: list, embed_fn: Optional[Callable] = None,
+             hosts: Optional[tuple] = None) -> "pd.DataFrame":
+    """
+    Eine Zeile je Beispiel mit allen Pre-Screen-Features (Reihenfolge wie
+    ``examples``). ``embed_fn`` Default: ``retrieval.hashing_embed``.
+    """
+    import numpy as np
+    import pandas as pd
+    from .retrieval import tokenize, hashing_embed
+
+    embed_fn = embed_fn or hashing_embed
+    hosts = hosts or citation_hosts()
+    responses = [ex.get("response") or "" for ex in examples]
+    references = [ex.get("reference_answer") or "" for ex in examples]
+    # dieselbe Bedingung wie für den Correctness-Judge
+    has_reference = np.array(["correctness" in metric_kwargs(ex) for ex in examples], dtype=bool)
+    recall, f1 = lexical_overlap(responses, references)
+    if examples:
+        similarity = np.einsum("ij,ij->i", embed_fn(responses), embed_fn(references)).astype(float)
+    else:
+        similarity = np.zeros(0)
+    citations = np.array([_citation_counts(r, hosts) for r in responses], dtype=int).reshape(-1, 2)
+    return pd.DataFrame({
+        "index": np.arange(1, len(examples) + 1),
+        "example_id": [ex.get("example_id") for ex in examples],
+        "has_reference": has_reference,
+        "chars": np.array([len(r.strip()) for r in responses], dtype=int),
+        "tokens": np.array([len(tokenize(r)) for r in responses], dtype=int),
+        "deflection": np.array([is_deflection(r) for r in responses], dtype=bool),
+        "citations": citations[:, 0],
+        "invalid_citations": citations[:, 1],
+        "overlap_recall": np.where(has_reference, recall, np.nan),
+        "overlap_f1": np.where(has_reference, f1, np.nan),
+        "similarity": np.where(has_reference, similarity, np.nan),
+    })
+
+
+def route(feat: "pd.DataFrame") -> "np.ndarray":
+    """``fail``/``pass``/``judge`` je Zeile (siehe Modul-Docstring)."""
+    import numpy as np
+
+    too_short = (feat["chars"].to_numpy() < MIN_CHARS) | (feat["tokens"].to_numpy() < MIN_TOKENS)
+    fail = too_short | feat["deflection"].to_numpy()
+    # NaN (keine Referenz) ist nie >= Schwelle
+    passed = ((feat["overlap_recall"].to_numpy() >= PASS_RECALL)
+              & (feat["similarity"].to_numpy() >= PASS_SIMILARITY)
+              & (feat["citations"].to_numpy() > feat["invalid_citations"].to_numpy())
+              & (feat["invalid_citations"].to_numpy() == 0))
+    return np.select([fail, passed], ["fail", "pass"], "judge")
+
+
+def prescreen(examples: list, embed_fn: Optional[Callable] = None) -> "pd.DataFrame":
+    """Features plus ``decision`` und ``local_metrics`` (lokal entschiedene Metriken, kommagetrennt)."""
+    feat = features(examples, embed_fn)
+    feat["decision"] = route(feat)
+    feat["local_metrics"] = [",".join(local_outcomes(d, r)) for d, r in zip(feat["decision"], feat["has_reference"])]
+    return feat
+
+
+def local_outcomes(decision: str, has_reference: bool = True) -> dict:
+    """
+    Metrik -> lokales Urteil; leer, wenn alles an die Judges geht. Correctness
+    nur mit Referenzantwort, wie beim Judge.
+    """
+    if decision != "fail":
+        return {}
+    return {metric: EvalOutcome(*outcome, FAIL_REASON) for metric, outcome in FAIL_OUTCOMES.items()
+            if metric != "correctness" or has_reference}
+
+
+def screen_example(ex: dict) -> dict:
+    """Lokale Urteile für eine einzelne Zeile (Pipeline); leer, wenn alle Metriken an die Judges gehen."""
+    row = prescreen([ex]).iloc[0]
+    return local_outcomes(row["decision"], bool(row["has_reference"]))
+
+
+def routed_outcomes(screen: "pd.DataFrame", mode: Optional[str] = None) -> dict:
+    """Zeilenindex (0-basiert) -> {Metrik: lokales Urteil}; leer außer bei PRESCREEN=route."""
+    if (mode or prescreen_mode()) != "route":
+        return {}
+    routed = {}
+    for i, (decision, has_reference) in enumerate(zip(screen["decision"], screen["has_reference"])):
+        outcomes = local_outcomes(decision, bool(has_reference))
+        if outcomes:
+            routed[i] = outcomes
+    return routed
+
+
+def agreement(screen: "pd.DataFrame", rows: list) -> "pd.DataFrame":
+    """
+    Ergänzt die Features um die Judge-Scores (nur echte Judge-Urteile) und
+    ``agrees``: Correctness <= 2 bei ``fail`` bzw. >= 4 bei ``pass``.
+    """
+    import numpy as np
+    import pandas as pd
+
+    judged = pd.DataFrame(rows)
+    out = screen.copy()
+    for metric in METRICS:
+        column = f"{metric}_score"
+        local = judged.get(f"{metric}_feedback", pd.Series("", index=judged.index)).astype(str) \
+            .str.startswith("Pre-Screen")
+        out[f"judge_{column}"] = judged[column].where(~local).to_numpy() if column in judged else np.nan
+    correctness = out["judge_correctness_score"]
+    agrees = np.where(out["decision"] == "pass", correctness >= 4, correctness <= 2)
+    out["agrees"] = np.where(correctness.isna() | (out["decision"] == "judge"), np.nan, agrees)
+    return out
+
+
+def summarize_screen(screen: "pd.DataFrame") -> dict:
+    counts = screen["decision"].value_counts()
+    summary = {f"{d}_rows": int(counts.get(d, 0)) for d in DECISIONS}
+    summary["rows"] = len(screen)
+    # Judge-Aufrufe ohne Pre-Screen: Relevancy und Faithfulness immer, Correctness mit Referenz
+    summary["judge_calls"] = int(2 * len(screen) + screen["has_reference"].sum())
+    summary["local_calls"] = int((screen["local_metrics"] != "").sum())
+    summary["saved_share"] = summary["local_calls"] / max(1, summary["judge_calls"])
+    summary["deflection_rate"] = float(screen["deflection"].mean()) if len(screen) else 0.0
+    summary["citation_rate"] = float((screen["citations"] > screen["invalid_citations"]).mean()) if len(screen) else 0.0
+    summary["overlap_recall_mean"] = float(screen["overlap_recall"].mean())
+    summary["similarity_mean"] = float(screen["similarity"].mean())
+    if "agrees" in screen:
+        decided = screen["agrees"].dropna()
+        summary["agreement"] = float(decided.mean()) if len(decided) else float("nan")
+        summary["agreement_rows"] = len(decided)
+    return summary
+
+
+def write_prescreen(screen: "pd.DataFrame", out_dir: str = ".", rows: Optional[list] = None) -> str:
+    """prescreen_results.csv (Semikolon, utf-8-sig); mit ``rows`` inkl. Judge-Scores."""
+    if rows is not None:
+        screen = agreement(screen, rows)
+    path = os.path.join(out_dir, PRESCREEN_FILE)
+    screen.to_csv(path, index=False, sep=';', encoding='utf-8-sig')
+    summary = summarize_screen(screen)
+    line = (f"Pre-Screen: {summary['fail_rows']} fail, {summary['pass_rows']} pass, "
+            f"{summary['judge_rows']} offen; {summary['local_calls']}/{summary['judge_calls']} "
+            f"Judge-Aufrufe lokal entscheidbar")
+    if summary.get("agreement_rows"):
+        line += f"; Übereinstimmung mit dem Judge {summary['agreement']:.0%} ({summary['agreement_rows']} Zeilen)"
+    print(line)
+    print(f"Pre-Screen gespeichert: {path}")
+    return path
+
+
+def _judge_rows(path: str) -> Optional[list]:
+    """Judge-Ergebnisse einer früheren Evaluation neben ``path`` (für die Übereinstimmung)."""
+    import pandas as pd
+
+    directory = os.path.dirname(os.path.abspath(path))
+    for name in ("evaluation_results_with_feedback.csv", "evaluation_results_detailed.csv"):
+        csv_path = os.path.join(directory, name)
+        if os.path.exists(csv_path):
+            return pd.read_csv(csv_path, sep=';', encoding='utf-8-sig').to_dict("records")
+    return None
+
+
+def main(argv=None):
+    import pandas as pd
+    from .evaluation import load_examples
+    from .stats import _version_key
+
+    parser = argparse.ArgumentParser(description="Lokales Pre-Screening der Antworten (ohne Judge-Aufrufe)")
+    parser.add_argument("paths", nargs="*", help="V2_RAG_Eval_with_responses.json bzw. Checkpoint-JSONL "
+                                                 "(Default: alle Sytem-Prompt_Vn-Ordner)")
+    parser.add_argument("--write", action="store_true", help=f"{PRESCREEN_FILE} neben jede Datei schreiben")
+    args = parser.parse_args(argv)
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = args.paths or sorted(glob.glob(os.path.join(base_dir, "Sytem-Prompt_V*", "V2_RAG_Eval_with_responses.json")),
+                                 key=lambda p: _version_key(version_from_path(os.path.abspath(p)) or p))
+    summaries = []
+    for path in paths:
+        screen = prescreen(load_examples(path))
+        rows = _judge_rows(path)
+        if rows is not None and len(rows) == len(screen):
+            screen = agreement(screen, rows)
+        if args.write:
+            screen.to_csv(os.path.join(os.path.dirname(os.path.abspath(path)), PRESCREEN_FILE),
+                          index=False, sep=';', encoding='utf-8-sig')
+        summaries.append({"version": version_from_path(os.path.abspath(path)) or path, **summarize_screen(screen)})
+    if not summaries:
+        print("Keine Antworten gefunden.")
+        return
+    table = pd.DataFrame(summaries).set_index("version")
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 3):
+        print(table)
+    total = table[["judge_calls", "local_calls"]].sum()
+    print(f"\nLokal entscheidbar: {total['local_calls']}/{total['judge_calls']} Judge-Aufrufe "
+          f"({total['local_calls'] / max(1, total['judge_calls']):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+System-Prompts liegen als Dateien unter ``prompts/System_Prompt_<Version>.md``
+(exakt der Text, der früher inline in den Response-generation-Skripten stand).
+"""
+import os
+import re
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+_PROMPT_FILE = re.compile(r"^System_Prompt_(V\d+)\.md$")
+_VERSION_DIR = re.compile(r"Sytem-Prompt_(V\d+)_")
+
+
+def prompt_path(version: str, prompts_dir: str = PROMPTS_DIR) -> str:
+    return os.path.join(prompts_dir, f"System_Prompt_{version}.md")
+
+
+def load_system_prompt(version: str, prompts_dir: str = PROMPTS_DIR) -> str:
+    with open(prompt_path(version, prompts_dir), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def list_prompt_versions(prompts_dir: str = PROMPTS_DIR) -> list:
+    """Alle vorhandenen Versionen, numerisch sortiert (V0, V1, ..., V12)."""
+    versions = [m.group(1) for m in map(_PROMPT_FILE.match, os.listdir(prompts_dir)) if m]
+    return sorted(versions, key=lambda v: int(v[1:]))
+
+
+def version_from_path(path: str):
+    """Version aus einem Pfad unter ``Sytem-Prompt_Vn_dd.09.2025``, sonst None."""
+    match = _VERSION_DIR.search(path)
+    return match.group(1) if match else None
@@ -0,0 +1,177 @@
+"""
+Adaptiver Rate Limiter für Azure OpenAI / OpenAI.
+
+Statt nach einem 429 pauschal 15 bzw. 10 Sekunden zu schlafen, hält der
+Limiter je einen Token-Bucket für Requests/Minute und Tokens/Minute und
+gleicht ihn mit den Headern der Antworten ab:
+
+- ``x-ratelimit-limit-requests`` / ``x-ratelimit-limit-tokens`` setzen die
+  Kapazität der Buckets (die Quota pro Minute),
+- ``x-ratelimit-remaining-requests`` / ``x-ratelimit-remaining-tokens``
+  begrenzen nur den aktuellen Füllstand,
+- ``retry-after-ms`` / ``retry-after`` bestimmen nach einem 429 die Wartezeit,
+  und zwar für alle Worker, die denselben Limiter teilen.
+
+Nur wenn der Service keinen Hinweis liefert, wird mit exponentiellem
+Backoff plus Jitter gewartet. Eine Instanz kann von Threads und
+asyncio-Tasks gleichzeitig genutzt werden.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Optional
+
+# Grobe Schätzung: ~4 Zeichen pro Token (reicht für die Bucket-Reservierung)
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Bucket mit kontinuierlicher Auffüllung über 60 Sekunden. Ist ``capacity``
+    unbekannt (None), wird sie aus dem ``limit``-Header gelernt; bis dahin
+    begrenzt der Bucket nicht. ``remaining`` ist die Restquota, nicht das
+    Limit, und senkt nur den Füllstand.
+    """
+
+    def __init__(self, capacity: Optional[float] = None):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Zieht ``amount`` ab und gibt zurück, wie lange bis zur Deckung zu warten ist."""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level * 60.0 / self.capacity
+
+    def refund(self, amount: float, now: float):
+        if self.capacity is None:
+            return
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def observe(self, limit: Optional[float], remaining: Optional[float], now: float):
+        if limit is not None and limit > 0:
+            if self.capacity is None:
+                self.capacity = self.level = limit
+                self.updated = now
+            else:
+                self._refill(now)
+                self.capacity = limit
+                self.level = min(self.level, limit)
+        if remaining is None or self.capacity is None:
+            return
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+def _header(headers, name: str) -> Optional[float]:
+    if headers is None:
+        return None
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    if getattr(e, "status_code", None) == 429:
+        return True
+    return "429" in str(e) or "rate limit" in str(e).lower()
+
+
+def _error_headers(e: Exception):
+    response = getattr(e, "response", None)
+    return getattr(response, "headers", None)
+
+
+class RateLimiter:
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, prefix: str = "AZURE_OPENAI") -> "RateLimiter":
+        """Liest ``<prefix>_RPM`` und ``<prefix>_TPM`` (Quota des Deployments), beide optional."""
+        rpm = os.getenv(f"{prefix}_RPM")
+        tpm = os.getenv(f"{prefix}_TPM")
+        return cls(rpm=float(rpm) if rpm else None, tpm=float(tpm) if tpm else None)
+
+    @staticmethod
+    def estimate_tokens(request: dict) -> int:
+        """Prompt-Tokens (geschätzt) plus max_tokens der Antwort."""
+        chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+        return chars // CHARS_PER_TOKEN + int(request.get("max_tokens") or 0)
+
+    def _reserve(self, tokens: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+            return max(wait, self._paused_until - now)
+
+    def acquire(self, tokens: float = 0):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: float = 0):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update_from_headers(self, headers):
+        with self._lock:
+            now = time.monotonic()
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                bucket.observe(_header(headers, f"x-ratelimit-limit-{kind}"),
+                               _header(headers, f"x-ratelimit-remaining-{kind}"), now)
+
+    def record_usage(self, estimated: float, usage):
+        """Gibt zu viel reservierte Tokens zurück, sobald ``usage`` bekannt ist."""
+        total = getattr(usage, "total_tokens", None)
+        if total is None:
+            return
+        with self._lock:
+            self.tokens.refund(estimated - total, time.monotonic())
+
+    def backoff(self, e: Exception, attempt: int) -> float:
+        """
+        Wartezeit nach einem Fehler. Bei 429 gilt sie für alle Worker, die
+        diesen Limiter teilen. ``retry-after`` hat Vorrang vor dem Backoff.
+        """
+        headers = _error_headers(e)
+        self.update_from_headers(headers)
+        delay = None
+        retry_after_ms = _header(headers, "retry-after-ms")
+        if retry_after_ms is not None:
+            delay = retry_after_ms / 1000.0
+        else:
+            delay = _header(headers, "retry-after")
+        if delay is None:
+            # Full Jitter: zufällig zwischen 0 und dem exponentiellen Deckel
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        if is_rate_limit_error(e):
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
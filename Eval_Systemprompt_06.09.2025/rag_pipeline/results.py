@@ -0,0 +1,279 @@
+"""
+Spaltenorientierte Ablage der Evaluationsergebnisse (Parquet).
+
+Jeder Evaluationslauf schreibt eine typisierte Tabelle in den Store,
+partitioniert nach Prompt-Version und Lauf:
+
+    results_store/prompt_version=V3/run_id=20250907T101500-3f2a/part-<Datensatz/Parameter>.parquet
+
+Scores sind float64, passing bool, Fragetext, Referenz, Datensatz und
+Parameter dictionary-kodiert; Antwort und Begründungen stehen einmal je Zeile
+statt doppelt in detailed.csv und with_feedback.csv. ``ResultStore.scan``
+liest über pyarrow.dataset aus memory-mapped Dateien, Filter auf Version und
+Lauf werden über die Ordnernamen ausgewertet, bevor eine Datei geöffnet wird.
+
+Die CSV-Dateien der Sytem-Prompt_Vn-Ordner bleiben als Ansicht für Excel:
+RESULT_CSV=off schaltet evaluation_results_detailed.csv und
+evaluation_results_with_feedback.csv ab, RESULT_EXCEL=on schreibt zusätzlich
+evaluation_results.xlsx (braucht openpyxl).
+
+Umgebung: RESULTS_STORE (Pfad, Default results_store neben den
+Versionsordnern; off schaltet den Store ab), RUN_ID (Default: Startzeit des
+Prozesses plus Zufallssuffix; alle Zellen eines Runner-Laufs teilen sie).
+
+    python -m rag_pipeline.results list
+    python -m rag_pipeline.results import               # vorhandene CSVs übernehmen
+    python -m rag_pipeline.results export --version V3 --out /tmp/V3
+"""
+import os
+import time
+import uuid
+import hashlib
+import argparse
+import importlib.util
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+from .evaluation import METRICS
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_PATH = os.path.join(BASE_DIR, "results_store")
+PARTITIONS = ("prompt_version", "run_id")
+RUN_KEYS = ("prompt_version", "dataset", "params")
+DEFAULT_DATASET = "V2_RAG_Eval"
+DEFAULT_PARAMS = "default"
+DETAILED_FILE = "evaluation_results_detailed.csv"
+FEEDBACK_FILE = "evaluation_results_with_feedback.csv"
+EXCEL_FILE = "evaluation_results.xlsx"
+# gleicher Text in vielen Zeilen/Läufen
+DICTIONARY_COLUMNS = ("question", "reference_answer", "dataset", "params")
+
+
+def _enabled(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "off", "false", "no")
+
+
+@lru_cache(maxsize=1)
+def current_run_id() -> str:
+    """Eine Lauf-ID je Prozess, zeitlich sortierbar."""
+    return os.getenv("RUN_ID") or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:4]}"
+
+
+@lru_cache(maxsize=1)
+def result_schema() -> "pa.Schema":
+    import pyarrow as pa
+
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [("index", pa.int32()), ("question_id", pa.string()),
+         ("question", text), ("reference_answer", text), ("response", pa.string()),
+         ("dataset", text), ("params", text)]
+        + [(f"{m}_score", pa.float64()) for m in METRICS]
+        + [("overall_average_score", pa.float64())]
+        + [(f"{m}_passing", pa.bool_()) for m in METRICS]
+        + [(f"{m}_feedback", pa.string()) for m in METRICS]
+    )
+
+
+def to_table(df: "pd.DataFrame", dataset: str, params: str = DEFAULT_PARAMS) -> "pa.Table":
+    """Ergebnistabelle aus ``write_outputs`` im festen Schema; fehlende Spalten bleiben null."""
+    import pandas as pd
+    import pyarrow as pa
+    from .datasets import example_ids
+
+    n = len(df)
+    # example_id aus dem Datensatz-Register, für ältere Ergebnisse dieselbe Ableitung aus dem Fragetext
+    ids = df["example_id"] if "example_id" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    derived = example_ids(df["question"].fillna(""))
+    labels = {"dataset": dataset, "params": params,
+              "question_id": [i if isinstance(i, str) and i else d for i, d in zip(ids, derived)]}
+    columns = []
+    for field in result_schema():
+        if field.name in labels:
+            value = labels[field.name]
+            values = pa.array(value if isinstance(value, list) else [value] * n, type=pa.string())
+        elif field.name in df.columns:
+            series = df[field.name]
+            if pa.types.is_boolean(field.type):
+                series = series.astype("boolean")
+            values = pa.array(series, type=pa.string() if pa.types.is_dictionary(field.type) else field.type,
+                              from_pandas=True)
+        else:
+            values = pa.nulls(n, type=pa.string() if pa.types.is_dictionary(field.type) else field.type)
+        columns.append(values.dictionary_encode() if pa.types.is_dictionary(field.type) else values)
+    return pa.Table.from_arrays(columns, schema=result_schema())
+
+
+class ResultStore:
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultStore"]:
+        """RESULTS_STORE=off schaltet den Store ab, sonst Pfad (Default results_store)."""
+        path = os.getenv("RESULTS_STORE", DEFAULT_STORE_PATH)
+        if path.lower() in ("0", "off", "false", "no"):
+            return None
+        return cls(path)
+
+    def run_dir(self, prompt_version: str, run_id: str) -> str:
+        return os.path.join(self.path, f"prompt_version={prompt_version}", f"run_id={run_id}")
+
+    def write(self, df: "pd.DataFrame", prompt_version: str, run_id: Optional[str], dataset: str,
+              params: str = DEFAULT_PARAMS) -> str:
+        """
+        Schreibt eine Ergebnistabelle; je (Version, Lauf, Datensatz, Parameter)
+        eine Datei, ein erneutes Schreiben derselben Zelle ersetzt sie.
+        """
+        import pyarrow.parquet as pq
+
+        directory = self.run_dir(prompt_version, run_id or current_run_id())
+        os.makedirs(directory, exist_ok=True)
+        part = hashlib.sha256(f"{dataset}\0{params}".encode("utf-8")).hexdigest()[:12]
+        path = os.path.join(directory, f"part-{part}.parquet")
+        tmp = f"{path}.tmp"
+        pq.write_table(to_table(df, dataset, params), tmp, compression="zstd")
+        os.replace(tmp, path)
+        return path
+
+    def dataset(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        partitioning = ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITIONS]), flavor="hive")
+        return ds.dataset(self.path, format="parquet", partitioning=partitioning,
+                          filesystem=fs.LocalFileSystem(use_mmap=True), exclude_invalid_files=True)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path) and any(name.startswith("prompt_version=") for name in os.listdir(self.path))
+
+    def scan(self, columns: Optional[list] = None, versions: Optional[list] = None,
+             run_ids: Optional[list] = None, latest: bool = False) -> "pa.Table":
+        """
+        Ergebnisse als eine Arrow-Tabelle (mit prompt_version und run_id).
+        ``latest`` behält je (Version, Datensatz, Parameter) nur den jüngsten Lauf.
+        """
+        import pyarrow.dataset as ds
+
+        condition = None
+        for name, values in (("prompt_version", versions), ("run_id", run_ids)):
+            if values:
+                expr = ds.field(name).isin(list(values))
+                condition = expr if condition is None else condition & expr
+        if columns is not None:
+            columns = list(dict.fromkeys([*columns, *RUN_KEYS, "run_id"] if latest else columns))
+        table = self.dataset().to_table(columns=columns, filter=condition)
+        return _latest_runs(table) if latest else table
+
+    def runs(self) -> "pd.DataFrame":
+        """Ein Eintrag je (Version, Lauf, Datensatz, Parameter) mit Anzahl Zeilen und Mittelwerten."""
+        keys = ["prompt_version", "run_id", "dataset", "params"]
+        scores = [f"{m}_score" for m in METRICS] + ["overall_average_score"]
+        df = self.scan(columns=keys + scores).to_pandas()
+        grouped = df.groupby(keys, observed=True)
+        return grouped[scores].mean().join(grouped.size().rename("rows")).reset_index()
+
+    def read(self, prompt_version: str, run_id: Optional[str] = None, dataset: Optional[str] = None,
+             params: Optional[str] = None) -> "pd.DataFrame":
+        """Eine Ergebnistabelle im Format von ``write_outputs`` (Default: jüngster Lauf der Version)."""
+        table = self.scan(versions=[prompt_version], run_ids=[run_id] if run_id else None, latest=run_id is None)
+        df = table.to_pandas()
+        for name, value in (("dataset", dataset), ("params", params)):
+            if value is not None:
+                df = df[df[name] == value]
+        for name in DICTIONARY_COLUMNS:
+            df[name] = df[name].astype(object)
+        return df.sort_values("index", ignore_index=True)
+
+
+def _latest_runs(table: "pa.Table") -> "pa.Table":
+    import pyarrow as pa
+
+    keys = table.select([*RUN_KEYS, "run_id"]).to_pandas()
+    newest = keys.groupby(list(RUN_KEYS), observed=True, dropna=False)["run_id"].transform("max")
+    return table.filter(pa.array((keys["run_id"] == newest).to_numpy()))
+
+
+def csv_view_enabled() -> bool:
+    return _enabled("RESULT_CSV", "on")
+
+
+def write_views(df: "pd.DataFrame", out_dir: str, detailed_columns: list, feedback_columns: list) -> list:
+    """
+    CSV (Semikolon, utf-8-sig) und optional Excel als Ansicht auf die
+    Ergebnistabelle. Gibt die geschriebenen Pfade zurück.
+    """
+    paths = []
+    if csv_view_enabled():
+        for name, columns in ((DETAILED_FILE, detailed_columns), (FEEDBACK_FILE, feedback_columns)):
+            path = os.path.abspath(os.path.join(out_dir, name))
+            df[columns].to_csv(path, index=False, sep=';', encoding='utf-8-sig')
+            paths.append(path)
+    if _enabled("RESULT_EXCEL", "off"):
+        if importlib.util.find_spec("openpyxl") is None:
+            print("RESULT_EXCEL=on, aber das Paket 'openpyxl' fehlt (pip install openpyxl); keine Excel-Datei.")
+        else:
+            path = os.path.abspath(os.path.join(out_dir, EXCEL_FILE))
+            df[feedback_columns].to_excel(path, index=False)
+            paths.append(path)
+    return paths
+
+
+def import_csv_results(store: ResultStore, base_dir: str = BASE_DIR) -> list:
+    """
+    Übernimmt vorhandene evaluation_results_with_feedback.csv (sonst detailed)
+    der Sytem-Prompt_Vn-Ordner in den Store. Lauf-ID ist die Änderungszeit der
+    CSV, ein erneuter Import überschreibt also denselben Lauf.
+    """
+    import pandas as pd
+    from .aggregate import find_result_files
+
+    written = []
+    for path, labels in find_result_files(base_dir):
+        if os.path.commonpath([os.path.abspath(path), os.path.abspath(store.path)]) == os.path.abspath(store.path):
+            continue
+        run_id = time.strftime("%Y%m%dT%H%M%S", time.localtime(os.path.getmtime(path))) + "-csv"
+        df = pd.read_csv(path, sep=";", encoding="utf-8-sig")
+        written.append(store.write(df, labels["version"], run_id, labels["dataset"], labels["params"]))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet-Ablage der Evaluationsergebnisse")
+    parser.add_argument("--store", default=os.getenv("RESULTS_STORE", DEFAULT_STORE_PATH))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Läufe im Store")
+    imp = sub.add_parser("import", help="CSV-Ergebnisse der Versionsordner übernehmen")
+    imp.add_argument("--base-dir", default=BASE_DIR)
+    exp = sub.add_parser("export", help="CSV/Excel-Ansicht eines Laufs schreiben")
+    exp.add_argument("--version", required=True)
+    exp.add_argument("--run-id", help="Default: jüngster Lauf")
+    exp.add_argument("--out", default=".")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    store = ResultStore(args.store)
+    if args.command == "import":
+        written = import_csv_results(store, args.base_dir)
+        print(f"{len(written)} Ergebnistabellen übernommen -> {store.path}")
+    elif args.command == "list":
+        with pd.option_context("display.width", 160, "display.max_rows", 200):
+            print(store.runs().to_string(index=False))
+    else:
+        df = store.read(args.version, args.run_id)
+        os.makedirs(args.out, exist_ok=True)
+        base = ["index", "question", "response", "reference_answer"] + \
+               [f"{m}_score" for m in METRICS] + ["overall_average_score"]
+        extra = [f"{m}_{kind}" for kind in ("feedback", "passing") for m in METRICS]
+        for path in write_views(df, args.out, base, base + extra):
+            print(f"geschrieben: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Lokale Retrieval-Engine als Ersatz für die azure_search-Datenquelle.
+
+- BM25 über einen invertierten Index (Postings als NumPy-Arrays im CSR-Format),
+- dichter Vektorindex (float32-Matrix, per ``np.load(mmap_mode="r")`` gemappt),
+- ``hybrid`` kombiniert beide Rankings per Reciprocal Rank Fusion.
+
+Die Treffer haben dieselbe Struktur wie ``contexts.extract_contexts`` für
+Azure; Generierung und Evaluation merken also keinen Unterschied. Ausgewählt
+wird der Backend über ``GenerationParams.retrieval`` ("bm25", "dense",
+"hybrid"); der Index liegt in LOCAL_INDEX_DIR.
+
+Die Standard-Embeddings sind gehashte Uni-/Bigramme (offline, deterministisch);
+über ``embed_fn`` lässt sich ein echtes Embedding-Modell einsetzen.
+
+Index bauen und abfragen (aus Eval_Systemprompt_06.09.2025):
+
+    python -m rag_pipeline.retrieval build --corpus <ordner|chunks.jsonl|eval.json> --index .rag_index
+    python -m rag_pipeline.retrieval query --index .rag_index "How do I use PlanqkQuantumProvider?"
+"""
+import os
+import re
+import json
+import zlib
+import argparse
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Optional
+
+import numpy as np
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_index")
+EMBEDDING_DIM = 512
+CHUNK_CHARS = 1500
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+@lru_cache(maxsize=1 << 20)
+def _feature_hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+def hashing_embed(texts: list, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Feature-Hashing von Uni- und Bigrammen (mit Vorzeichen-Bit), L2-normalisiert."""
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(a + " " + b for a, b in zip(tokens, tokens[1:]))
+        if not features:
+            continue
+        hashes = np.fromiter(map(_feature_hash, features), dtype=np.uint32, count=len(features))
+        counts = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        signs = np.where(hashes >> 31, 1.0, -1.0).astype(np.float32)
+        np.add.at(out[row], hashes % dim, signs * counts)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-12)
+
+
+# ---------------------------------------------------------------- Korpus
+
+def _split(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    """Absätze zu Chunks von höchstens ``max_chars`` Zeichen zusammenfassen."""
+    chunks, current = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if current and len(current) + len(para) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def load_corpus(source: str) -> list:
+    """
+    Chunks als Dicts mit ``doc_id``, ``chunk_id``, ``title``, ``url``, ``content``.
+    ``source`` ist ein Ordner mit .md/.txt-Dateien, eine JSONL-Datei mit Chunks
+    oder ein Eval-JSON (dann dienen die ``reference_contexts`` als Korpus).
+    """
+    chunks = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if not name.endswith((".md", ".txt")):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                doc_id = os.path.relpath(path, source).replace(os.sep, "/")
+                for i, chunk in enumerate(_split(text)):
+                    chunks.append({"doc_id": doc_id, "chunk_id": str(i), "title": name, "url": None,
+                                   "content": chunk})
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if line.strip():
+                    c = json.loads(line)
+                    chunks.append({"doc_id": c.get("doc_id") or c.get("url") or str(i),
+                                   "chunk_id": str(c.get("chunk_id", 0)), "title": c.get("title"),
+                                   "url": c.get("url"), "content": c["content"]})
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            examples = json.load(f)["examples"]
+        seen = set()
+        for ex in examples:
+            for text in ex.get("reference_contexts") or []:
+                if text and text not in seen:
+                    seen.add(text)
+                    chunks.append({"doc_id": f"reference_context_{len(seen) - 1}", "chunk_id": "0",
+                                   "title": None, "url": None, "content": text})
+    return chunks
+
+
+# ---------------------------------------------------------------- Index
+
+def build_index(chunks: list, index_dir: str = DEFAULT_INDEX_DIR,
+                embed_fn: Callable[[list], np.ndarray] = hashing_embed):
+    os.makedirs(index_dir, exist_ok=True)
+    vocab = {}
+    doc_terms = []
+    for chunk in chunks:
+        counts = Counter(tokenize(chunk["content"]))
+        doc_terms.append(counts)
+        for term in counts:
+            vocab.setdefault(term, len(vocab))
+
+    # Postings nach Term sortiert (CSR): offsets[t]..offsets[t+1] in doc_ids/tfs
+    postings = [[] for _ in vocab]
+    for doc, counts in enumerate(doc_terms):
+        for term, tf in counts.items():
+            postings[vocab[term]].append((doc, tf))
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(offsets[-1]))
+    doc_len = np.array([sum(c.values()) for c in doc_terms], dtype=np.float32)
+
+    np.save(os.path.join(index_dir, "bm25_offsets.npy"), offsets)
+    np.save(os.path.join(index_dir, "bm25_doc_ids.npy"), doc_ids)
+    np.save(os.path.join(index_dir, "bm25_tfs.npy"), tfs)
+    np.save(os.path.join(index_dir, "doc_len.npy"), doc_len)
+    np.save(os.path.join(index_dir, "vectors.npy"), np.asarray(embed_fn([c["content"] for c in chunks]),
+                                                               dtype=np.float32))
+    with open(os.path.join(index_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(index_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+
+
+class LocalRetriever:
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR,
+                 embed_fn: Callable[[list], np.ndarray] = hashing_embed):
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.offsets = load("bm25_offsets.npy")
+        self.doc_ids = load("bm25_doc_ids.npy")
+        self.tfs = load("bm25_tfs.npy")
+        self.doc_len = np.asarray(load("doc_len.npy"))
+        self.vectors = load("vectors.npy")
+        self.embed_fn = embed_fn
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(index_dir, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f if line.strip()]
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        n = len(self.chunks)
+        df = np.diff(np.asarray(self.offsets)).astype(np.float64)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / max(self.avg_len, 1e-9))
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def dense_scores(self, query: str) -> np.ndarray:
+        return np.asarray(self.vectors @ self.embed_fn([query])[0], dtype=np.float32)
+
+    @staticmethod
+    def _top(scores: np.ndarray, n: int) -> np.ndarray:
+        n = min(n, len(scores))
+        if n <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, n - 1)[:n]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search(self, query: str, top_n: int = 10, mode: str = "hybrid") -> list:
+        """Top-n-Chunks im Format von ``contexts.extract_contexts``."""
+        if mode == "bm25":
+            scores = self.bm25_scores(query)
+            top = self._top(scores, top_n)
+            top = top[scores[top] > 0]
+        elif mode == "dense":
+            scores = self.dense_scores(query)
+            top = self._top(scores, top_n)
+        elif mode == "hybrid":
+            # Reciprocal Rank Fusion über die Top-Kandidaten beider Verfahren
+            bm25, dense = self.bm25_scores(query), self.dense_scores(query)
+            depth = max(top_n * 5, 50)
+            scores = np.zeros(len(self.chunks), dtype=np.float32)
+            bm25_top = self._top(bm25, depth)
+            for ranked in (bm25_top[bm25[bm25_top] > 0], self._top(dense, depth)):
+                scores[ranked] += 1.0 / (RRF_K + 1 + np.arange(len(ranked), dtype=np.float32))
+            top = self._top(scores, top_n)
+            top = top[scores[top] > 0]
+        else:
+            raise ValueError(f"Unbekannter Retrieval-Modus '{mode}' (bm25, dense, hybrid)")
+
+        results = []
+        for rank, doc in enumerate(top):
+            chunk = self.chunks[int(doc)]
+            results.append({
+                "rank": rank,
+                "doc_id": chunk.get("doc_id"),
+                "chunk_id": chunk.get("chunk_id"),
+                "title": chunk.get("title"),
+                "url": chunk.get("url"),
+                "search_score": float(scores[doc]),
+                "rerank_score": None,
+                "filter_reason": None,
+                "cited": False,
+                "content": chunk["content"],
+            })
+        return results
+
+
+@lru_cache(maxsize=4)
+def load_retriever(index_dir: Optional[str] = None) -> LocalRetriever:
+    """Einmal pro Prozess laden (Index-Ordner aus LOCAL_INDEX_DIR)."""
+    return LocalRetriever(index_dir or os.getenv("LOCAL_INDEX_DIR", DEFAULT_INDEX_DIR))
+
+
+def format_documents(contexts: list) -> str:
+    """Abgerufene Chunks als Block, der an den System-Prompt angehängt wird."""
+    parts = []
+    for i, c in enumerate(contexts, start=1):
+        header = " ".join(x for x in (f"[doc{i}]", c.get("title") or c.get("doc_id"),
+                                      f"({c['url']})" if c.get("url") else None) if x)
+        parts.append(f"{header}\n{c['content']}")
+    return "Retrieved documents:\n\n" + "\n\n".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalen BM25-/Vektorindex bauen und abfragen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--corpus", required=True, help="Ordner mit .md/.txt, Chunks als .jsonl oder Eval-JSON")
+    build.add_argument("--index", default=DEFAULT_INDEX_DIR)
+    query = sub.add_parser("query")
+    query.add_argument("--index", default=DEFAULT_INDEX_DIR)
+    query.add_argument("--top-n", type=int, default=10)
+    query.add_argument("--mode", default="hybrid", choices=("bm25", "dense", "hybrid"))
+    query.add_argument("text")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        chunks = load_corpus(args.corpus)
+        build_index(chunks, args.index)
+        print(f"{len(chunks)} Chunks indexiert -> {args.index}")
+    else:
+        for hit in LocalRetriever(args.index).search(args.text, args.top_n, args.mode):
+            print(f"{hit['rank']:>2}  {hit['search_score']:.4f}  {hit['doc_id']}#{hit['chunk_id']}  "
+                  f"{hit['content'][:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
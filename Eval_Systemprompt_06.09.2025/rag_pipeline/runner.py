@@ -0,0 +1,258 @@
+"""
+Matrix-Runner: Prompt-Versionen × Generierungsparameter × Datensätze in einem Lauf.
+
+Alle Zellen laufen in einer Event-Loop und teilen sich je einen Worker-Pool
+(Semaphor) und Rate Limiter für Generierung und Judge. Dadurch bestimmt die
+Quota das Tempo, nicht die Anzahl manuell gestarteter Skripte. Innerhalb einer
+Zelle überlappen Generierung und Evaluation (siehe ``pipeline``).
+
+Aufruf aus Eval_Systemprompt_06.09.2025:
+
+    python -m rag_pipeline.runner                          # alle Versionen, Default-Parameter
+    python -m rag_pipeline.runner --versions V0 V4 V12 --param temperature=0.7,0.2
+    python -m rag_pipeline.runner --matrix matrix.json --skip-eval
+
+Eine Matrix-Datei hat die Form
+``{"versions": [...], "datasets": [...], "params": {"temperature": [0.7, 0.2]}}``;
+Datensätze sind Namen oder Hashes aus dem Register (``datasets``) oder Pfade.
+Alle Versionen laufen damit auf denselben Beispielen, matrix_summary.csv
+hält den Hash des Datensatzes fest.
+Ergebnisse landen im Parquet-Store (eine Lauf-ID für alle Zellen, siehe
+``results``) und unter ``<out>/<Datensatz>/<Version>/<Parameter>/`` mit
+denselben Dateinamen wie in den Sytem-Prompt_Vn-Ordnern; eine Übersicht aller
+Zellen steht in ``<out>/matrix_summary.csv``, daneben Bootstrap-Intervalle und
+gepaarte Versionsvergleiche je Datensatz und Parameterkombination (erste
+Version als Baseline, siehe ``stats``) sowie Rangliste und Heatmap aller
+Zellen (siehe ``aggregate``) und je Zelle prescreen_results.csv (lokales
+Pre-Screening, siehe ``prescreen``). Jede Zelle schreibt einen
+JSONL-Checkpoint, ein abgebrochener Lauf setzt beim erneuten Aufruf dort fort
+(``--fresh`` startet neu).
+"""
+import os
+import copy
+import json
+import asyncio
+import argparse
+import itertools
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .cache import ResponseCache, JudgeCache
+from .checkpoint import Checkpoint
+from .contexts import save_responses
+from .datasets import DEFAULT_DATASET, dataset_label, load_dataset
+from .results import ResultStore, current_run_id
+from .ratelimit import RateLimiter
+from .prompts import load_system_prompt, list_prompt_versions
+from .generation import (
+    GenerationParams, DEFAULT_CONCURRENCY, load_azure_config, make_async_client, agenerate_all
+)
+from .evaluation import DEFAULT_EVAL_CONCURRENCY, make_judge_llm, make_evaluators, write_outputs
+from .pipeline import run_pipeline
+from .prescreen import prescreen, prescreen_mode, write_prescreen
+from . import telemetry
+from .transport import run_async, LazyClient
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, "results")
+CHECKPOINT_FILE = "V2_RAG_Eval_with_responses.jsonl"
+
+
+@dataclass(frozen=True)
+class Cell:
+    version: str
+    params: GenerationParams
+    dataset: str
+
+    @property
+    def params_slug(self) -> str:
+        default = GenerationParams()
+        changed = [f"{f.name}={getattr(self.params, f.name)}" for f in fields(GenerationParams)
+                   if getattr(self.params, f.name) != getattr(default, f.name)]
+        return "_".join(changed) or "default"
+
+    @property
+    def dataset_name(self) -> str:
+        return dataset_label(self.dataset)
+
+    def out_dir(self, root: str) -> str:
+        return os.path.join(root, self.dataset_name, self.version, self.params_slug)
+
+
+def _parse_value(name: str, raw: str):
+    types = {f.name: f.type for f in fields(GenerationParams)}
+    if name not in types:
+        raise SystemExit(f"Unbekannter Parameter '{name}'. Erlaubt: {', '.join(types)}")
+    if types[name] is bool:
+        return raw.lower() in ("1", "true", "on", "yes")
+    return types[name](raw)
+
+
+def parse_param_grid(specs: list) -> dict:
+    """``["temperature=0.7,0.2", "top_p=0.9"]`` -> ``{"temperature": [0.7, 0.2], "top_p": [0.9]}``"""
+    grid = {}
+    for spec in specs or []:
+        name, _, values = spec.partition("=")
+        grid[name.strip()] = [_parse_value(name.strip(), v.strip()) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def build_cells(versions: list, datasets: list, grid: dict) -> list:
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))] or [{}]
+    return [Cell(version, replace(GenerationParams(), **combo), dataset)
+            for dataset in datasets for version in versions for combo in combos]
+
+
+async def run_matrix(cells: list, out_root: str = DEFAULT_OUT_DIR,
+                     concurrency: int = DEFAULT_CONCURRENCY,
+                     eval_concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+                     skip_eval: bool = False, limit: Optional[int] = None,
+                     resume: bool = True) -> list:
+    config = load_azure_config()
+    cache = ResponseCache.from_env()
+    judge_cache = None if skip_eval else JudgeCache.from_env()
+    gen_limiter = RateLimiter.from_env()
+    judge_limiter = RateLimiter.from_env("JUDGE_OPENAI")
+    gen_semaphore = asyncio.Semaphore(max(1, concurrency))
+    judge_semaphore = asyncio.Semaphore(max(1, eval_concurrency))
+    # vor der Event-Loop bauen: der LlamaIndex-Import würde sonst laufende Generierungen blockieren
+    evaluators = None if skip_eval else make_evaluators(make_judge_llm())
+    datasets = {ref: load_dataset(ref) for ref in {cell.dataset for cell in cells}}
+    run_id = current_run_id()
+
+    async def _run_cell(client, cell: Cell) -> dict:
+        out_dir = cell.out_dir(out_root)
+        os.makedirs(out_dir, exist_ok=True)
+        dataset = datasets[cell.dataset]
+        data = copy.deepcopy(dataset.examples[:limit] if limit else dataset.examples)
+        checkpoint = Checkpoint(os.path.join(out_dir, CHECKPOINT_FILE), resume=resume)
+        system_prompt = load_system_prompt(cell.version)
+        summary = {}
+        labels = dict(prompt_version=cell.version, params=cell.params_slug, dataset=cell.dataset_name)
+        with telemetry.attributes(**labels), telemetry.span("matrix.cell"):
+            if evaluators is None:
+                await agenerate_all(data, system_prompt, client, config, cell.params,
+                                    limiter=gen_limiter, cache=cache, semaphore=gen_semaphore,
+                                    checkpoint=checkpoint)
+            else:
+                # Jede Antwort geht direkt in die Evaluation, sobald sie da ist
+                rows = await run_pipeline(data, system_prompt, client, config, evaluators, cell.params,
+                                          concurrency=concurrency, eval_concurrency=eval_concurrency,
+                                          limiter=gen_limiter, judge_limiter=judge_limiter, cache=cache,
+                                          checkpoint=checkpoint, judge_cache=judge_cache,
+                                          gen_semaphore=gen_semaphore,
+                                          judge_semaphore=judge_semaphore)
+                summary = write_outputs(rows, out_dir, prompt_version=cell.version, run_id=run_id,
+                                        dataset=cell.dataset_name, params=cell.params_slug)
+                if prescreen_mode() != "off":
+                    write_prescreen(prescreen(data), out_dir, rows)
+        save_responses(data, os.path.join(out_dir, "V2_RAG_Eval_with_responses.json"), dataset.hash)
+        telemetry.write_telemetry(out_dir, telemetry.TELEMETRY.select(
+            **{f"rag.{k}": v for k, v in labels.items()}))
+        print(f"[{cell.version} | {cell.params_slug} | {cell.dataset_name}] fertig -> {out_dir}")
+        return summary
+
+    client = LazyClient(make_async_client, config)
+    results = await asyncio.gather(*(_run_cell(client, cell) for cell in cells), return_exceptions=True)
+
+    summary_rows = []
+    for cell, result in zip(cells, results):
+        row = {"dataset": cell.dataset_name, "dataset_hash": datasets[cell.dataset].hash,
+               "version": cell.version, "params": cell.params_slug,
+               **asdict(cell.params)}
+        if isinstance(result, BaseException):
+            print(f"[{cell.version} | {cell.params_slug} | {cell.dataset_name}] Fehler: {result}")
+            row["error"] = f"{type(result).__name__}: {result}"
+        else:
+            row.update(result)
+        summary_rows.append(row)
+
+    import pandas as pd
+
+    os.makedirs(out_root, exist_ok=True)
+    pd.DataFrame(summary_rows).to_csv(os.path.join(out_root, "matrix_summary.csv"),
+                                      index=False, sep=';', encoding='utf-8-sig')
+    if not skip_eval:
+        store = ResultStore.from_env()
+        write_version_comparison([c for c, r in zip(cells, results) if not isinstance(r, BaseException)],
+                                 out_root, store, run_id)
+        # Rangliste und Heatmap über alle Zellen
+        from .aggregate import write_aggregate
+        write_aggregate(out_root, store=store, run_ids=[run_id])
+    # Latenz, Tokens und Retries je Prompt-Version über alle Zellen
+    telemetry.write_telemetry(out_root)
+    return summary_rows
+
+
+def write_version_comparison(cells: list, out_root: str, store: Optional[ResultStore] = None,
+                             run_id: Optional[str] = None):
+    """
+    Versionsvergleich je (Datensatz, Parameter); Ergebnisse aus dem Store
+    (Lauf ``run_id``), ohne Store aus den evaluation_results_detailed.csv der Zellen.
+    """
+    import pandas as pd
+    from .stats import CI_FILE, DIFFS_FILE, compare_versions
+
+    groups = {}
+    for cell in cells:
+        path = os.path.join(cell.out_dir(out_root), "evaluation_results_detailed.csv")
+        if store is not None:
+            frame = store.read(cell.version, run_id, cell.dataset_name, cell.params_slug)
+        elif os.path.exists(path):
+            frame = pd.read_csv(path, sep=";", encoding="utf-8-sig")
+        else:
+            continue
+        groups.setdefault((cell.dataset_name, cell.params_slug), {})[cell.version] = frame
+    intervals, diffs = [], []
+    for (dataset, params), frames in groups.items():
+        ci, diff = compare_versions(frames, baseline=next(iter(frames)))
+        intervals.append(ci.assign(dataset=dataset, params=params))
+        diffs.append(diff.assign(dataset=dataset, params=params))
+    if intervals:
+        pd.concat(intervals).to_csv(os.path.join(out_root, CI_FILE), index=False, sep=';', encoding='utf-8-sig')
+        pd.concat(diffs).to_csv(os.path.join(out_root, DIFFS_FILE), index=False, sep=';', encoding='utf-8-sig')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt-Versionen × Parameter × Datensätze generieren und evaluieren")
+    parser.add_argument("--matrix", help="JSON-Datei mit versions/datasets/params")
+    parser.add_argument("--versions", nargs="+", help="z.B. V0 V4 V12 (Default: alle unter prompts/)")
+    parser.add_argument("--datasets", nargs="+",
+                        help=f"Namen/Hashes aus datasets/ oder Pfade zu Eval-JSONs (Default: {DEFAULT_DATASET})")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="Parameter-Raster, z.B. temperature=0.7,0.2 (mehrfach möglich)")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.getenv("GENERATION_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    parser.add_argument("--eval-concurrency", type=int,
+                        default=int(os.getenv("EVAL_CONCURRENCY", DEFAULT_EVAL_CONCURRENCY)))
+    parser.add_argument("--limit", type=int, help="nur die ersten N Beispiele je Datensatz")
+    parser.add_argument("--skip-eval", action="store_true", help="nur generieren")
+    parser.add_argument("--fresh", action="store_true",
+                        help="vorhandene Checkpoints verwerfen statt fortzusetzen")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    matrix = {}
+    if args.matrix:
+        with open(args.matrix, "r", encoding="utf-8") as f:
+            matrix = json.load(f)
+
+    versions = args.versions or matrix.get("versions") or list_prompt_versions()
+    datasets = args.datasets or matrix.get("datasets") or [DEFAULT_DATASET]
+    grid = {name: [_parse_value(name, str(v)) for v in values]
+            for name, values in matrix.get("params", {}).items()}
+    grid.update(parse_param_grid(args.param))
+
+    cells = build_cells(versions, datasets, grid)
+    print(f"{len(cells)} Zellen: {len(versions)} Versionen × {len(datasets)} Datensätze × "
+          f"{len(cells) // max(1, len(versions) * len(datasets))} Parameter-Kombinationen")
+    run_async(run_matrix(cells, args.out, args.concurrency, args.eval_concurrency,
+                           args.skip_eval, args.limit, resume=not args.fresh))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Statistik über die Evaluationsergebnisse: Bootstrap-Konfidenzintervalle,
+gepaarte Differenzen zwischen Prompt-Versionen und Permutationstests.
+
+Bei 40 Fragen sind Mittelwert ± Standardabweichung zu grob, um V0 und V12
+zu unterscheiden. Hier werden deshalb
+
+- je Version und Metrik ein Perzentil-Bootstrap-Intervall für den Mittelwert,
+- je Versionspaar und Metrik die mittlere Differenz über dieselben Fragen
+  (gepaart) samt Bootstrap-Intervall und
+- ein Vorzeichen-Permutationstest (zweiseitig) für diese Differenz
+
+berechnet. Alle Spalten (Versionen × Metriken bzw. Paare × Metriken) werden
+in einer Matrixoperation resampelt: Eine Bootstrap-Stichprobe ist ein Vektor
+von Ziehungshäufigkeiten je Frage, die Mittelwerte aller Spalten sind dann
+``counts @ scores``. Fehlende Scores (NaN) zählen weder im Zähler noch im
+Nenner. Die Resamples werden blockweise erzeugt, damit der Speicher auch bei
+tausenden Fragen begrenzt bleibt.
+
+Ausgabe neben evaluation_summary_stats.csv:
+
+- evaluation_summary_ci.csv (je Metrik, aus ``evaluation.write_outputs``)
+- evaluation_version_diffs.csv (Versionsvergleich, CLI bzw. Matrix-Runner)
+
+Versionsvergleich über alle Sytem-Prompt_Vn-Ordner (aus Eval_Systemprompt_06.09.2025):
+
+    python -m rag_pipeline.stats --baseline V0 --resamples 10000
+    python -m rag_pipeline.stats --baseline V0 --store      # aus dem Parquet-Store
+"""
+import os
+import re
+import glob
+import argparse
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .datasets import example_ids
+
+SCORE_COLUMNS = ("correctness_score", "relevance_score", "faithfulness_score", "overall_average_score")
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_ALPHA = 0.05
+DEFAULT_SEED = 0
+# Elemente je Block der Resample-Matrix (Blockgröße × Fragen), ca. 64 MB in float64
+BLOCK_ELEMENTS = 8_000_000
+CI_FILE = "evaluation_summary_ci.csv"
+DIFFS_FILE = "evaluation_version_diffs.csv"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_VERSION = re.compile(r"V(\d+)$")
+
+
+def _blocks(n_resamples: int, n: int):
+    size = max(1, min(n_resamples, BLOCK_ELEMENTS // max(1, n)))
+    for start in range(0, n_resamples, size):
+        yield min(size, n_resamples - start)
+
+
+def _bootstrap_counts(rng: np.random.Generator, size: int, n: int) -> np.ndarray:
+    """(size, n): wie oft jede Frage in jeder Bootstrap-Stichprobe gezogen wurde."""
+    draws = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(np.float64)
+
+
+def bootstrap_means(scores: np.ndarray, n_resamples: int = DEFAULT_RESAMPLES,
+                    seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    ``scores`` hat die Form (Fragen, Spalten), NaN = kein Score. Gibt die
+    Mittelwerte aller Spalten für jede Bootstrap-Stichprobe zurück
+    (n_resamples, Spalten); NaN, wo eine Stichprobe keinen gültigen Wert hat.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = scores.shape[0]
+    valid = ~np.isnan(scores)
+    values = np.where(valid, scores, 0.0)
+    weights = valid.astype(np.float64)
+    rng = np.random.default_rng(seed)
+    out = np.empty((n_resamples, scores.shape[1]))
+    row = 0
+    for size in _blocks(n_resamples, n):
+        counts = _bootstrap_counts(rng, size, n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[row:row + size] = (counts @ values) / (counts @ weights)
+        row += size
+    return out
+
+
+def percentile_interval(samples: np.ndarray, alpha: float = DEFAULT_ALPHA) -> tuple:
+    """Untere und obere Grenze je Spalte (Perzentil-Methode)."""
+    empty = np.isnan(samples).all(axis=0)
+    filled = np.where(empty, 0.0, samples)  # vermeidet Warnungen für leere Spalten
+    low, high = np.nanpercentile(filled, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return np.where(empty, np.nan, low), np.where(empty, np.nan, high)
+
+
+def sign_flip_pvalues(diffs: np.ndarray, n_resamples: int = DEFAULT_RESAMPLES,
+                      seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    Zweiseitiger gepaarter Permutationstest je Spalte: Unter H0 ist das
+    Vorzeichen jeder Differenz zufällig. p = (1 + #|Mittel*| >= |Mittel|) / (1 + n_resamples).
+    """
+    diffs = np.asarray(diffs, dtype=np.float64)
+    n = diffs.shape[0]
+    valid = ~np.isnan(diffs)
+    values = np.where(valid, diffs, 0.0)
+    count = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = np.abs(values.sum(axis=0) / count)
+    # kleine Toleranz, damit exakt gleiche Mittelwerte nicht an Rundung scheitern
+    threshold = observed * (1 - 1e-12) * count
+    rng = np.random.default_rng(seed)
+    extreme = np.zeros(diffs.shape[1])
+    for size in _blocks(n_resamples, n):
+        signs = rng.integers(0, 2, size=(size, n)) * 2.0 - 1.0
+        extreme += (np.abs(signs @ values) >= threshold).sum(axis=0)
+    p_values = (1 + extreme) / (1 + n_resamples)
+    return np.where(count > 0, p_values, np.nan)
+
+
+def example_id_column(df: pd.DataFrame) -> list:
+    """Frage-ID je Zeile: ``example_id``/``question_id``, fehlende aus dem Fragetext abgeleitet."""
+    derived = example_ids(df["question"].fillna("").astype(str)) if "question" in df.columns \
+        else [str(i) for i in range(len(df))]
+    for column in ("example_id", "question_id"):
+        if column in df.columns:
+            return [i if isinstance(i, str) and i else d for i, d in zip(df[column], derived)]
+    return derived
+
+
+def score_matrix(frames: dict, metrics: tuple = SCORE_COLUMNS) -> tuple:
+    """
+    ``frames``: Version -> DataFrame mit ``question`` und den Score-Spalten
+    (z.B. evaluation_results_detailed.csv). Die Zeilen werden über die
+    ``example_id`` (Store: ``question_id``) zugeordnet, ohne sie über dieselbe
+    Ableitung aus dem Fragetext (siehe ``datasets.example_ids``).
+    Gibt (scores[Fragen, Versionen, Metriken], Frage-IDs, Versionen, Metriken) zurück.
+    """
+    versions = list(frames)
+    metrics = [m for m in metrics if any(m in df.columns for df in frames.values())]
+    keyed = []
+    for version in versions:
+        df = frames[version]
+        df = df.set_index(pd.Index(example_id_column(df), name="example_id"))
+        keyed.append(df.reindex(columns=metrics).apply(pd.to_numeric, errors="coerce"))
+    index = keyed[0].index
+    for df in keyed[1:]:
+        index = index.union(df.index, sort=False)
+    scores = np.stack([df.reindex(index).to_numpy(dtype=np.float64) for df in keyed], axis=1)
+    return scores, list(index), versions, metrics
+
+
+def confidence_intervals(scores: np.ndarray, versions: list, metrics: list,
+                         n_resamples: int = DEFAULT_RESAMPLES, alpha: float = DEFAULT_ALPHA,
+                         seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Bootstrap-Intervall für den Mittelwert je Version und Metrik (alle Spalten in einem Durchlauf)."""
+    flat = scores.reshape(scores.shape[0], -1)
+    low, high = percentile_interval(bootstrap_means(flat, n_resamples, seed), alpha)
+    with np.errstate(invalid="ignore"):
+        mean = np.nanmean(np.where(np.isnan(flat).all(axis=0), 0.0, flat), axis=0)
+    count = (~np.isnan(flat)).sum(axis=0)
+    labels = [(v, m) for v in versions for m in metrics]
+    return pd.DataFrame({
+        "version": [v for v, _ in labels],
+        "metric": [m for _, m in labels],
+        "n": count,
+        "mean": np.where(count > 0, mean, np.nan),
+        "ci_low": low,
+        "ci_high": high,
+        "confidence": 1 - alpha,
+        "resamples": n_resamples,
+    })
+
+
+def version_diffs(scores: np.ndarray, versions: list, metrics: list, baseline: Optional[str] = None,
+                  n_resamples: int = DEFAULT_RESAMPLES, alpha: float = DEFAULT_ALPHA,
+                  seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """
+    Gepaarte Differenzen (Version B - Version A) je Metrik über die Fragen,
+    die beide bewertet haben. Ohne ``baseline`` alle Paare, sonst jede Version
+    gegen die Baseline. Bootstrap und Permutationstest laufen jeweils über
+    alle Paare × Metriken gleichzeitig.
+    """
+    if baseline is not None:
+        if baseline not in versions:
+            raise ValueError(f"Baseline {baseline} nicht unter den Versionen {versions}")
+        a = versions.index(baseline)
+        pairs = [(a, b) for b in range(len(versions)) if b != a]
+    else:
+        pairs = [(a, b) for a in range(len(versions)) for b in range(a + 1, len(versions))]
+    if not pairs:
+        return pd.DataFrame(columns=["version_a", "version_b", "metric", "n_pairs", "mean_diff",
+                                     "ci_low", "ci_high", "p_value", "resamples"])
+    first, second = np.array(pairs).T
+    diffs = (scores[:, second, :] - scores[:, first, :]).reshape(scores.shape[0], -1)
+    low, high = percentile_interval(bootstrap_means(diffs, n_resamples, seed), alpha)
+    count = (~np.isnan(diffs)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(diffs, axis=0) / count
+    labels = [(versions[a], versions[b], m) for a, b in pairs for m in metrics]
+    return pd.DataFrame({
+        "version_a": [a for a, _, _ in labels],
+        "version_b": [b for _, b, _ in labels],
+        "metric": [m for _, _, m in labels],
+        "n_pairs": count,
+        "mean_diff": mean,
+        "ci_low": low,
+        "ci_high": high,
+        "p_value": sign_flip_pvalues(diffs, n_resamples, seed + 1),
+        "resamples": n_resamples,
+    })
+
+
+def summary_intervals(df: pd.DataFrame, n_resamples: int = DEFAULT_RESAMPLES,
+                      alpha: float = DEFAULT_ALPHA) -> pd.DataFrame:
+    """Intervalle für eine einzelne Ergebnistabelle (ohne Versionsspalte)."""
+    scores, _, _, metrics = score_matrix({"": df})
+    return confidence_intervals(scores, [""], metrics, n_resamples, alpha).drop(columns="version")
+
+
+def _version_key(version: str):
+    match = _VERSION.search(version)
+    return (0, int(match.group(1))) if match else (1, version)
+
+
+def load_version_results(base_dir: str = BASE_DIR,
+                         filename: str = "evaluation_results_detailed.csv") -> dict:
+    """Version -> Ergebnistabelle aus allen Sytem-Prompt_Vn-Ordnern, nach Versionsnummer sortiert."""
+    from .prompts import version_from_path
+
+    frames = {}
+    for path in glob.glob(os.path.join(base_dir, "Sytem-Prompt_*", filename)):
+        version = version_from_path(path)
+        if version:
+            frames[version] = pd.read_csv(path, sep=";", encoding="utf-8-sig")
+    return {v: frames[v] for v in sorted(frames, key=_version_key)}
+
+
+def load_store_results(store, dataset: Optional[str] = None, params: Optional[str] = None) -> dict:
+    """Version -> Ergebnistabelle des jüngsten Laufs aus dem Parquet-Store (siehe ``results``)."""
+    from .results import DEFAULT_DATASET, DEFAULT_PARAMS
+
+    table = store.scan(columns=["prompt_version", "index", "question_id", "question", *SCORE_COLUMNS], latest=True)
+    df = table.to_pandas()
+    df = df[(df["dataset"] == (dataset or DEFAULT_DATASET)) & (df["params"] == (params or DEFAULT_PARAMS))]
+    df = df.assign(question=df["question"].astype(object))
+    frames = {str(v): g.sort_values("index") for v, g in df.groupby("prompt_version", observed=True)}
+    return {v: frames[v] for v in sorted(frames, key=_version_key)}
+
+
+def compare_versions(frames: dict, baseline: Optional[str] = None, n_resamples: int = DEFAULT_RESAMPLES,
+                     alpha: float = DEFAULT_ALPHA, seed: int = DEFAULT_SEED) -> tuple:
+    """(Intervalle je Version, gepaarte Differenzen) für mehrere Ergebnistabellen."""
+    scores, _, versions, metrics = score_matrix(frames)
+    return (confidence_intervals(scores, versions, metrics, n_resamples, alpha, seed),
+            version_diffs(scores, versions, metrics, baseline, n_resamples, alpha, seed))
+
+
+def write_comparison(frames: dict, out_dir: str = BASE_DIR, baseline: Optional[str] = None,
+                     n_resamples: int = DEFAULT_RESAMPLES, alpha: float = DEFAULT_ALPHA) -> tuple:
+    """Schreibt evaluation_summary_ci.csv (je Version) und evaluation_version_diffs.csv nach ``out_dir``."""
+    intervals, diffs = compare_versions(frames, baseline, n_resamples, alpha)
+    os.makedirs(out_dir, exist_ok=True)
+    ci_path = os.path.join(out_dir, CI_FILE)
+    diffs_path = os.path.join(out_dir, DIFFS_FILE)
+    intervals.to_csv(ci_path, index=False, sep=";", encoding="utf-8-sig")
+    diffs.to_csv(diffs_path, index=False, sep=";", encoding="utf-8-sig")
+    return ci_path, diffs_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap-Intervalle und Versionsvergleich der Evaluation")
+    parser.add_argument("--base-dir", default=BASE_DIR, help="Ordner mit den Sytem-Prompt_Vn-Ordnern")
+    parser.add_argument("--out", help="Zielordner (Default: --base-dir)")
+    parser.add_argument("--baseline", help="z.B. V0; ohne Angabe alle Versionspaare")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    parser.add_argument("--store", nargs="?", const="",
+                        help="jüngste Läufe aus dem Parquet-Store statt CSVs (optional Pfad)")
+    args = parser.parse_args(argv)
+
+    if args.store is not None:
+        from .results import DEFAULT_STORE_PATH, ResultStore
+        frames = load_store_results(ResultStore(args.store or DEFAULT_STORE_PATH))
+    else:
+        frames = load_version_results(args.base_dir)
+    if not frames:
+        raise SystemExit(f"Keine evaluation_results_detailed.csv unter {args.base_dir}")
+    ci_path, diffs_path = write_comparison(frames, args.out or args.base_dir, args.baseline,
+                                           args.resamples, args.alpha)
+    print(f"{len(frames)} Versionen verglichen: {ci_path}, {diffs_path}")
+    diffs = pd.read_csv(diffs_path, sep=";", encoding="utf-8-sig")
+    significant = diffs[diffs["p_value"] < args.alpha]
+    print(f"{len(significant)} von {len(diffs)} Differenzen mit p < {args.alpha}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Telemetrie: ein Span pro API-Aufruf (Generierung und Judge).
+
+Jeder Span enthält Wartezeit in der Warteschlange (Worker-Pool und Rate
+Limiter), Netzwerklatenz des erfolgreichen Versuchs, Time-to-first-token
+(nur im Streaming-Modus messbar), Prompt-/Completion-Tokens, Anzahl und Ursache
+der Wiederholungen sowie die Prompt-Version. Die Attributnamen folgen, wo es
+sie gibt, den OpenTelemetry-GenAI-Konventionen (``gen_ai.*``), der Rest liegt
+unter ``rag.*``.
+
+Export als OTLP/JSON-Datei oder per HTTP an einen lokalen Collector
+(``/v1/traces``), gesteuert über TELEMETRY_EXPORT=off|file|otlp|both und
+OTEL_EXPORTER_OTLP_ENDPOINT. ``summarize_spans`` verdichtet die Spans pro
+Prompt-Version zu Latenz-, Token- und Retry-Kennzahlen.
+"""
+import os
+import json
+import time
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from .ratelimit import is_rate_limit_error
+
+FILE_PREFIX = "telemetry"   # -> telemetry_spans.json, telemetry_summary.csv
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318"
+SERVICE_NAME = "rag-eval-pipeline"
+
+_attributes = ContextVar("telemetry_attributes", default={})
+_current = ContextVar("telemetry_span", default=None)
+_queued_at = ContextVar("telemetry_queued_at", default=None)
+
+
+def retry_cause(e: Exception) -> str:
+    return "rate_limit" if is_rate_limit_error(e) else type(e).__name__
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.status = ("OK", "")
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add(self, key: str, amount: float):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def fail(self, e: Exception):
+        """Fehler, der abgefangen und nicht weitergeworfen wird."""
+        self.status = ("ERROR", f"{type(e).__name__}: {e}")
+
+    def record_retry(self, e: Exception):
+        self.add("rag.retry_count", 1)
+        self.attributes["rag.retry_causes"] = [*self.attributes.get("rag.retry_causes", []), retry_cause(e)]
+
+    def record_sdk_retries(self, count: int):
+        """Wiederholungen, die der openai-Client intern gemacht hat (``retries_taken``)."""
+        if count:
+            self.add("rag.retry_count", count)
+            self.attributes["rag.retry_causes"] = [*self.attributes.get("rag.retry_causes", []), *["sdk"] * count]
+
+    def record_usage(self, usage):
+        if usage is None:
+            return
+        self.set(**{"gen_ai.usage.input_tokens": getattr(usage, "prompt_tokens", None),
+                    "gen_ai.usage.output_tokens": getattr(usage, "completion_tokens", None)})
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 3,  # SPAN_KIND_CLIENT
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2 if self.status[0] == "ERROR" else 1, "message": self.status[1]},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Telemetry:
+    """Sammelt die Spans eines Prozesses (thread- und task-sicher)."""
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current.get()
+        span = Span(name, self.trace_id, parent.span_id if parent else None,
+                    {**_attributes.get(), **attributes})
+        queued_at = _queued_at.get()
+        if queued_at is not None:
+            span.add("rag.queue_wait_ms", (time.perf_counter() - queued_at) * 1000)
+            _queued_at.set(None)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            with self._lock:
+                self.spans.append(span)
+
+    def select(self, **attributes) -> list:
+        with self._lock:
+            return [s for s in self.spans if all(s.attributes.get(k) == v for k, v in attributes.items())]
+
+    def to_otlp(self, spans: Optional[list] = None) -> dict:
+        spans = self.select() if spans is None else spans
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "rag_pipeline"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+
+    def export_file(self, path: str, spans: Optional[list] = None) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_otlp(spans), f, ensure_ascii=False)
+        return path
+
+    def export_otlp(self, endpoint: Optional[str] = None, spans: Optional[list] = None):
+        """POST an einen OTLP/HTTP-Collector (JSON-Encoding)."""
+        import urllib.request
+
+        endpoint = (endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", DEFAULT_OTLP_ENDPOINT)).rstrip("/")
+        request = urllib.request.Request(endpoint + "/v1/traces", data=json.dumps(self.to_otlp(spans)).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+
+TELEMETRY = Telemetry()
+
+
+def span(name: str, **attributes):
+    return TELEMETRY.span(name, **attributes)
+
+
+@contextmanager
+def attributes(**attrs):
+    """Attribute (als ``rag.<name>``) für alle Spans im Block, z.B. ``prompt_version`` je Matrix-Zelle."""
+    token = _attributes.set({**_attributes.get(), **{f"rag.{k}": v for k, v in attrs.items()}})
+    try:
+        yield
+    finally:
+        _attributes.reset(token)
+
+
+def set_attributes(**attrs):
+    """Wie ``attributes``, aber dauerhaft für den aktuellen Kontext (Skripte)."""
+    _attributes.set({**_attributes.get(), **{f"rag.{k}": v for k, v in attrs.items()}})
+
+
+def mark_queued():
+    """Vor dem Warten auf einen Worker aufrufen; der nächste Span zählt die Zeit als Wartezeit."""
+    _queued_at.set(time.perf_counter())
+
+
+def span_records(spans: list) -> list:
+    return [{"name": s.name, "status": s.status[0], "duration_ms": s.duration_ms, **s.attributes} for s in spans]
+
+
+def _sum(values):
+    return values.sum(min_count=1)  # leer statt 0, wenn die Span-Art keine Tokens kennt
+
+
+def summarize_spans(spans: list):
+    """Kennzahlen je Prompt-Version und Span-Art als DataFrame."""
+    import pandas as pd
+
+    df = pd.DataFrame(span_records(spans))
+    if df.empty:
+        return df
+    numeric = ["rag.queue_wait_ms", "rag.latency_ms", "rag.ttft_ms", "rag.itl_mean_ms",
+               "gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens", "rag.estimated_input_tokens",
+               "rag.retry_count"]
+    for col in ["rag.prompt_version", "rag.cache_hit", *numeric]:
+        if col not in df:
+            df[col] = None
+    df["rag.prompt_version"] = df["rag.prompt_version"].fillna("-")
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+    grouped = df.groupby(["rag.prompt_version", "name"])
+    summary = grouped.agg(
+        calls=("name", "size"),
+        errors=("status", lambda s: int((s == "ERROR").sum())),
+        cache_hits=("rag.cache_hit", lambda s: int(s.eq(True).sum())),
+        latency_p50_ms=("rag.latency_ms", "median"),
+        latency_p95_ms=("rag.latency_ms", lambda s: s.quantile(0.95)),
+        ttft_p50_ms=("rag.ttft_ms", "median"),
+        ttft_p95_ms=("rag.ttft_ms", lambda s: s.quantile(0.95)),
+        itl_mean_ms=("rag.itl_mean_ms", "mean"),
+        queue_wait_mean_ms=("rag.queue_wait_ms", "mean"),
+        input_tokens=("gen_ai.usage.input_tokens", _sum),
+        output_tokens=("gen_ai.usage.output_tokens", _sum),
+        output_tokens_mean=("gen_ai.usage.output_tokens", "mean"),
+        estimated_input_tokens=("rag.estimated_input_tokens", _sum),
+        retries=("rag.retry_count", "sum"),
+    )
+    return summary.reset_index().rename(columns={"rag.prompt_version": "prompt_version", "name": "span"})
+
+
+def write_telemetry(out_dir: str = ".", spans: Optional[list] = None, prefix: str = FILE_PREFIX) -> Optional[str]:
+    """Spans als OTLP/JSON und die Zusammenfassung als CSV in ``out_dir``."""
+    spans = TELEMETRY.select() if spans is None else spans
+    if not spans:
+        return None
+    os.makedirs(out_dir, exist_ok=True)
+    TELEMETRY.export_file(os.path.join(out_dir, f"{prefix}_spans.json"), spans)
+    summary_path = os.path.join(out_dir, f"{prefix}_summary.csv")
+    summarize_spans(spans).to_csv(summary_path, index=False, sep=";", encoding="utf-8-sig")
+    return summary_path
+
+
+def export_from_env(out_dir: str = ".", prefix: str = FILE_PREFIX):
+    """Export je nach TELEMETRY_EXPORT (off, file, otlp, both); Default off."""
+    mode = os.getenv("TELEMETRY_EXPORT", "off").lower()
+    if mode in ("file", "both"):
+        print(f"Telemetrie geschrieben: {write_telemetry(out_dir, prefix=prefix)}")
+    if mode in ("otlp", "both"):
+        try:
+            TELEMETRY.export_otlp()
+            print("Telemetrie an OTLP-Collector gesendet.")
+        except OSError as e:
+            print(f"Telemetrie-Export fehlgeschlagen: {e}")
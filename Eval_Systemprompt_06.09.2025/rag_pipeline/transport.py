@@ -0,0 +1,183 @@
+"""
+Gemeinsamer HTTP-Verbindungspool für alle SDK-Clients eines Prozesses.
+
+AzureOpenAI (Generierung, Batch) und der LlamaIndex-Judge bekommen denselben
+httpx-Client statt je einen eigenen mit Default-Einstellungen. Verbindungen
+bleiben offen (Keep-Alive) und werden über Generierung, Evaluation und alle
+Prompt-Versionen hinweg wiederverwendet; TLS-Handshakes fallen nur einmal pro
+Verbindung an. HTTP/2 wird genutzt, wenn das Paket ``h2`` installiert ist
+(``pip install httpx[http2]``).
+
+Einstellungen über die Umgebung:
+
+- HTTP_MAX_CONNECTIONS (Default 100), HTTP_MAX_KEEPALIVE (Default 50),
+  HTTP_KEEPALIVE_EXPIRY in Sekunden (Default 30)
+- HTTP_CONNECT_TIMEOUT (10), HTTP_READ_TIMEOUT (120), HTTP_WRITE_TIMEOUT (30),
+  HTTP_POOL_TIMEOUT (60)
+- HTTP2=auto|on|off (Default auto)
+
+Ein httpx.AsyncClient gehört zu genau einer Event-Loop. ``run_async`` ersetzt
+deshalb ``asyncio.run`` und schließt den Async-Pool am Ende der Loop; die
+nächste Loop bekommt einen frischen. Synchrone Aufrufe, die intern asyncio
+nutzen (LlamaIndex ``evaluate``), laufen in ``sync_event_loop``, sonst startet
+jeder Aufruf eine neue Loop und erbt Verbindungen der vorigen.
+
+httpx wird erst beim ersten Client importiert; ``LazyClient`` schiebt auch den
+Bau der SDK-Clients (und damit den Import von openai) bis zum ersten Aufruf
+auf. Ein Lauf, der nur aus Cache und Checkpoint bedient wird, lädt beides nie.
+"""
+import os
+import asyncio
+import importlib.util
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+
+@dataclass(frozen=True)
+class HttpSettings:
+    max_connections: int = 100
+    max_keepalive: int = 50
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 60.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> "HttpSettings":
+        default = cls()
+        number = lambda name, value: type(value)(os.getenv(name, value))
+        mode = os.getenv("HTTP2", "auto").lower()
+        has_h2 = importlib.util.find_spec("h2") is not None
+        if mode in ("1", "on", "true", "yes") and not has_h2:
+            print("HTTP2=on, aber das Paket 'h2' fehlt (pip install httpx[http2]); nutze HTTP/1.1.")
+        return cls(
+            max_connections=number("HTTP_MAX_CONNECTIONS", default.max_connections),
+            max_keepalive=number("HTTP_MAX_KEEPALIVE", default.max_keepalive),
+            keepalive_expiry=number("HTTP_KEEPALIVE_EXPIRY", default.keepalive_expiry),
+            connect_timeout=number("HTTP_CONNECT_TIMEOUT", default.connect_timeout),
+            read_timeout=number("HTTP_READ_TIMEOUT", default.read_timeout),
+            write_timeout=number("HTTP_WRITE_TIMEOUT", default.write_timeout),
+            pool_timeout=number("HTTP_POOL_TIMEOUT", default.pool_timeout),
+            http2=has_h2 and mode not in ("0", "off", "false", "no"),
+        )
+
+    def client_kwargs(self) -> dict:
+        import httpx
+
+        return dict(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_keepalive,
+                                keepalive_expiry=self.keepalive_expiry),
+            timeout=httpx.Timeout(connect=self.connect_timeout, read=self.read_timeout,
+                                  write=self.write_timeout, pool=self.pool_timeout),
+            http2=self.http2,
+            follow_redirects=True,
+        )
+
+
+@lru_cache(maxsize=1)
+def _client_classes() -> tuple:
+    import httpx
+
+    class _SharedClient(httpx.Client):
+        def close(self):
+            pass    # gehört dem Prozess, nicht dem einzelnen SDK-Client
+
+        def close_pool(self):
+            super().close()
+
+    class _SharedAsyncClient(httpx.AsyncClient):
+        async def aclose(self):
+            pass    # wird von run_async am Ende der Loop geschlossen
+
+        async def aclose_pool(self):
+            await super().aclose()
+
+    return _SharedClient, _SharedAsyncClient
+
+
+@lru_cache(maxsize=1)
+def http_settings() -> HttpSettings:
+    return HttpSettings.from_env()
+
+
+_sync_client = None
+_async_client = None
+
+
+def shared_http_client() -> "httpx.Client":
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = _client_classes()[0](**http_settings().client_kwargs())
+    return _sync_client
+
+
+def shared_async_http_client() -> "httpx.AsyncClient":
+    global _async_client
+    if _async_client is None:
+        _async_client = _client_classes()[1](**http_settings().client_kwargs())
+    return _async_client
+
+
+async def aclose_shared():
+    """Schließt den Async-Pool (am Ende einer Event-Loop)."""
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose_pool()
+
+
+class LazyClient:
+    """
+    Stellvertreter für einen SDK-Client, der erst beim ersten Attributzugriff
+    gebaut wird, z.B. ``LazyClient(make_async_client, config)``.
+    """
+
+    def __init__(self, factory: Callable, *args, **kwargs):
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._client = None
+
+    @property
+    def built(self) -> bool:
+        return self._client is not None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            self._client = self._factory(*self._args, **self._kwargs)
+        return getattr(self._client, name)
+
+
+def run_async(coro):
+    """``asyncio.run`` mit anschließendem Schließen des gemeinsamen Async-Pools."""
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await aclose_shared()
+    return asyncio.run(_main())
+
+
+@contextmanager
+def sync_event_loop():
+    """
+    Eine Event-Loop für alle synchronen Aufrufe im Block (als aktuelle Loop
+    gesetzt, LlamaIndex' ``asyncio_run`` nimmt sie). Am Ende wird der
+    Async-Pool in derselben Loop geschlossen.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        yield loop
+    finally:
+        loop.run_until_complete(aclose_shared())
+        asyncio.set_event_loop(None)
+        loop.close()
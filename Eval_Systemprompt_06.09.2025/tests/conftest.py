@@ -0,0 +1,47 @@
+"""
+Gemeinsame Fixtures: ``rag_pipeline`` aus diesem Verzeichnis importierbar und
+ein Mock-Server (``rag_pipeline.mockserver``) je Test auf einem freien Port.
+
+Aufruf aus Eval_Systemprompt_06.09.2025:
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_pipeline.generation import AzureConfig  # noqa: E402
+from rag_pipeline.mockserver import MockSettings, start_server  # noqa: E402
+
+
+@pytest.fixture
+def mock_settings() -> MockSettings:
+    return MockSettings()
+
+
+@pytest.fixture
+def mock_server(mock_settings):
+    server = start_server(mock_settings)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def azure_config(mock_server) -> AzureConfig:
+    return AzureConfig(endpoint=mock_server.url, search_endpoint="https://search.invalid", search_key="k",
+                       subscription_key="x", deployment_name="gpt-4o", index_name="idx")
+
+
+@pytest.fixture
+def judge_env(mock_server, monkeypatch):
+    """Judge-LLM gegen den Mock, ohne Caches und Store im Repository."""
+    monkeypatch.setenv("OPENAI_API_BASE", mock_server.url + "/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "x")
+    for name in ("RESPONSE_CACHE", "JUDGE_CACHE", "RESULTS_STORE"):
+        monkeypatch.setenv(name, "off")
+    return mock_server
@@ -0,0 +1,102 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from rag_pipeline.adaptive import (
+    Scheduler,
+    SuccessiveElimination,
+    SuccessiveHalving,
+    make_scheduler,
+    simulate,
+)
+
+VERSIONS = ["V0", "V1", "V2", "V3"]
+
+
+def _synthetic(n_questions: int = 400, seed: int = 0) -> np.ndarray:
+    """V2 klar am besten, V0 und V3 klar schlechter, V1 dahinter."""
+    rng = np.random.default_rng(seed)
+    difficulty = rng.normal(0.0, 0.8, n_questions)
+    quality = np.array([-1.2, -0.4, 0.0, -1.5])
+    latent = 3.2 + difficulty[None, :] + quality[:, None] + rng.normal(0.0, 0.6, (len(quality), n_questions))
+    return np.clip(np.rint(latent), 1, 5)
+
+
+def test_scheduler_is_abstract():
+    with pytest.raises(TypeError):
+        Scheduler(VERSIONS, 10)
+
+
+def test_elimination_drops_clear_losers_and_keeps_best():
+    truth = _synthetic()
+    scheduler = SuccessiveElimination(VERSIONS, truth.shape[1], batch=25, min_questions=50)
+    batch = scheduler.next_batch()
+    assert len(batch) == 50
+    for version in scheduler.active_versions:
+        scheduler.record(version, batch, truth[VERSIONS.index(version), batch])
+    dropped = scheduler.end_round()
+    assert "V2" not in dropped and "V2" in scheduler.active_versions
+
+    result = simulate(scheduler, truth)
+    assert scheduler.winner() == "V2"
+    assert result["correct"]
+    assert result["calls"] < truth.size
+    history = {(row["version"], row["status"]) for row in scheduler.history}
+    assert ("V0", "dropped") in history and ("V3", "dropped") in history
+    # ausgeschiedene Versionen bekommen keine weiteren Fragen
+    assert np.isfinite(scheduler.scores[VERSIONS.index("V3")]).sum() < truth.shape[1]
+
+
+def test_elimination_waits_for_min_questions():
+    truth = _synthetic()
+    scheduler = SuccessiveElimination(VERSIONS, truth.shape[1], batch=10, min_questions=truth.shape[1] - 1)
+    while not scheduler.finished:
+        batch = scheduler.next_batch()
+        for version in scheduler.active_versions:
+            scheduler.record(version, batch, truth[VERSIONS.index(version), batch])
+        assert scheduler.end_round() == [] or scheduler.evaluated >= scheduler.min_questions
+    # erste Runde direkt bis min_questions, vorher wird nichts getestet
+    assert scheduler.history[0]["questions"] == truth.shape[1] - 1
+
+
+def test_min_questions_follows_the_dataset_size():
+    truth = _synthetic(n_questions=40)
+    scheduler = make_scheduler("bound", VERSIONS, truth.shape[1])
+    assert scheduler.min_questions == 20
+    result = simulate(scheduler, truth)
+    assert scheduler.winner() == "V2"
+    assert result["calls"] < truth.size
+    assert make_scheduler("bound", VERSIONS, 400).min_questions == 50
+    with pytest.raises(ValueError, match="min_questions=40"):
+        make_scheduler("bound", VERSIONS, 40, min_questions=40)
+
+
+def test_alpha_is_spent_across_rounds():
+    scheduler = SuccessiveElimination(VERSIONS, 100, alpha=0.05)
+    quantiles = [scheduler.z(r) for r in range(5)]
+    assert all(a < b for a, b in zip(quantiles, quantiles[1:]))
+    # Runde 0: alpha·6/π², Bonferroni über drei Vergleiche
+    assert quantiles[0] == pytest.approx(NormalDist().inv_cdf(1 - 0.05 * 6 / math.pi ** 2 / (2 * 3)))
+
+
+def test_halving_keeps_top_half_each_round():
+    truth = _synthetic()
+    scheduler = SuccessiveHalving(VERSIONS, truth.shape[1], initial=20)
+    sizes = []
+    while not scheduler.finished:
+        batch = scheduler.next_batch()
+        sizes.append(len(batch))
+        for version in scheduler.active_versions:
+            scheduler.record(version, batch, truth[VERSIONS.index(version), batch])
+        scheduler.end_round()
+    assert sizes == [20, 20]
+    assert scheduler.winner() == "V2"
+    assert scheduler.calls == 4 * 20 + 2 * 20
+
+
+def test_make_scheduler_rejects_unknown_strategy():
+    assert isinstance(make_scheduler("bound", VERSIONS, 10), SuccessiveElimination)
+    with pytest.raises(ValueError):
+        make_scheduler("ucb", VERSIONS, 10)
@@ -0,0 +1,68 @@
+from rag_pipeline.batch import (
+    BATCH_ENDPOINT,
+    LocalBatchEndpoint,
+    compile_batch,
+    fetch_results,
+    generate_all_batch,
+    poll_batch,
+    submit_batch,
+    write_jsonl,
+)
+from rag_pipeline.generation import GenerationParams, make_client
+
+SYSTEM_PROMPT = "Du bist ein hilfreicher Assistent für PlanQK."
+EXAMPLES = [
+    {"query": "Was ist PlanQK?", "reference_answer": "Eine Plattform für Quantenanwendungen."},
+    {"query": "Wie lege ich einen Service an?", "reference_answer": "Über die Plattform."},
+    {"query": "Schon beantwortet", "response": "fertig"},
+]
+
+
+def _examples() -> list:
+    return [dict(ex) for ex in EXAMPLES]
+
+
+def test_body_has_data_sources_at_top_level(azure_config):
+    lines, jobs = compile_batch(_examples(), SYSTEM_PROMPT, azure_config, deployment="gpt-4o-batch")
+    assert len(lines) == 2 and len(jobs) == 2
+    for line in lines:
+        body = line["body"]
+        assert line["method"] == "POST" and line["url"] == BATCH_ENDPOINT
+        assert "extra_body" not in body and "stream" not in body
+        assert body["data_sources"][0]["type"] == "azure_search"
+        assert body["model"] == "gpt-4o-batch"
+        assert body["messages"][0]["role"] == "system"
+        assert jobs[line["custom_id"]]["documents"] is None
+    assert [job["index"] for job in jobs.values()] == [0, 1]
+
+
+def test_body_drops_streaming_options(azure_config):
+    lines, _ = compile_batch(_examples(), SYSTEM_PROMPT, azure_config, GenerationParams(stream=True))
+    assert all("stream" not in line["body"] and "stream_options" not in line["body"] for line in lines)
+
+
+def test_local_endpoint_returns_contexts_from_mock(azure_config, mock_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE", "off")
+    client = LocalBatchEndpoint(workdir=str(tmp_path / "batches"), chat_client=make_client(azure_config))
+    examples = generate_all_batch(_examples(), SYSTEM_PROMPT, azure_config, client=client,
+                                  state_path=str(tmp_path / "state.json"), poll_interval=0)
+    assert mock_server.backend.stats["generation_requests"] == 2
+    for ex in examples[:2]:
+        assert ex["response"]
+        assert ex["retrieved_contexts"]
+    assert examples[2]["response"] == "fertig"
+    assert not (tmp_path / "state.json").exists()
+
+
+def test_local_endpoint_rejects_extra_body(azure_config, mock_server, tmp_path):
+    lines, _ = compile_batch(_examples()[:1], SYSTEM_PROMPT, azure_config)
+    body = lines[0]["body"]
+    lines[0]["body"] = {**body, "extra_body": {"data_sources": body.pop("data_sources")}}
+    client = LocalBatchEndpoint(workdir=str(tmp_path), chat_client=make_client(azure_config))
+    batch = submit_batch(client, write_jsonl(lines, str(tmp_path / "input.jsonl")))
+    batch = poll_batch(client, batch.id, interval=0)
+    assert batch.request_counts.failed == 1
+    record = fetch_results(client, batch)[lines[0]["custom_id"]]
+    assert record["response"]["status_code"] == 400
+    assert "extra_body" in record["error"]["message"]
+    assert mock_server.backend.stats["generation_requests"] == 0
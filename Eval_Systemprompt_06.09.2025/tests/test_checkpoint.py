@@ -0,0 +1,53 @@
+import json
+
+from rag_pipeline.checkpoint import Checkpoint, read_records
+from rag_pipeline.generation import generate_all
+
+SYSTEM_PROMPT = "Du bist ein hilfreicher Assistent für PlanQK."
+QUERIES = ["Was ist PlanQK?", "Wie lege ich einen Service an?", "Was kostet die Nutzung?"]
+
+
+def _examples(n: int) -> list:
+    return [{"query": q, "reference_answer": "Referenz"} for q in QUERIES[:n]]
+
+
+def test_partial_last_line_is_cut_on_open(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = Checkpoint(str(path))
+    checkpoint.append(0, {"query": QUERIES[0], "response": "a"}, "k0")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index": 1, "query": "abgebro')      # Absturz mitten in der Zeile
+
+    checkpoint = Checkpoint(str(path))
+    assert list(checkpoint.done) == ["k0"]
+    checkpoint.append(2, {"query": QUERIES[2], "response": "c"}, "k2")
+    assert [r["request_key"] for r in read_records(str(path))] == ["k0", "k2"]
+    assert path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_line_without_any_newline_is_dropped(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text('{"request_key": "k0", "respo', encoding="utf-8")
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.done == {}
+    assert path.read_bytes() == b""
+
+
+def test_resume_from_truncated_checkpoint(azure_config, mock_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE", "off")
+    path = tmp_path / "checkpoint.jsonl"
+    generate_all(_examples(2), SYSTEM_PROMPT, azure_config, concurrency=1, checkpoint=Checkpoint(str(path)))
+    assert mock_server.backend.stats["generation_requests"] == 2
+    # zweite Zeile halb geschrieben, als wäre der Prozess beim fsync abgestürzt
+    content = path.read_bytes()
+    path.write_bytes(content[:len(content) - len(content.splitlines()[-1]) // 2 - 1])
+
+    examples = generate_all(_examples(3), SYSTEM_PROMPT, azure_config, concurrency=1,
+                            checkpoint=Checkpoint(str(path)))
+    assert mock_server.backend.stats["generation_requests"] == 2 + 2
+    assert all(ex["response"] for ex in examples)
+
+    records = read_records(str(path))
+    assert sorted(r["index"] for r in records) == [0, 1, 2]
+    with open(path, "r", encoding="utf-8") as f:
+        assert all(json.loads(line) for line in f)
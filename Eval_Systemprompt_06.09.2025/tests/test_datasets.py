@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from rag_pipeline.datasets import (
+    DATASETS_DIR,
+    INDEX_FILE,
+    content_hash,
+    dataset_path,
+    example_ids,
+    load_dataset,
+    read_index,
+    register,
+    resolve,
+    verify,
+)
+
+EXAMPLES = [
+    {"query": "Was ist PlanQK?", "reference_contexts": ["PlanQK ist eine Plattform."],
+     "reference_answer": "Eine Plattform für Quantenanwendungen."},
+    {"query": "Wie lege ich einen Service an?", "reference_contexts": [], "reference_answer": "Über die Plattform."},
+    {"query": "Was ist PlanQK?", "reference_contexts": [], "reference_answer": "Dieselbe Frage, andere Referenz."},
+]
+
+
+def _examples() -> list:
+    return json.loads(json.dumps(EXAMPLES))
+
+
+def test_content_hash_is_stable():
+    digest = content_hash(_examples())
+    assert digest == content_hash(_examples())
+    assert len(digest) == 64
+    # Schlüsselreihenfolge, Antworten und IDs gehören nicht zum Inhalt
+    reordered = [dict(reversed(list(ex.items()))) for ex in _examples()]
+    annotated = [{**ex, "response": "x", "example_id": "abc"} for ex in _examples()]
+    assert content_hash(reordered) == content_hash(annotated) == digest
+
+
+def test_content_hash_changes_with_content():
+    changed = _examples()
+    changed[1]["reference_answer"] += " "
+    assert content_hash(changed) != content_hash(_examples())
+    assert content_hash(_examples()[::-1]) != content_hash(_examples())
+
+
+def test_example_ids_suffix_duplicates():
+    ids = example_ids(ex["query"] for ex in EXAMPLES)
+    assert len(set(ids)) == 3
+    assert ids[2] == f"{ids[0]}-2"
+    assert ids == example_ids(ex["query"] for ex in EXAMPLES)
+
+
+def test_register_resolve_and_load(tmp_path):
+    digest = register(_examples(), name="klein", datasets_dir=str(tmp_path))
+    assert digest == content_hash(EXAMPLES)
+    assert read_index(str(tmp_path)) == {"klein": digest}
+    assert resolve("klein", str(tmp_path)) == resolve(digest[:8], str(tmp_path)) == digest
+    dataset = load_dataset("klein", str(tmp_path))
+    assert (dataset.name, dataset.hash) == ("klein", digest)
+    assert [ex["example_id"] for ex in dataset.examples] == example_ids(ex["query"] for ex in EXAMPLES)
+    # jede Ladung ist eine eigene Kopie
+    dataset.examples[0]["response"] = "geändert"
+    assert "response" not in load_dataset(digest, str(tmp_path)).examples[0]
+    # erneutes Registrieren ändert nichts
+    assert register(_examples(), datasets_dir=str(tmp_path)) == digest
+    with pytest.raises(KeyError):
+        resolve("unbekannt", str(tmp_path))
+
+
+def test_verify_detects_tampered_file(tmp_path):
+    digest = register(_examples(), name="klein", datasets_dir=str(tmp_path))
+    other = register(_examples()[:1], datasets_dir=str(tmp_path))
+    assert verify(str(tmp_path)) == []
+    path = dataset_path(digest, str(tmp_path))
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    payload["examples"][0]["reference_answer"] = "Manipuliert."
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    assert verify(str(tmp_path)) == [f"{digest}.json"]
+    assert f"{other}.json" not in verify(str(tmp_path))
+
+
+def test_registered_datasets_match_their_hashes():
+    assert verify(DATASETS_DIR) == []
+    index = read_index(DATASETS_DIR)
+    assert index, f"{INDEX_FILE} fehlt in {DATASETS_DIR}"
+    for digest in index.values():
+        assert content_hash(load_dataset(digest).examples) == digest
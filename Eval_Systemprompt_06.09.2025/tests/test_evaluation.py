@@ -0,0 +1,39 @@
+import pytest
+
+from rag_pipeline.contexts import save_responses
+from rag_pipeline.datasets import DEFAULT_DATASET, load_dataset
+from rag_pipeline.evaluation import read_responses, run_evaluation
+from rag_pipeline.prescreen import PRESCREEN_FILE
+from rag_pipeline.results import ResultStore
+
+
+def _responses(tmp_path, with_hash: bool = True, changed: bool = False) -> str:
+    dataset = load_dataset(DEFAULT_DATASET)
+    examples = [{**ex, "response": "Eine Antwort."} for ex in dataset.examples]
+    if changed:
+        examples[0]["reference_answer"] = "Eine andere Referenz."
+    path = str(tmp_path / "V2_RAG_Eval_with_responses.json")
+    save_responses(examples, path, dataset.hash if with_hash and not changed else None)
+    return path
+
+
+@pytest.mark.parametrize("with_hash", [True, False])
+def test_read_responses_returns_the_dataset_hash(tmp_path, with_hash):
+    examples, digest = read_responses(_responses(tmp_path, with_hash))
+    assert digest == load_dataset(DEFAULT_DATASET).hash
+    assert len(examples) == len(load_dataset(DEFAULT_DATASET).examples)
+
+
+@pytest.mark.parametrize("changed, expected", [(False, DEFAULT_DATASET), (True, None)])
+def test_evaluation_stores_the_dataset_of_the_responses(judge_env, tmp_path, monkeypatch, changed, expected):
+    store = ResultStore(str(tmp_path / "store"))
+    monkeypatch.setenv("RESULTS_STORE", store.path)
+    monkeypatch.delenv("PRESCREEN", raising=False)
+    path = _responses(tmp_path, changed=changed)
+    run_evaluation(path, limit=2, out_dir=str(tmp_path), concurrency=2)
+
+    dataset, = store.runs()["dataset"].astype(str)
+    # ein veränderter Datensatz darf nicht unter dem Namen des registrierten landen
+    assert dataset == (expected or read_responses(path)[1][:12])
+    assert judge_env.backend.stats["judge_requests"] == 2 * 3
+    assert not (tmp_path / PRESCREEN_FILE).exists()
@@ -0,0 +1,86 @@
+import pytest
+
+from rag_pipeline.cache import ResponseCache
+from rag_pipeline.generation import (
+    GenerationParams,
+    agenerate_response,
+    generate_response,
+    make_async_client,
+    make_client,
+)
+from rag_pipeline.mockserver import MockSettings
+from rag_pipeline.ratelimit import RateLimiter
+from rag_pipeline.telemetry import TELEMETRY
+from rag_pipeline.transport import run_async
+
+SYSTEM_PROMPT = "Du bist ein hilfreicher Assistent für PlanQK."
+QUESTION = "Wie lege ich einen Service an?"
+
+
+def _last_span():
+    return [s for s in TELEMETRY.select() if s.name == "chat.completions"][-1]
+
+
+def _agenerate(azure_config, **kwargs):
+    return run_async(agenerate_response(QUESTION, SYSTEM_PROMPT, make_async_client(azure_config),
+                                         azure_config, **kwargs))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_sync_and_async_send_the_same_request(azure_config, mock_server, stream):
+    params = GenerationParams(stream=stream)
+    sync = generate_response(QUESTION, SYSTEM_PROMPT, make_client(azure_config), azure_config, params)
+    sync_span = _last_span()
+    asynchronous = _agenerate(azure_config, params=params)
+    async_span = _last_span()
+    assert sync == asynchronous
+    assert sync.content and sync.contexts
+    for call in (sync_span, async_span):
+        assert call.attributes["rag.latency_ms"] >= 0
+        assert "rag.queue_wait_ms" in call.attributes
+    assert mock_server.backend.stats["generation_requests"] == 2
+
+
+def test_cache_hit_skips_the_request(azure_config, mock_server, tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    first = generate_response(QUESTION, SYSTEM_PROMPT, make_client(azure_config), azure_config, cache=cache)
+    second = _agenerate(azure_config, cache=cache)
+    assert first == second
+    assert _last_span().attributes["rag.cache_hit"] is True
+    assert mock_server.backend.stats["generation_requests"] == 1
+
+
+@pytest.mark.parametrize("mock_settings", [MockSettings(error_rate=1.0, retry_after=0.0)])
+def test_rate_limit_retries_then_gives_up(azure_config, mock_server, monkeypatch):
+    monkeypatch.setattr("rag_pipeline.generation.MAX_RETRIES", 2)
+    client = make_client(azure_config).with_options(max_retries=0)
+    with pytest.raises(Exception, match="Maximale Anzahl"):
+        generate_response(QUESTION, SYSTEM_PROMPT, client, azure_config,
+                          limiter=RateLimiter(base_backoff=0.0, max_backoff=0.0))
+    assert mock_server.backend.stats["generation_429"] == 2
+
+
+class _UsageSpy(RateLimiter):
+    def __init__(self):
+        super().__init__(tpm=100_000)
+        self.usages = []
+
+    def record_usage(self, estimated, usage):
+        self.usages.append(usage)
+        super().record_usage(estimated, usage)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_stream_reports_usage(azure_config, mock_server, use_async):
+    params = GenerationParams(stream=True)
+    limiter = _UsageSpy()
+    if use_async:
+        _agenerate(azure_config, params=params, limiter=limiter)
+    else:
+        generate_response(QUESTION, SYSTEM_PROMPT, make_client(azure_config), azure_config, params, limiter)
+    attributes = _last_span().attributes
+    assert attributes["gen_ai.usage.input_tokens"] > 0
+    assert attributes["gen_ai.usage.output_tokens"] > 0
+    assert attributes["rag.stream_chunks"] > 1
+    usage, = limiter.usages
+    assert usage.total_tokens == attributes["gen_ai.usage.input_tokens"] + attributes["gen_ai.usage.output_tokens"]
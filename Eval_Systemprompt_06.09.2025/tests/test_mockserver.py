@@ -0,0 +1,50 @@
+import httpx
+import pytest
+
+from rag_pipeline.mockserver import MockSettings
+from rag_pipeline.ratelimit import RateLimiter
+
+
+def _post(server, body: dict, path: str = "/openai/deployments/gpt-4o/chat/completions"):
+    return httpx.post(server.url + path, json=body, params={"api-version": "2024-05-01-preview"})
+
+
+def test_generation_with_data_sources_returns_citations(mock_server):
+    body = {"messages": [{"role": "user", "content": "Was ist PlanQK?"}],
+            "data_sources": [{"type": "azure_search", "parameters": {"top_n_documents": 3}}]}
+    response = _post(mock_server, body)
+    assert response.status_code == 200
+    message = response.json()["choices"][0]["message"]
+    assert message["content"]
+    assert message["context"]["citations"]
+    assert mock_server.backend.stats["generation_requests"] == 1
+
+
+def test_extra_body_is_rejected(mock_server):
+    body = {"messages": [{"role": "user", "content": "Frage"}], "extra_body": {"data_sources": []}}
+    response = _post(mock_server, body)
+    assert response.status_code == 400
+    assert "extra_body" in response.json()["error"]["message"]
+
+
+def test_judge_path(mock_server):
+    response = _post(mock_server, {"messages": [{"role": "user", "content": "Bewerte"}]}, "/v1/chat/completions")
+    assert response.status_code == 200
+    assert mock_server.backend.stats["judge_requests"] == 1
+
+
+@pytest.mark.parametrize("mock_settings", [MockSettings(rpm=5, tpm=100_000)])
+def test_rate_limit_headers_set_bucket_capacity(mock_server):
+    limiter = RateLimiter()
+    for _ in range(5):
+        response = _post(mock_server, {"messages": [{"role": "user", "content": "Frage"}], "max_tokens": 10})
+        assert response.status_code == 200
+        limiter.update_from_headers(response.headers)
+    assert response.headers["x-ratelimit-limit-requests"] == "5"
+    assert limiter.requests.capacity == 5
+    assert limiter.tokens.capacity == 100_000
+    assert limiter.requests.level < 1
+
+    response = _post(mock_server, {"messages": [{"role": "user", "content": "Frage"}]})
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
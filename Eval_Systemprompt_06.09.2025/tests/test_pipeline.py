@@ -0,0 +1,52 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from rag_pipeline.cache import JudgeCache
+from rag_pipeline.evaluation import LazyEvaluators
+from rag_pipeline.generation import make_async_client
+from rag_pipeline.pipeline import run_pipeline
+from rag_pipeline.transport import run_async
+
+SYSTEM_PROMPT = "Du bist ein hilfreicher Assistent für PlanQK."
+
+
+def _examples(n: int, answered: int = 0) -> list:
+    examples = [{"query": f"Frage {i} zu PlanQK?", "reference_answer": f"Antwort {i}"} for i in range(n)]
+    for ex in examples[:answered]:
+        ex["response"] = "Schon beantwortet."
+    return examples
+
+
+class _BrokenJudgeCache(JudgeCache):
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_pipeline_generates_and_evaluates_in_order(azure_config, judge_env):
+    examples = _examples(6, answered=2)
+    rows = run_async(run_pipeline(examples, SYSTEM_PROMPT, make_async_client(azure_config), azure_config,
+                                  LazyEvaluators(), concurrency=2, eval_concurrency=2, queue_size=1,
+                                  route_prescreen=False))
+    assert [row["index"] for row in rows] == list(range(1, 7))
+    assert all(ex["response"] for ex in examples)
+    assert judge_env.backend.stats["generation_requests"] == 4
+    assert judge_env.backend.stats["judge_requests"] == 6 * 3
+
+
+def test_failing_consumer_fails_the_pipeline_instead_of_hanging(azure_config, judge_env, tmp_path):
+    examples = _examples(20, answered=20)
+    broken = _BrokenJudgeCache(path=str(tmp_path / "judge.sqlite"))
+
+    async def _run():
+        # ohne Abbruch blieben die Producer an der vollen Queue (queue_size=1) hängen
+        return await asyncio.wait_for(
+            run_pipeline(examples, SYSTEM_PROMPT, make_async_client(azure_config), azure_config,
+                         LazyEvaluators(), concurrency=2, eval_concurrency=1, queue_size=1,
+                         judge_cache=broken, route_prescreen=False),
+            timeout=30)
+
+    with pytest.raises(sqlite3.OperationalError):
+        run_async(_run())
+    assert judge_env.backend.stats["judge_requests"] == 0
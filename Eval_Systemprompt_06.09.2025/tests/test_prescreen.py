@@ -0,0 +1,117 @@
+import os
+import subprocess
+import sys
+
+from rag_pipeline.evaluation import LazyEvaluators, aevaluate_examples, evaluate_examples
+from rag_pipeline.prescreen import (
+    FAIL_REASON,
+    local_outcomes,
+    prescreen,
+    prescreen_mode,
+    routed_outcomes,
+    screen_example,
+    summarize_screen,
+)
+from rag_pipeline.transport import run_async
+
+REFERENCE = ("To create a service on PlanQK, open the platform, choose Services, "
+             "click Create Service and upload your code as a zip file.")
+CONTEXTS = [{"content": "Services are created under Services > Create Service.", "title": "Services"}]
+
+EXAMPLES = [
+    # 0: leer -> fail
+    {"query": "How do I create a service?", "reference_answer": REFERENCE, "response": ""},
+    # 1: ausweichend -> fail
+    {"query": "How do I create a service?", "reference_answer": REFERENCE,
+     "response": "I'm sorry, but the retrieved documents do not contain information about creating services."},
+    # 2: eingeschränkt, aber mit Inhalt -> Judge
+    {"query": "How do I create a service?", "reference_answer": REFERENCE,
+     "response": "While the retrieved context does not describe every step, PlanQK offers a Create Service "
+                 "button under Services where you upload your code."},
+    # 3: deckt die Referenz ab und zitiert gültig -> pass (nur Hinweis)
+    {"query": "How do I create a service?", "reference_answer": REFERENCE,
+     "response": REFERENCE + " See https://docs.planqk.de/services/managed/introduction.html for details."},
+    # 4: ausweichend, aber ohne Referenzantwort -> fail ohne lokale Correctness
+    {"query": "What does the quota cost?", "reference_answer": "",
+     "response": "I'm sorry, I cannot find that."},
+]
+
+
+def _examples() -> list:
+    return [{**ex, "retrieved_contexts": CONTEXTS} for ex in EXAMPLES]
+
+
+def test_routing_decisions():
+    screen = prescreen(_examples())
+    assert list(screen["decision"]) == ["fail", "fail", "judge", "pass", "fail"]
+    assert list(screen["has_reference"]) == [True, True, True, True, False]
+    assert screen.loc[3, "citations"] == 1 and screen.loc[3, "invalid_citations"] == 0
+    assert list(screen["local_metrics"]) == ["correctness", "correctness", "", "", ""]
+
+
+def test_local_outcomes_only_decide_correctness():
+    outcomes = local_outcomes("fail")
+    assert list(outcomes) == ["correctness"]
+    assert outcomes["correctness"].score == 1.0
+    assert outcomes["correctness"].passing is False
+    assert outcomes["correctness"].feedback == FAIL_REASON
+    assert local_outcomes("fail", has_reference=False) == {}
+    assert local_outcomes("pass") == local_outcomes("judge") == {}
+    assert list(screen_example(_examples()[1])) == ["correctness"]
+    assert screen_example(_examples()[4]) == {}
+
+
+def test_routed_outcomes_only_in_route_mode():
+    screen = prescreen(_examples())
+    assert routed_outcomes(screen, "report") == {}
+    routed = routed_outcomes(screen, "route")
+    assert sorted(routed) == [0, 1]
+    assert all(list(outcomes) == ["correctness"] for outcomes in routed.values())
+
+
+def test_prescreen_is_opt_in(monkeypatch):
+    monkeypatch.delenv("PRESCREEN", raising=False)
+    assert prescreen_mode() == "off"
+    monkeypatch.setenv("PRESCREEN", "Report")
+    assert prescreen_mode() == "report"
+
+
+def test_summary_counts_judge_calls():
+    summary = summarize_screen(prescreen(_examples()))
+    assert (summary["fail_rows"], summary["pass_rows"], summary["judge_rows"]) == (3, 1, 1)
+    assert summary["judge_calls"] == 2 * 5 + 4
+    assert summary["local_calls"] == 2
+
+
+def _check_rows(rows: list):
+    for idx in (0, 1):
+        assert rows[idx]["correctness_score"] == 1.0
+        assert rows[idx]["correctness_feedback"] == FAIL_REASON
+        assert rows[idx]["relevance_score"] is not None
+        assert rows[idx]["faithfulness_score"] is not None
+    assert not str(rows[3]["correctness_feedback"]).startswith("Pre-Screen")
+    assert rows[4]["correctness_score"] is None
+
+
+def test_evaluate_examples_skips_only_local_metrics(judge_env):
+    data = _examples()
+    routed = routed_outcomes(prescreen(data), "route")
+    rows = evaluate_examples(data, LazyEvaluators(), local=routed)
+    # 5 Zeilen × Relevance/Faithfulness + Correctness für 4 Zeilen mit Referenz, 2 davon lokal
+    assert judge_env.backend.stats["judge_requests"] == 10 + 4 - 2
+    _check_rows(rows)
+
+
+def test_aevaluate_examples_skips_only_local_metrics(judge_env):
+    data = _examples()
+    routed = routed_outcomes(prescreen(data), "route")
+    rows = run_async(aevaluate_examples(data, LazyEvaluators(), concurrency=4, local=routed))
+    assert judge_env.backend.stats["judge_requests"] == 10 + 4 - 2
+    _check_rows(rows)
+
+
+def test_pipeline_import_does_not_load_numpy():
+    code = "import sys, rag_pipeline.pipeline, rag_pipeline.runner; print('numpy' in sys.modules)"
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
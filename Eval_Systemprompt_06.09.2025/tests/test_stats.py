@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rag_pipeline.datasets import example_ids
+from rag_pipeline.stats import (
+    bootstrap_means,
+    confidence_intervals,
+    score_matrix,
+    sign_flip_pvalues,
+    version_diffs,
+)
+
+QUESTIONS = ["Frage A", "Frage B", "Frage C", "Frage A"]     # doppelte Frage wie im echten Datensatz
+
+
+def _frame(correctness: list, relevance: list, order=None) -> pd.DataFrame:
+    df = pd.DataFrame({"example_id": example_ids(QUESTIONS), "question": QUESTIONS,
+                       "correctness_score": correctness, "relevance_score": relevance})
+    return df.iloc[order] if order is not None else df
+
+
+def test_score_matrix_pairs_rows_by_example_id():
+    frames = {"V0": _frame([1, 2, 3, 4], [0, 1, 0, 1]),
+              "V1": _frame([5, 4, 3, 2], [1, 1, 1, 0], order=[3, 2, 1, 0])}
+    scores, ids, versions, metrics = score_matrix(frames)
+    assert versions == ["V0", "V1"]
+    assert metrics == ["correctness_score", "relevance_score"]
+    assert ids == example_ids(QUESTIONS) and ids[0] != ids[3]
+    assert scores.shape == (4, 2, 2)
+    np.testing.assert_array_equal(scores[:, 1, 0], [5, 4, 3, 2])
+    np.testing.assert_array_equal(scores[:, 0, 1], [0, 1, 0, 1])
+
+
+def test_score_matrix_derives_ids_from_question_text():
+    df = _frame([1, 2, 3, 4], [0, 1, 0, 1]).drop(columns="example_id")
+    _, ids, _, _ = score_matrix({"V0": df})
+    assert ids == example_ids(QUESTIONS)
+
+
+def test_bootstrap_means_skip_nan_and_stay_in_range():
+    scores = np.array([[1.0, np.nan], [3.0, np.nan], [5.0, 2.0]])
+    means = bootstrap_means(scores, n_resamples=500, seed=1)
+    assert means.shape == (500, 2)
+    assert np.nanmin(means[:, 0]) >= 1 and np.nanmax(means[:, 0]) <= 5
+    assert np.nanmin(means[:, 1]) == np.nanmax(means[:, 1]) == 2.0
+    np.testing.assert_array_equal(bootstrap_means(scores, 500, seed=1), means)
+
+
+def test_confidence_intervals_on_fixed_matrix():
+    scores = np.array([[[1.0], [4.0]], [[2.0], [4.0]], [[3.0], [4.0]], [[np.nan], [4.0]]])
+    ci = confidence_intervals(scores, ["V0", "V1"], ["correctness_score"], n_resamples=2000)
+    v0, v1 = ci.iloc[0], ci.iloc[1]
+    assert (v0["n"], v0["mean"]) == (3, 2.0)
+    assert 1.0 <= v0["ci_low"] < 2.0 < v0["ci_high"] <= 3.0
+    assert v1["ci_low"] == v1["ci_high"] == v1["mean"] == 4.0
+    assert v0["confidence"] == pytest.approx(0.95)
+
+
+def test_version_diffs_detect_clear_difference():
+    rng = np.random.default_rng(0)
+    base = rng.integers(1, 6, size=40).astype(float)
+    scores = np.stack([base, base + 1, base], axis=1)[:, :, None]
+    diffs = version_diffs(scores, ["V0", "V1", "V2"], ["correctness_score"], baseline="V0", n_resamples=2000)
+    by_version = diffs.set_index("version_b")
+    assert list(by_version.index) == ["V1", "V2"]
+    assert by_version.loc["V1", "mean_diff"] == 1.0
+    assert by_version.loc["V1", "ci_low"] == by_version.loc["V1", "ci_high"] == 1.0
+    assert by_version.loc["V1", "p_value"] < 0.01
+    assert by_version.loc["V2", "mean_diff"] == 0.0
+    assert by_version.loc["V2", "p_value"] == 1.0
+    assert (diffs["n_pairs"] == 40).all()
+
+
+def test_version_diffs_all_pairs_and_unknown_baseline():
+    scores = np.arange(12, dtype=float).reshape(4, 3, 1)
+    diffs = version_diffs(scores, ["V0", "V1", "V2"], ["m"], n_resamples=100)
+    assert list(zip(diffs["version_a"], diffs["version_b"])) == [("V0", "V1"), ("V0", "V2"), ("V1", "V2")]
+    np.testing.assert_array_equal(diffs["mean_diff"], [1.0, 2.0, 1.0])
+    with pytest.raises(ValueError):
+        version_diffs(scores, ["V0", "V1", "V2"], ["m"], baseline="V9")
+
+
+def test_sign_flip_pvalues_bounds():
+    diffs = np.array([[1.0, 0.0, np.nan]] * 10)
+    p = sign_flip_pvalues(diffs, n_resamples=999)
+    assert p[0] == pytest.approx(1 / 1000, abs=0.01)
+    assert p[1] == 1.0
+    assert np.isnan(p[2])